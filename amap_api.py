@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# 高德Web服务API的请求与响应解析：逐对路径规划、/v3/distance批量距离和路径折线，不依赖QGIS，可在工作线程中调用
+import functools
+
+import numpy as np
+
+from . import http_client
+from .rate_limiter import QuotaExceededError
+from .transform import wgs2gcj
+
+# 高德/v3/distance接口支持的出行方式及对应type参数；公交、骑行不支持，仍逐对请求
+DISTANCE_API_TYPES = {'driving': 1, 'walking': 3}
+# /v3/distance单次请求最多的起点数
+DISTANCE_API_MAX_ORIGINS = 100
+
+
+def get_travel_time_gcj(o_gcj, d_gcj, mode, key, city=None, dlg=None, cache=None, route_store=None):
+    """已转换为GCJ-02的OD对的可达性，先查缓存再请求高德
+
+    route_store: 可选的RouteStore，请求成功时顺带保存该OD对的路径折线（缓存命中时没有几何）
+    """
+    if cache is not None:
+        cached = cache.get(o_gcj, d_gcj, mode, city)
+        if cached is not None:
+            return cached
+    route_sink = None
+    if route_store is not None:
+        route_sink = functools.partial(route_store.put, o_gcj, d_gcj)
+    duration, distance = _query_travel_time_amap(o_gcj, d_gcj, mode, key, city, dlg, route_sink)
+    # 失败结果（inf）不缓存，下次运行重新请求
+    if cache is not None and distance != float('inf'):
+        cache.put(o_gcj, d_gcj, mode, city, duration, distance)
+    return duration, distance
+
+
+def _query_travel_time_amap(o_gcj, d_gcj, mode, key, city=None, dlg=None, route_sink=None):
+    # route_sink: 可选回调，成功时以同一响应中的GCJ-02折线 [(lon, lat), ...] 调用，避免导出时重复请求
+    try:
+        if mode == 'transit':
+            url = f'https://restapi.amap.com/v3/direction/transit/integrated?origin={o_gcj[0]},{o_gcj[1]}&destination={d_gcj[0]},{d_gcj[1]}&city={city}'
+            resp = http_client.get_json(url, key)
+            if resp['status'] == '1' and resp['route']['transits']:
+                transit = resp['route']['transits'][0]
+                duration = float(transit['duration'])
+                distance = float(transit['distance'])
+                if route_sink is not None:
+                    _emit_polyline(route_sink, _parse_transit_polyline, transit)
+                return duration, distance
+            else:
+                if dlg:
+                    info = resp.get('info', resp.get('errmsg', '未知错误'))
+                    dlg.append_log(f"终点可达性获取失败: {info}")
+                return float('inf'), float('inf')
+        elif mode == 'bicycling':
+            url = f'https://restapi.amap.com/v4/direction/bicycling?origin={o_gcj[0]},{o_gcj[1]}&destination={d_gcj[0]},{d_gcj[1]}'
+            resp = http_client.get_json(url, key)
+            if resp.get('errcode', 1) == 0 and resp['data']['paths']:
+                path = resp['data']['paths'][0]
+                duration = float(path['duration'])
+                distance = float(path['distance'])
+                if route_sink is not None:
+                    _emit_polyline(route_sink, _parse_steps_polyline, path['steps'])
+                return duration, distance
+            else:
+                if dlg:
+                    info = resp.get('errmsg', resp.get('info', '未知错误'))
+                    dlg.append_log(f"终点可达性获取失败: {info}")
+                return float('inf'), float('inf')
+        else:
+            url = f'https://restapi.amap.com/v3/direction/{mode}?origin={o_gcj[0]},{o_gcj[1]}&destination={d_gcj[0]},{d_gcj[1]}'
+            resp = http_client.get_json(url, key)
+            if resp['status'] == '1' and resp['route']['paths']:
+                path = resp['route']['paths'][0]
+                duration = float(path['duration'])
+                distance = float(path['distance'])
+                if route_sink is not None:
+                    _emit_polyline(route_sink, _parse_steps_polyline, path['steps'])
+                return duration, distance
+            else:
+                if dlg:
+                    info = resp.get('info', '未知错误')
+                    dlg.append_log(f"终点可达性获取失败: {info}")
+                return float('inf'), float('inf')
+    except QuotaExceededError:
+        # Key配额用尽不是该OD对不可达，交给调用方停止请求
+        raise
+    except Exception as e:
+        if dlg:
+            dlg.append_log(f"终点可达性获取异常: {type(e).__name__}: {e}")
+        return float('inf'), float('inf')
+
+
+def _parse_steps_polyline(steps):
+    """驾车/步行/骑行路径各step的polyline拼接为 [(lon, lat), ...]"""
+    polyline = []
+    for step in steps:
+        for pt in step['polyline'].split(';'):
+            if pt:
+                lon, lat = map(float, pt.split(','))
+                polyline.append((lon, lat))
+    return polyline
+
+
+def _parse_transit_polyline(transit):
+    """公交方案各段（公交线路或步行）的polyline拼接为 [(lon, lat), ...]"""
+    polyline = []
+    for seg in transit['segments']:
+        pl = ''
+        if 'bus' in seg and seg['bus']['buslines']:
+            pl = seg['bus']['buslines'][0]['polyline']
+        elif 'walking' in seg and seg['walking']['steps']:
+            pl = ';'.join([step['polyline'] for step in seg['walking']['steps']])
+        for pt in pl.split(';'):
+            if pt:
+                lon, lat = map(float, pt.split(','))
+                polyline.append((lon, lat))
+    return polyline
+
+
+def _emit_polyline(route_sink, parse, data):
+    # 折线解析失败只影响路径几何的复用，不影响可达性结果
+    try:
+        route_sink(parse(data))
+    except (KeyError, ValueError, TypeError):
+        pass
+
+
+def get_travel_times_gcj_batch(o_gcjs, d_gcj, mode, key, city=None, dlg=None, cache=None):
+    """多个起点到同一终点的可达性，合并为一次高德/v3/distance请求
+
+    o_gcjs: GCJ-02起点列表（不超过DISTANCE_API_MAX_ORIGINS个），d_gcj: GCJ-02终点
+    返回与o_gcjs一一对应的 [(duration, distance), ...]。批量请求本身遇到Key配额用尽时抛出QuotaExceededError；
+    逐对补查时配额用尽，尚未补查的OD对为nan（未查询），已得到的结果照常返回
+    """
+    results = [None] * len(o_gcjs)
+    todo = []
+    for i, o_gcj in enumerate(o_gcjs):
+        if cache is not None:
+            cached = cache.get(o_gcj, d_gcj, mode, city)
+            if cached is not None:
+                results[i] = cached
+                continue
+        todo.append(i)
+    if not todo:
+        return results
+    try:
+        origin_param = '|'.join(f'{o_gcjs[i][0]},{o_gcjs[i][1]}' for i in todo)
+        url = f'https://restapi.amap.com/v3/distance?origins={origin_param}&destination={d_gcj[0]},{d_gcj[1]}&type={DISTANCE_API_TYPES[mode]}'
+        resp = http_client.get_json(url, key)
+        if resp['status'] != '1':
+            if dlg:
+                dlg.append_log(f"批量可达性获取失败: {resp.get('info', '未知错误')}")
+            return [r if r is not None else (float('inf'), float('inf')) for r in results]
+        for item in resp.get('results', []):
+            try:
+                # 单个起点失败时（如步行超出距离限制）条目带有非0的code，留给下面逐对补查
+                if item.get('code') not in (None, '', '0', 0):
+                    continue
+                pos = todo[int(item['origin_id']) - 1]
+                duration = float(item['duration'])
+                distance = float(item['distance'])
+            except (KeyError, ValueError, IndexError, TypeError):
+                continue
+            results[pos] = (duration, distance)
+            if cache is not None:
+                cache.put(o_gcjs[pos], d_gcj, mode, city, duration, distance)
+    except QuotaExceededError:
+        raise
+    except Exception as e:
+        if dlg:
+            dlg.append_log(f"批量可达性获取异常: {type(e).__name__}: {e}")
+        return [r if r is not None else (float('inf'), float('inf')) for r in results]
+    # 批量接口未返回结果的OD对逐对补查
+    for i in todo:
+        if results[i] is None:
+            try:
+                results[i] = get_travel_time_gcj(o_gcjs[i], d_gcj, mode, key, city, dlg, cache)
+            except QuotaExceededError as e:
+                if dlg:
+                    dlg.append_log(f"逐对补查已停止: {e}")
+                break
+    return [r if r is not None else (float('nan'), float('nan')) for r in results]
+
+
+def distance_batches(matrix, rows, max_origins=DISTANCE_API_MAX_ORIGINS):
+    """把尚未完成的OD对按终点分组，同一终点的起点每max_origins个合并为一批
+
+    matrix: ODMatrix（或具有origins/dests/origin_index/dest_index的对象），rows: 行下标数组
+    逐批产出 (行下标列表, GCJ-02起点列表, GCJ-02终点)，供get_travel_times_gcj_batch使用
+    """
+    order = rows[np.argsort(matrix.dest_index[rows], kind='stable')]
+    bounds = np.flatnonzero(np.diff(matrix.dest_index[order])) + 1
+    for group in np.split(order, bounds):
+        if not len(group):
+            continue
+        d_gcj = matrix.dests.gcj(matrix.dest_index[group[0]])
+        for k in range(0, len(group), max_origins):
+            chunk = group[k:k + max_origins].tolist()
+            yield chunk, [matrix.origins.gcj(matrix.origin_index[idx]) for idx in chunk], d_gcj
+
+
+def get_route_amap(origin, destination, mode, key, city=None, dlg=None):
+    # origin, destination: WGS84经纬度
+    o_gcj = wgs2gcj(*origin)
+    d_gcj = wgs2gcj(*destination)
+    try:
+        if mode == 'bicycling':
+            url = f'https://restapi.amap.com/v4/direction/bicycling?origin={o_gcj[0]},{o_gcj[1]}&destination={d_gcj[0]},{d_gcj[1]}'
+            resp = http_client.get_json(url, key)
+            if resp.get('errcode', 1) == 0 and resp['data']['paths']:
+                return _parse_steps_polyline(resp['data']['paths'][0]['steps'])
+            else:
+                if dlg:
+                    dlg.append_log(f"路径API失败: url={url}")
+                    dlg.append_log(f"路径API失败: resp={resp}")
+                raise Exception('路径规划失败: ' + str(resp.get('errmsg', resp.get('info', '未知错误'))))
+        elif mode == 'transit':
+            if not city:
+                raise Exception('公交模式下城市不能为空')
+            url = f'https://restapi.amap.com/v3/direction/transit/integrated?origin={o_gcj[0]},{o_gcj[1]}&destination={d_gcj[0]},{d_gcj[1]}&city={city}'
+            resp = http_client.get_json(url, key)
+            if resp['status'] == '1' and resp['route']['transits']:
+                return _parse_transit_polyline(resp['route']['transits'][0])
+            else:
+                if dlg:
+                    dlg.append_log(f"路径API失败: url={url}")
+                    dlg.append_log(f"路径API失败: resp={resp}")
+                raise Exception('公交路径规划失败: ' + resp.get('info', ''))
+        else:
+            url = f'https://restapi.amap.com/v3/direction/{mode}?origin={o_gcj[0]},{o_gcj[1]}&destination={d_gcj[0]},{d_gcj[1]}'
+            resp = http_client.get_json(url, key)
+            if resp['status'] == '1' and resp['route']['paths']:
+                return _parse_steps_polyline(resp['route']['paths'][0]['steps'])
+            else:
+                if dlg:
+                    dlg.append_log(f"路径API失败: url={url}")
+                    dlg.append_log(f"路径API失败: resp={resp}")
+                raise Exception('路径规划失败: ' + resp.get('info', ''))
+    except Exception as e:
+        if dlg:
+            dlg.append_log(f"路径API异常: {e}")
+        raise
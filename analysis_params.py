@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# 一次分析的参数快照：在GUI线程中从对话框读取，后台任务只读取该对象，不再访问任何控件
+from qgis.core import QgsProject, QgsVectorLayer, QgsVectorLayerFeatureSource
+
+from .rate_limiter import DEFAULT_QPS, split_keys
+from .od_cache import DEFAULT_TTL_DAYS
+from .road_graph import DEFAULT_SPEED_KMH
+
+
+def _feature_source(layer):
+    # 工程图层只能在主线程访问，转换为QgsVectorLayerFeatureSource快照；
+    # Processing的parameterAsSource得到的已是独立的要素源，直接使用
+    if isinstance(layer, QgsVectorLayer):
+        return QgsVectorLayerFeatureSource(layer)
+    return layer
+
+
+class AnalysisParams:
+    """分析参数。图层在构造时转换为QgsVectorLayerFeatureSource，可在后台线程安全地遍历要素
+
+    dest_layer/start_layer/road_layer也可以是其他QgsFeatureSource（如Processing算法的输入要素源）
+    """
+
+    def __init__(self, dest_layer, field_settings, accessibility_weight=1.0, dest_id_field='', mode='driving',
+                 key='', start_layer=None, start_point=None, start_text='', city=None, export_path='',
+                 concurrency=4, qps=DEFAULT_QPS, daily_quota=0, use_cache=True, cache_ttl_days=DEFAULT_TTL_DAYS,
+                 use_batch_distance=True, prefilter_top_k=0, prefilter_radius=0, prefilter_max_time=0, top_k=1,
+                 clip_percent=0, retain_routes=True, export_all_routes=False, route_gpkg_path='',
+                 journal_path='', resume=False, export_routes=None,
+                 road_layer=None, road_speed_field='', road_oneway_field='', road_default_speed=DEFAULT_SPEED_KMH,
+                 project_crs=None, transform_context=None):
+        if dest_layer is None:
+            raise Exception('请先选择目的地图层')
+        self.dest_source = _feature_source(dest_layer)
+        self.dest_crs = dest_layer.sourceCrs()
+        self.dest_fields = dest_layer.fields()
+        if start_layer is not None:
+            self.start_source = _feature_source(start_layer)
+            self.start_crs = start_layer.sourceCrs()
+        else:
+            self.start_source = None
+            self.start_crs = None
+        # 离线路网（道路线图层）：指定时在本地计算最短路径，不请求高德API
+        if road_layer is not None:
+            self.road_source = _feature_source(road_layer)
+            self.road_crs = road_layer.sourceCrs()
+            self.road_fields = road_layer.fields()
+        else:
+            self.road_source = None
+            self.road_crs = None
+            self.road_fields = None
+        self.road_speed_field = road_speed_field
+        self.road_oneway_field = road_oneway_field
+        self.road_default_speed = float(road_default_speed or DEFAULT_SPEED_KMH)
+        self.start_point = start_point
+        self.start_text = start_text
+        self.field_settings = field_settings
+        self.accessibility_weight = accessibility_weight
+        self.dest_id_field = dest_id_field
+        self.mode = mode
+        self.key = key
+        # 输入框中可填写多个Key（逗号、分号或空白分隔），组成Key池
+        self.keys = split_keys(key)
+        self.city = city
+        self.export_path = export_path
+        self.concurrency = concurrency
+        self.qps = qps
+        self.daily_quota = daily_quota
+        self.use_cache = use_cache
+        self.cache_ttl_days = cache_ttl_days
+        self.use_batch_distance = use_batch_distance
+        # 直线距离预筛选：最近K个、最大半径（米）、最大估算时间（秒），0表示不限
+        self.prefilter_top_k = int(prefilter_top_k or 0)
+        self.prefilter_radius = float(prefilter_radius or 0)
+        self.prefilter_max_time = float(prefilter_max_time or 0)
+        # 每个起点输出的前K名，只为这些OD对请求路径
+        self.top_k = max(1, int(top_k or 1))
+        # 稳健归一化：按百分位截断各字段，0表示不截断
+        self.clip_percent = float(clip_percent or 0)
+        # 路径图层导出全部可达OD对（否则只导出前K名），可选直接写入GeoPackage
+        self.export_all_routes = bool(export_all_routes)
+        self.route_gpkg_path = route_gpkg_path
+        # 是否取得路径：未指定时在设置了CSV或GeoPackage输出路径时导出
+        self.export_routes = bool(export_path or route_gpkg_path) if export_routes is None else bool(export_routes)
+        # 逐对查询时保留响应中的路径折线，导出路径时直接复用；不导出路径时不保留
+        self.retain_routes = bool(retain_routes) and self.export_routes
+        # 断点文件：逐批记录已完成的OD对；resume为True且起终点与上次一致时跳过已完成的OD对
+        self.journal_path = journal_path
+        self.resume = bool(resume)
+        project = QgsProject.instance()
+        self.project_crs = project_crs if project_crs is not None else project.crs()
+        self.transform_context = transform_context if transform_context is not None else project.transformContext()
+
+    @classmethod
+    def from_dialog(cls, dlg):
+        return cls(
+            dlg.get_layer(), dlg.get_field_settings(),
+            accessibility_weight=dlg.get_accessibility_weight(),
+            dest_id_field=dlg.get_dest_id_field(),
+            mode=dlg.get_mode(),
+            key=dlg.get_key(),
+            start_layer=dlg.get_start_layer(),
+            start_point=dlg.get_start_point(),
+            start_text=dlg.lineEdit_start.text().strip(),
+            export_path=dlg.get_export_path(),
+            concurrency=dlg.get_concurrency(),
+            qps=dlg.get_qps(),
+            daily_quota=dlg.get_daily_quota(),
+            use_cache=dlg.get_use_cache(),
+            cache_ttl_days=dlg.get_cache_ttl_days(),
+            use_batch_distance=dlg.get_use_batch_distance(),
+            prefilter_top_k=dlg.get_prefilter_top_k(),
+            prefilter_radius=dlg.get_prefilter_radius_km() * 1000,
+            prefilter_max_time=dlg.get_prefilter_max_minutes() * 60,
+            top_k=dlg.get_top_k(),
+            clip_percent=dlg.get_clip_percent(),
+            retain_routes=dlg.get_retain_routes(),
+            export_all_routes=dlg.get_export_all_routes(),
+            route_gpkg_path=dlg.get_route_gpkg_path(),
+            journal_path=dlg.get_journal_path(),
+            resume=dlg.get_resume(),
+            road_layer=dlg.get_road_layer(),
+            road_speed_field=dlg.get_road_speed_field(),
+            road_default_speed=dlg.get_road_default_speed(),
+        )
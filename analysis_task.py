@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# 后台分析任务：在QgsTask工作线程中运行完整分析，日志和进度通过信号回传GUI线程
+from qgis.core import QgsTask
+from qgis.PyQt.QtCore import pyqtSignal
+
+from .choose_my_destination import run_analysis
+
+
+class ChooseMyDestinationTask(QgsTask):
+    """目的地优选分析任务；本身实现append_log/set_progress/is_canceled，作为分析流程的reporter"""
+
+    log_message = pyqtSignal(str)
+    progress_updated = pyqtSignal(int, int, str)
+
+    def __init__(self, params, description='目的地优选分析'):
+        super().__init__(description, QgsTask.CanCancel)
+        self.params = params
+        self.result = None
+        self.exception = None
+
+    def append_log(self, msg):
+        self.log_message.emit(msg)
+
+    def set_progress(self, done, total, text=''):
+        if total:
+            self.setProgress(done * 100.0 / total)
+        self.progress_updated.emit(done, total, text)
+
+    def is_canceled(self):
+        return self.isCanceled()
+
+    def run(self):
+        try:
+            self.result = run_analysis(self.params, self)
+        except Exception as e:
+            self.exception = e
+            return False
+        return True
@@ -1,16 +1,29 @@
-import requests
-import time
 from qgis.core import (
-    QgsProject, QgsVectorLayer, QgsFeature, QgsGeometry, QgsPointXY, QgsField, QgsCoordinateReferenceSystem, QgsCoordinateTransform
+    QgsApplication, QgsProject, QgsVectorLayer, QgsFeature, QgsGeometry, QgsLineString, QgsPointXY, QgsField, QgsCoordinateReferenceSystem, QgsCoordinateTransform,
+    QgsFields, QgsVectorFileWriter, QgsWkbTypes
 )
-from .choose_my_destination_dialog import ChooseMyDestinationDialog
 from qgis.PyQt.QtWidgets import QAction
 from qgis.PyQt.QtGui import QIcon, QColor
 from qgis.PyQt.QtCore import QObject
 import os
-from .transform import wgs2gcj, gcj2wgs
+from .transform import gcj2wgs_array
+from .od_engine import QueuedLog, iter_concurrent, iter_travel_times, iter_batch_travel_times
+from . import rate_limiter, http_client
+from .amap_api import DISTANCE_API_TYPES, get_travel_time_gcj, get_travel_times_gcj_batch, get_route_amap, distance_batches
+from .od_cache import TravelTimeCache, DEFAULT_TTL_DAYS
+from .od_matrix import ODMatrix
+from .od_journal import ODJournal, journal_signature
+from .scoring import ACCESSIBILITY_FIELD, score_results, unreachable_penalty, best_index, top_k_per_origin, aggregate_top_k
+from .analysis_params import AnalysisParams
+from .prefilter import select_candidates
+from .point_set import PointSet, transform_xy
+from .route_store import RouteStore
+from .road_graph import LocalRoutingBackend, RoutingBackend, travel_profile
+from .road_network import load_road_graph
+import numpy as np
 import csv
-from qgis.PyQt import QtWidgets
+import threading
+import time
 from qgis.core import QgsCategorizedSymbolRenderer, QgsSymbol, QgsRendererCategory
 
 # 顶部统一导入QGIS核心类
@@ -18,359 +31,625 @@ from qgis.core import QgsCategorizedSymbolRenderer, QgsSymbol, QgsRendererCatego
 #     QgsProject, QgsVectorLayer, QgsFeature, QgsGeometry, QgsPointXY, QgsField, QgsCoordinateReferenceSystem, QgsCoordinateTransform
 # )
 
-def get_travel_time_amap(origin, dest, mode, key, city=None, dlg=None):
-    o_gcj = wgs2gcj(*origin)
-    d_gcj = wgs2gcj(*dest)
-    try:
-        if mode == 'transit':
-            url = f'https://restapi.amap.com/v3/direction/transit/integrated?origin={o_gcj[0]},{o_gcj[1]}&destination={d_gcj[0]},{d_gcj[1]}&city={city}&key={key}'
-            resp = requests.get(url).json()
-            if resp['status'] == '1' and resp['route']['transits']:
-                transit = resp['route']['transits'][0]
-                duration = float(transit['duration'])
-                distance = float(transit['distance'])
-                return duration, distance
-            else:
-                if dlg:
-                    info = resp.get('info', resp.get('errmsg', '未知错误'))
-                    dlg.append_log(f"终点可达性获取失败: {info}")
-                return float('inf'), float('inf')
-        elif mode == 'bicycling':
-            url = f'https://restapi.amap.com/v4/direction/bicycling?origin={o_gcj[0]},{o_gcj[1]}&destination={d_gcj[0]},{d_gcj[1]}&key={key}'
-            resp = requests.get(url).json()
-            if resp.get('errcode', 1) == 0 and resp['data']['paths']:
-                path = resp['data']['paths'][0]
-                duration = float(path['duration'])
-                distance = float(path['distance'])
-                return duration, distance
-            else:
-                if dlg:
-                    info = resp.get('errmsg', resp.get('info', '未知错误'))
-                    dlg.append_log(f"终点可达性获取失败: {info}")
-                return float('inf'), float('inf')
-        else:
-            url = f'https://restapi.amap.com/v3/direction/{mode}?origin={o_gcj[0]},{o_gcj[1]}&destination={d_gcj[0]},{d_gcj[1]}&key={key}'
-            resp = requests.get(url).json()
-            if resp['status'] == '1' and resp['route']['paths']:
-                path = resp['route']['paths'][0]
-                duration = float(path['duration'])
-                distance = float(path['distance'])
-                return duration, distance
-            else:
-                if dlg:
-                    info = resp.get('info', '未知错误')
-                    dlg.append_log(f"终点可达性获取失败: {info}")
-                return float('inf'), float('inf')
-    except Exception as e:
-        if dlg:
-            dlg.append_log(f"终点可达性获取异常: {e}")
-        return float('inf'), float('inf')
-
-def get_route_amap(origin, destination, mode, key, city=None, dlg=None):
-    # origin, destination: WGS84经纬度
-    o_gcj = wgs2gcj(*origin)
-    d_gcj = wgs2gcj(*destination)
-    try:
-        if mode == 'bicycling':
-            url = f'https://restapi.amap.com/v4/direction/bicycling?origin={o_gcj[0]},{o_gcj[1]}&destination={d_gcj[0]},{d_gcj[1]}&key={key}'
-            resp = requests.get(url).json()
-            if resp.get('errcode', 1) == 0 and resp['data']['paths']:
-                route = resp['data']['paths'][0]
-                polyline = []
-                for step in route['steps']:
-                    for pt in step['polyline'].split(';'):
-                        lon, lat = map(float, pt.split(','))
-                        polyline.append((lon, lat))
-                return polyline
-            else:
-                if dlg:
-                    dlg.append_log(f"路径API失败: url={url}")
-                    dlg.append_log(f"路径API失败: resp={resp}")
-                raise Exception('路径规划失败: ' + str(resp.get('errmsg', resp.get('info', '未知错误'))))
-        elif mode == 'transit':
-            if not city:
-                raise Exception('公交模式下城市不能为空')
-            url = f'https://restapi.amap.com/v3/direction/transit/integrated?origin={o_gcj[0]},{o_gcj[1]}&destination={d_gcj[0]},{d_gcj[1]}&city={city}&key={key}'
-            resp = requests.get(url).json()
-            if resp['status'] == '1' and resp['route']['transits']:
-                transit = resp['route']['transits'][0]
-                polyline = []
-                for seg in transit['segments']:
-                    pl = ''
-                    if 'bus' in seg and seg['bus']['buslines']:
-                        pl = seg['bus']['buslines'][0]['polyline']
-                    elif 'walking' in seg and seg['walking']['steps']:
-                        pl = ';'.join([step['polyline'] for step in seg['walking']['steps']])
-                    for pt in pl.split(';'):
-                        if pt:
-                            lon, lat = map(float, pt.split(','))
-                            polyline.append((lon, lat))
-                return polyline
-            else:
-                if dlg:
-                    dlg.append_log(f"路径API失败: url={url}")
-                    dlg.append_log(f"路径API失败: resp={resp}")
-                raise Exception('公交路径规划失败: ' + resp.get('info', ''))
-        else:
-            url = f'https://restapi.amap.com/v3/direction/{mode}?origin={o_gcj[0]},{o_gcj[1]}&destination={d_gcj[0]},{d_gcj[1]}&key={key}'
-            resp = requests.get(url).json()
-            if resp['status'] == '1' and resp['route']['paths']:
-                route = resp['route']['paths'][0]
-                polyline = []
-                for step in route['steps']:
-                    for pt in step['polyline'].split(';'):
-                        lon, lat = map(float, pt.split(','))
-                        polyline.append((lon, lat))
-                return polyline
-            else:
-                if dlg:
-                    dlg.append_log(f"路径API失败: url={url}")
-                    dlg.append_log(f"路径API失败: resp={resp}")
-                raise Exception('路径规划失败: ' + resp.get('info', ''))
-    except Exception as e:
-        if dlg:
-            dlg.append_log(f"路径API异常: {e}")
-        raise
+# 超过该OD对数量时不再逐条输出日志，避免日志控件拖慢大矩阵分析
+LOG_EACH_LIMIT = 5000
+# 不逐条输出日志时，工作线程的失败日志最多逐条输出的条数，其余按类别汇总
+LOG_FAILURE_LIMIT = 100
+# 不逐条输出日志时，进度条的最小刷新间隔（秒）
+PROGRESS_INTERVAL = 0.1
+# 路径图层每次addFeatures提交的要素数
+ROUTE_ADD_BATCH = 5000
+# 路径写入GeoPackage时的图层名
+ROUTE_GPKG_LAYER = 'od_routes'
 
-def run_choose_my_destination(dlg):
-    # 新增：支持起点图层-终点图层批量OD分析
-    start_layer = getattr(dlg, 'get_start_layer', None)
-    if start_layer and callable(start_layer):
-        start_layer = dlg.get_start_layer()
+_od_cache = None
+
+def get_od_cache(ttl_days=DEFAULT_TTL_DAYS):
+    """返回用户配置目录下的可达性缓存，多次分析共用同一连接"""
+    global _od_cache
+    if _od_cache is None:
+        path = os.path.join(QgsApplication.qgisSettingsDirPath(), 'choose_my_destination', 'od_cache.sqlite')
+        _od_cache = TravelTimeCache(path, ttl_days)
     else:
-        start_layer = None
-    dest_layer = dlg.get_layer()
-    field_settings = dlg.get_field_settings()
-    accessibility_weight = dlg.get_accessibility_weight()  # 确保此处定义
-    dest_id_field = dlg.get_dest_id_field()
-    mode = dlg.get_mode()
-    export_path = dlg.get_export_path()
-    key = dlg.get_key()
-    city = None  # 可扩展为UI输入
-    # 获取起点
-    if start_layer:
-        start_features = list(start_layer.getFeatures())
+        _od_cache.ttl = float(ttl_days) * 86400 if ttl_days else 0
+    return _od_cache
+
+class AmapRoutingBackend(RoutingBackend):
+    """高德路径后端：逐对或批量请求可达性，读写本地可达性缓存；要导出路径时，逐对响应中的路径折线保留下来供导出复用
+
+    多起点且出行方式支持时使用/v3/distance批量接口；路径为GCJ-02坐标
+    """
+
+    routes_gcj = True
+
+    def __init__(self, params, reporter):
+        self.mode = params.mode
+        self.city = params.city
+        self.concurrency = params.concurrency
+        self.use_batch_distance = params.use_batch_distance
+        self.retain_routes = params.retain_routes
+        self.signature = params.mode
+        # 按Key共享限流器：QPS与日配额；填写多个Key时组成Key池轮流使用，配额用尽的Key自动跳过
+        self.key = rate_limiter.configure_keys(params.keys, params.qps, params.daily_quota)
+        if isinstance(self.key, rate_limiter.KeyPool):
+            reporter.append_log(f'使用 {len(self.key)} 个Key轮流请求，每个Key限速 {params.qps} 次/秒')
+        # 连接池大小与并发数一致，保证每个工作线程都能复用keep-alive连接
+        http_client.configure(pool_size=params.concurrency)
+        self.cache = None
+        if params.use_cache:
+            try:
+                self.cache = get_od_cache(params.cache_ttl_days)
+            except Exception as e:
+                reporter.append_log(f'可达性缓存打开失败，将直接请求API: {e}')
+        self.route_store = None
+        # 单个Key或Key池全部配额用尽后，本次分析不再发起任何请求，与停止分析相同
+        self.quota_exhausted = threading.Event()
+        self._quota_lock = threading.Lock()
+
+    def _stop_on_quota(self, error, log):
+        # 多个工作线程会先后遇到配额用尽，只记录第一次
+        with self._quota_lock:
+            if self.quota_exhausted.is_set():
+                return
+            self.quota_exhausted.set()
+        log.append_log(f'Key配额已用尽，停止发起请求，尚未查询的OD对不计为不可达: {error}')
+
+    def iter_travel_times(self, matrix, rows, log, should_stop):
+        mode, city, key, cache = self.mode, self.city, self.key, self.cache
+        # 配额用尽后不再提交新任务，已发出请求的结果照常回收；排队中的任务直接返回nan
+        quota_exhausted = self.quota_exhausted.is_set
+        use_batch = len(matrix.origins) > 1 and mode in DISTANCE_API_TYPES and self.use_batch_distance
+        # 逐对查询的响应中已包含路径，保留下来供导出路径时复用；批量距离接口不返回几何
+        route_store = self.route_store = RouteStore() if self.retain_routes and not use_batch else None
+        origins, dests = matrix.origins, matrix.dests
+
+        def query(o_gcj, d_gcj):
+            # 已请求停止时，尚未发出的请求直接放弃，不再消耗配额；返回nan表示未查询，不当作不可达
+            if should_stop() or quota_exhausted():
+                return float('nan'), float('nan')
+            try:
+                return get_travel_time_gcj(o_gcj, d_gcj, mode, key, city, log, cache, route_store)
+            except rate_limiter.QuotaExceededError as e:
+                self._stop_on_quota(e, log)
+                return float('nan'), float('nan')
+
+        def query_batch(o_gcj_list, d_gcj):
+            if should_stop() or quota_exhausted():
+                return [(float('nan'), float('nan'))] * len(o_gcj_list)
+            try:
+                return get_travel_times_gcj_batch(o_gcj_list, d_gcj, mode, key, city, log, cache)
+            except rate_limiter.QuotaExceededError as e:
+                self._stop_on_quota(e, log)
+                return [(float('nan'), float('nan'))] * len(o_gcj_list)
+
+        if use_batch:
+            log.append_log('使用高德批量距离接口，每次请求最多合并100个起点')
+            return iter_batch_travel_times(distance_batches(matrix, rows), query_batch, self.concurrency, should_stop,
+                                           quota_exhausted)
+        jobs = ((idx, origins.gcj(matrix.origin_index[idx]), dests.gcj(matrix.dest_index[idx]))
+                for idx in rows.tolist())
+        return iter_travel_times(jobs, query, self.concurrency, should_stop, quota_exhausted)
+
+    def iter_routes(self, rows, log, should_stop):
+        key = self.key
+        route_store = self.route_store
+        quota_exhausted = self.quota_exhausted.is_set
+
+        def fetch(r):
+            # 返回 (折线, 是否复用已保留路径)；已请求停止时放弃尚未发出的请求
+            polyline = route_store.get(r['s_gcj'], r['d_gcj']) if route_store is not None else None
+            if polyline is not None:
+                return polyline, True
+            if should_stop() or quota_exhausted():
+                return None, False
+            try:
+                return get_route_amap(r['s_wgs'], r['d_wgs'], self.mode, key, self.city, log), False
+            except rate_limiter.QuotaExceededError as e:
+                self._stop_on_quota(e, log)
+                return None, False
+
+        reused = requested = 0
+        tasks = ((k, (r,)) for k, r in enumerate(rows))
+        # 按行顺序产出，路径要素与输入行的顺序一致
+        for k, result, error in iter_concurrent(tasks, fetch, self.concurrency, should_stop, ordered=True,
+                                                stop_submitting=quota_exhausted):
+            if error is not None:
+                requested += 1
+                log.append_log(f'路径导出出错: {error}')
+                yield k, None
+                continue
+            polyline, was_reused = result
+            if was_reused:
+                reused += 1
+            elif polyline is not None:
+                requested += 1
+            yield k, polyline if polyline is not None and len(polyline) >= 2 else None
+        if route_store is not None:
+            log.append_log(f'路径导出：复用已保留路径 {reused} 条，补充请求 {requested} 条')
+
+    def log_stats(self, reporter):
+        if self.cache is not None:
+            reporter.append_log(f'可达性缓存命中: {self.cache.hits}, 未命中: {self.cache.misses}')
+            if self.cache.errors:
+                reporter.append_log(f'可达性缓存读写出错 {self.cache.errors} 次（如多个进程同时写入），这些OD对已直接请求API')
+            self.cache.hits = self.cache.misses = self.cache.errors = 0
+        if isinstance(self.key, rate_limiter.KeyPool):
+            for k, used, exhausted in self.key.stats():
+                reporter.append_log(f"Key …{k[-4:]}: 今日已用 {used} 次{'，已用尽' if exhausted else ''}")
+        if self.route_store is not None:
+            reporter.append_log(f'已保留 {len(self.route_store)} 条路径几何，压缩后约 {self.route_store.nbytes / 1024:.1f} KB')
+
+    def release(self):
+        self.route_store = None
+
+def create_routing_backend(params, reporter):
+    """按参数创建路径后端：指定道路图层时为离线路网，否则为高德API；参数不可用时记录日志并返回None"""
+    if params.road_source is None:
+        return AmapRoutingBackend(params, reporter)
+    # 出行方式决定路网上的速度：驾车按道路速度并遵守单行，步行、骑行按固定速度
+    try:
+        use_road_attrs, speed = travel_profile(params.mode, params.road_default_speed)
+    except ValueError as e:
+        reporter.append_log(str(e))
+        return None
+    graph = load_road_graph(params.road_source, params.road_crs, params.transform_context, params.road_fields,
+                            params.road_speed_field if use_road_attrs else '',
+                            params.road_oneway_field if use_road_attrs else '', speed)
+    if not len(graph):
+        reporter.append_log('路网图层中没有可用的道路')
+        return None
+    reporter.append_log(f'使用离线路网计算可达性：{len(graph)} 个节点，{graph.edge_count} 条边，不请求高德API')
+    return LocalRoutingBackend(graph, speed)
+
+def collect_od_matrix(params, reporter):
+    """路径阶段：读取起终点并并发查询每个OD对的时长和距离，返回ODMatrix；参数不全时返回None
+
+    可在后台线程中运行：只读取params，通过reporter.append_log/set_progress汇报进度，
+    reporter.is_canceled()返回True时停止发起新请求，返回已完成部分
+    """
+    field_settings = params.field_settings
+    dest_id_field = params.dest_id_field
+    mode = params.mode
+    city = params.city
+    # 路径后端：高德API，或指定道路图层时的离线路网
+    backend = create_routing_backend(params, reporter)
+    if backend is None:
+        return None
+    # 获取起点：选择了起点图层时按起点×终点计算OD矩阵，否则为单点模式
+    # 起终点图层流式读取（只请求ID字段和评分字段），坐标整层一次性转换为WGS84和GCJ-02，保存为数组
+    if params.start_source is not None:
+        origins = PointSet.from_source(params.start_source, params.start_crs, params.transform_context)
+        if not len(origins):
+            reporter.append_log('起点图层中没有要素')
+            return None
     else:
         # 单点模式
-        start_pt = dlg.get_start_point()
+        start_pt = params.start_point
         if not start_pt:
-            dlg.append_log('请先输入或选择起点')
-            return
-        # 构造虚拟feature
-        from qgis.core import QgsFeature, QgsGeometry, QgsPointXY
-        f = QgsFeature()
-        f.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(*start_pt)))
-        start_features = [f]
-    dest_features = list(dest_layer.getFeatures())
-    # 坐标转换器
-    project_crs = dest_layer.crs()
-    wgs84 = QgsCoordinateReferenceSystem('EPSG:4326')
-    to_wgs84 = QgsCoordinateTransform(project_crs, wgs84, QgsProject.instance())
+            reporter.append_log('请先输入或选择起点')
+            return None
+        origins = PointSet([0], [start_pt[0]], [start_pt[1]])
+    dests = PointSet.from_source(params.dest_source, params.dest_crs, params.transform_context,
+                                 params.dest_fields, dest_id_field, list(field_settings))
     # 1. 设置进度条最大值和初始值
-    total_count = len(dest_features)
-    if hasattr(dlg, 'progressBar'):
-        dlg.progressBar.setMaximum(total_count)
-        dlg.progressBar.setValue(0)
-        dlg.progressBar.setFormat(f"0/{total_count} (0.0%)")
-
-    # 2. 数据收集、归一化、评分合并
-    all_results = []
-    best_result = None
-    minmax = {}
-    norm_fields = list(field_settings.keys()) + ['可达性']
-    # 先收集所有原始值
-    raw_values = {field: [] for field in norm_fields}
-    for d in dest_features:
-        for field in norm_fields:
-            if field in d.fields().names() and isinstance(d[field], (int, float)):
-                raw_values[field].append(d[field])
-    # 主循环
-    for idx, d in enumerate(dest_features):
-        d_id = d[dest_id_field] if dest_id_field in d.fields().names() else d.id()
-        d_pt = d.geometry().asPoint()
-        d_wgs = to_wgs84.transform(d_pt)
-        d_wgs_tuple = (float(d_wgs.x()), float(d_wgs.y()))
-        if start_layer:
-            s = start_features[0]
-            s_pt = s.geometry().asPoint()
-            s_proj = s_pt
-            s_wgs = to_wgs84.transform(s_pt)
-            s_wgs_tuple = (float(s_wgs.x()), float(s_wgs.y()))
-        else:
-            s_proj = QgsPointXY(*start_pt)
-            s_wgs_tuple = start_pt
-        duration, distance = get_travel_time_amap(s_wgs_tuple, d_wgs_tuple, mode, key, city, dlg)
-        attrs = {field: d[field] for field in field_settings if field in d.fields().names() and isinstance(d[field], (int, float))}
-        attrs['可达性'] = duration
-        attrs['距离'] = distance
-        for field in norm_fields:
-            raw_values[field].append(attrs.get(field, 0))
-        row = {
-            'start': s if start_layer else None, 'dest': d, 'duration': duration, 'distance': distance, 'attrs': attrs,
-            's_proj': s_proj, 'd_proj': d_pt, 's_wgs': s_wgs_tuple, 'd_wgs': d_wgs_tuple,
-            'dest_id': d_id
-        }
-        all_results.append(row)
-        # 日志输出和进度条刷新，确保实时
-        dest_id_val = d_id
-        dlg.append_log(f"起点→终点[{dest_id_val}] 路径用时: {duration:.1f}s, 距离: {distance:.1f}m")
-        if hasattr(dlg, 'progressBar'):
-            dlg.progressBar.setValue(idx + 1)
-            percent = (idx + 1) / total_count * 100
-            dlg.progressBar.setFormat(f"{idx + 1}/{total_count} ({percent:.1f}%) 终点ID: {dest_id_val}")
-        QtWidgets.QApplication.processEvents()
-        time.sleep(0.5)
-    # 计算minmax
-    for field in norm_fields:
-        values = raw_values[field]
-        minmax[field] = (min(values), max(values)) if values else (0, 0)
-    # 归一化、评分、日志输出
-    for idx, r in enumerate(all_results):
-        normalized_attrs = {}
-        for field in norm_fields:
-            v = r['attrs'].get(field, 0)
-            min_v, max_v = minmax[field]
-            norm_type = field_settings[field]['normalize'] if field in field_settings else '无需归一化'
-            if max_v > min_v:
-                if norm_type == '1-(value-min)/(max-min)' and field != '可达性':
-                    normalized_attrs[field] = 1 - (v - min_v) / (max_v - min_v)
-                elif norm_type == '(value-min)/(max-min)' and field != '可达性':
-                    normalized_attrs[field] = (v - min_v) / (max_v - min_v)
-                elif field == '可达性':
-                    normalized_attrs[field] = 1 - (v - min_v) / (max_v - min_v)
-                else:
-                    normalized_attrs[field] = v
-            else:
-                normalized_attrs[field] = 0.0
-        # 评分
-        score = 0.0
-        for field in field_settings:
-            weight = field_settings[field]['weight']
-            score += normalized_attrs.get(field, 0) * weight
-        score += normalized_attrs.get('可达性', 0) * accessibility_weight
-        r['normalized_attrs'] = normalized_attrs
-        r['score'] = score
-        # 日志输出（路径用时）
-        dest_id_val = r['dest_id']
-        dlg.append_log(f"起点→终点[{dest_id_val}] 路径用时: {r['duration']:.1f}s, 距离: {r['distance']:.1f}m, 评分: {score:.3f}")
-        QtWidgets.QApplication.processEvents()
-        # 选最佳
-        if best_result is None or score > best_result['score']:
-            best_result = r
-    best_results = [best_result] if best_result else []
-    # 分析结束后不隐藏进度条
+    total_count = len(origins) * len(dests)
+    reporter.set_progress(0, total_count)
+    if len(origins) > 1:
+        reporter.append_log(f'OD矩阵模式: {len(origins)}个起点 × {len(dests)}个终点，共{total_count}个OD对')
 
-    # 4. 导出OD结果csv（全部为归一化值，增加normalized_accessibility，覆盖写入）
-    if export_path:
+    # 2. 数据收集：先按列构造OD对（起点下标×终点下标），再并发查询可达性并按行号回填
+    # 可选的直线距离预筛选：每个起点只保留近处的候选终点
+    use_prefilter = params.prefilter_top_k > 0 or params.prefilter_radius > 0 or params.prefilter_max_time > 0
+    if use_prefilter:
+        dest_index_parts = [select_candidates(origins.wgs(i), dests.lons, dests.lats, mode, params.prefilter_top_k,
+                                              params.prefilter_radius, params.prefilter_max_time)
+                            for i in range(len(origins))]
+        origin_index = np.repeat(np.arange(len(origins)), [len(part) for part in dest_index_parts])
+        dest_index = np.concatenate(dest_index_parts) if dest_index_parts else np.zeros(0, dtype=int)
+    else:
+        origin_index = np.repeat(np.arange(len(origins)), len(dests))
+        dest_index = np.tile(np.arange(len(dests)), len(origins))
+    matrix = ODMatrix(origins, dests, origin_index, dest_index, mode=mode, city=city)
+    if use_prefilter:
+        reporter.append_log(f'直线距离预筛选：保留 {len(matrix)}/{total_count} 个OD对')
+        total_count = len(matrix)
+        reporter.set_progress(0, total_count)
+    # 断点续跑：已记录在断点文件中的OD对直接回填，不再请求
+    journal = None
+    if params.journal_path:
         try:
-            csv_path = export_path if export_path.endswith('.csv') else export_path + '.csv'
-            with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                # 字段头
-                start_fields = ['start_id']
-                dest_fields = ['dest_id']
-                norm_fields2 = list(field_settings.keys())
-                writer.writerow(start_fields + dest_fields + norm_fields2 + ['normalized_accessibility', 'duration', 'distance', 'score'])
-                for r in all_results:
-                    s_id = r['start'].id() if start_layer else 0
-                    d_id = r['dest_id']
-                    norm_vals = [r['normalized_attrs'].get(f, '') for f in norm_fields2]
-                    norm_access = r['normalized_attrs'].get('可达性', '')
-                    writer.writerow([s_id, d_id] + norm_vals + [norm_access, r['duration'], r['distance'], r.get('score', '')])
-            dlg.append_log(f'已导出所有OD路径csv：{csv_path}')
+            journal = ODJournal(params.journal_path, journal_signature(backend.signature, city, origins, dests), params.resume)
         except Exception as e:
-            dlg.append_log(f'OD结果csv导出出错: {e}')
+            reporter.append_log(f'断点文件打开失败，本次不记录进度: {e}')
+    resumed_count = 0
+    if journal is not None and journal.resumed:
+        resumed_count = _fill_from_journal(matrix, journal)
+        reporter.append_log(f'从断点文件恢复 {resumed_count}/{len(matrix)} 个OD对，只请求其余部分')
+    pending = np.flatnonzero(np.isnan(matrix.duration))
+    # OD对过多时不再逐条写日志（失败日志超过上限后按类别汇总），进度也按时间间隔刷新
+    log_each = total_count <= LOG_EACH_LIMIT
+    log_queue = QueuedLog(None if log_each else LOG_FAILURE_LIMIT)
+    matrix.backend = backend
+    results_iter = backend.iter_travel_times(matrix, pending, log_queue, reporter.is_canceled)
+    multi_origin = len(origins) > 1
+    done_count = resumed_count
+    last_progress = 0.0
+    if resumed_count:
+        reporter.set_progress(done_count, total_count)
+    for idx, duration, distance in results_iter:
+        # 停止后不再接收结果（中断迭代时引擎取消排队中的任务），矩阵中只保留停止前已完成的OD对
+        if reporter.is_canceled():
+            break
+        if np.isnan(duration):
+            continue
+        matrix.duration[idx] = duration
+        matrix.distance[idx] = distance
+        done_count += 1
+        # 失败结果（inf）不记录，续跑时重新请求
+        if journal is not None and distance != float('inf'):
+            journal.record(matrix.origin_index[idx], matrix.dest_index[idx], duration, distance)
+        # 日志输出和进度条刷新
+        log_queue.flush(reporter)
+        dest_id_val = matrix.dest_id(idx)
+        start_label = f"起点[{matrix.start_id(idx)}]" if multi_origin else '起点'
+        if log_each:
+            reporter.append_log(f"{start_label}→终点[{dest_id_val}] 路径用时: {duration:.1f}s, 距离: {distance:.1f}m")
+        now = time.monotonic()
+        if log_each or done_count == total_count or now - last_progress >= PROGRESS_INTERVAL:
+            last_progress = now
+            reporter.set_progress(done_count, total_count, f"终点ID: {dest_id_val}")
+    results_iter.close()
+    log_queue.flush_summary(reporter)
+    if journal is not None:
+        journal.close()
+    backend.log_stats(reporter)
+    unqueried = np.isnan(matrix.duration)
+    if reporter.is_canceled() or unqueried.any():
+        # 停止或Key配额用尽时只保留已完成的OD对，评分基于这部分结果；未查询的OD对不当作不可达
+        matrix = matrix.subset(~unqueried)
+        if reporter.is_canceled():
+            reporter.append_log(f'分析已停止，已完成 {done_count}/{total_count} 个OD对，将基于已完成结果评分')
+            reporter.set_progress(done_count, total_count, '已停止')
+        else:
+            reporter.append_log(f'请求已中止，已完成 {done_count}/{total_count} 个OD对，'
+                                f'其余 {int(np.count_nonzero(unqueried))} 个未查询，评分只基于已完成的OD对')
+        if journal is not None:
+            reporter.append_log(f'进度已记录到 {params.journal_path}，勾选“断点续跑”重新运行可继续')
+    elif journal is not None and np.isinf(matrix.distance).any():
+        reporter.append_log(f'进度已记录到 {params.journal_path}，勾选“断点续跑”重新运行可补查失败的OD对')
+    return matrix
+
+def score_matrix(matrix, field_settings, accessibility_weight, clip_percent=0, reporter=None):
+    """对OD矩阵评分，结果写入matrix.score和matrix.normalized，返回评分最高的可达行下标（没有可达行时为None）"""
+    columns = {field: matrix.column(field) for field in list(field_settings) + [ACCESSIBILITY_FIELD]}
+    reachable = np.isfinite(matrix.duration)
+    scores, matrix.normalized = score_results(columns, field_settings, accessibility_weight, clip_percent)
+    weights = [settings['weight'] for settings in field_settings.values()] + [accessibility_weight]
+    matrix.unreachable_score = unreachable_penalty(scores[reachable], weights)
+    matrix.score = scores
+    unreachable_count = len(matrix) - int(np.count_nonzero(reachable))
+    if reporter is not None and unreachable_count:
+        reporter.append_log(f'不可达OD对: {unreachable_count}/{len(matrix)}，不参与归一化统计，评分记为 {matrix.unreachable_score:.3f}')
+    if not reachable.any():
+        return None
+    return best_index(matrix.score)
+
+def export_od_csv(matrix, field_settings, export_path, reporter):
+    # 导出OD结果csv（全部为归一化值，增加normalized_accessibility，覆盖写入）
+    try:
+        csv_path = export_path if export_path.endswith('.csv') else export_path + '.csv'
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            # 字段头
+            start_fields = ['start_id']
+            dest_fields = ['dest_id']
+            norm_fields2 = list(field_settings.keys())
+            writer.writerow(start_fields + dest_fields + norm_fields2 + ['normalized_accessibility', 'duration', 'distance', 'score', 'rank'])
+            # 按列取值后逐行写出，不为每行构造字典
+            start_ids = [matrix.origins.ids[i] for i in matrix.origin_index.tolist()]
+            dest_ids = [matrix.dests.ids[j] for j in matrix.dest_index.tolist()]
+            empty = [''] * len(matrix)
+            norm_cols = [matrix.normalized[f].tolist() if f in matrix.normalized else empty for f in norm_fields2]
+            norm_access = matrix.normalized[ACCESSIBILITY_FIELD].tolist() if ACCESSIBILITY_FIELD in matrix.normalized else empty
+            # 名次只记录每个起点的前K名，其余留空
+            ranks = [rank or '' for rank in matrix.rank.tolist()]
+            columns = [start_ids, dest_ids] + norm_cols + [norm_access, matrix.duration.tolist(), matrix.distance.tolist(), matrix.score.tolist(), ranks]
+            writer.writerows(zip(*columns))
+        reporter.append_log(f'已导出所有OD路径csv：{csv_path}')
+    except Exception as e:
+        reporter.append_log(f'OD结果csv导出出错: {e}')
+
+def _log_ranked(reporter, prefix, rows, top_k):
+    if top_k == 1:
+        r = rows[0]
+        reporter.append_log(f"{prefix}: {r['dest_id']}, 综合评分: {r['score']:.2f}, 可达性: {r['duration']:.1f}s")
+        return
+    reporter.append_log(f"{prefix}（前{len(rows)}名）:")
+    for r in rows:
+        reporter.append_log(f"  第{r['rank']}名: {r['dest_id']}, 综合评分: {r['score']:.2f}, 可达性: {r['duration']:.1f}s")
+
+def rank_results(matrix, best, top_k, reporter):
+    """写入每个起点前top_k名的名次（matrix.rank）并输出日志
+
+    返回 (需导出路径的行列表, 需高亮的目的地行列表)，行为matrix.row()字典。
+    多起点时高亮跨起点平均评分的前top_k个目的地，其score为平均评分、rank为综合名次。
+    """
     # 显示最终最佳路径信息
-    if best_results:
-        best = best_results[0]
-        best_dest_id = best['dest_id']
-        best_score = best['score']
-        best_duration = best['duration']
-        dlg.append_log(f"最终最佳目的地: {best_dest_id}, 综合评分: {best_score:.2f}, 可达性: {best_duration:.1f}s")
+    matrix.rank[:] = 0
+    if best is None:
+        reporter.append_log("没有找到可达的目的地")
+        return [], []
+    top_k = max(1, int(top_k or 1))
+    # 不可达的OD对不参与排名
+    ranked = top_k_per_origin(matrix.origin_index, np.where(np.isfinite(matrix.duration), matrix.score, np.nan), top_k)
+    for rows in ranked.values():
+        matrix.rank[rows] = np.arange(1, len(rows) + 1)
+    ranked_rows = {i: [matrix.row(k) for k in rows] for i, rows in ranked.items()}
+    route_rows = [r for rows in ranked_rows.values() for r in rows]
+    if len(ranked) <= 1:
+        _log_ranked(reporter, '最终最佳目的地', route_rows, top_k)
+        return route_rows, route_rows
+    # 多起点：每个起点各自的前K名，以及跨起点的综合排名
+    for rows in ranked_rows.values():
+        _log_ranked(reporter, f"起点[{rows[0]['start_id']}]最佳目的地", rows, top_k)
+    highlight_rows = []
+    # 按全部起点求平均：被预筛选排除的OD对按不可达评分计入，只对少数起点评估过的终点不会排在前面
+    aggregated = aggregate_top_k(matrix.dest_index, matrix.score, top_k, len(matrix.origins),
+                                 matrix.unreachable_score)
+    for rank, (k, mean) in enumerate(aggregated, 1):
+        r = matrix.row(k)
+        r['rank'] = rank
+        r['score'] = mean
+        highlight_rows.append(r)
+    if top_k == 1:
+        reporter.append_log(f"全部起点综合最佳目的地: {highlight_rows[0]['dest_id']}, 平均评分: {highlight_rows[0]['score']:.2f}")
     else:
-        dlg.append_log("没有找到可达的目的地")
-    # 导出路径图层 - 只导出最佳路径
+        reporter.append_log(f"全部起点综合排名（前{len(highlight_rows)}名）:")
+        for r in highlight_rows:
+            reporter.append_log(f"  第{r['rank']}名: {r['dest_id']}, 平均评分: {r['score']:.2f}")
+    return route_rows, highlight_rows
+
+def rescore_choose_my_destination(dlg):
+    """评分阶段：用当前权重和归一化方式对上次的OD矩阵重新评分，不调用高德API"""
+    matrix = getattr(dlg, 'last_matrix', None)
+    if matrix is None:
+        dlg.append_log('没有可用的OD矩阵，请先运行分析或载入OD矩阵')
+        return
+    field_settings = dlg.get_field_settings()
+    missing = [f for f in field_settings if not matrix.has_field(f)]
+    if missing:
+        dlg.append_log(f"OD矩阵中没有以下字段的值，按0处理: {', '.join(missing)}")
+    best = score_matrix(matrix, field_settings, dlg.get_accessibility_weight(), dlg.get_clip_percent(), dlg)
+    rank_results(matrix, best, dlg.get_top_k(), dlg)
+    export_path = dlg.get_export_path()
     if export_path:
+        export_od_csv(matrix, field_settings, export_path, dlg)
+
+def _fill_from_journal(matrix, journal):
+    """把断点文件中已完成的OD对回填到matrix，返回回填的行数"""
+    done_o, done_d, done_duration, done_distance = journal.load()
+    if not len(done_o) or not len(matrix):
+        return 0
+    n_dests = len(matrix.dests)
+    keys = matrix.origin_index.astype(np.int64) * n_dests + matrix.dest_index
+    done_keys = done_o * n_dests + done_d
+    order = np.argsort(keys)
+    pos = np.minimum(np.searchsorted(keys, done_keys, sorter=order), len(keys) - 1)
+    # 预筛选条件变化时，断点中可能有本次不需要的OD对
+    hit = keys[order[pos]] == done_keys
+    rows = order[pos[hit]]
+    matrix.duration[rows] = done_duration[hit]
+    matrix.distance[rows] = done_distance[hit]
+    return len(rows)
+
+def build_route_features(route_rows, backend, params, reporter):
+    """由路径后端取得OD对的路径并转换到工程坐标，返回 [(geometry, attrs), ...]；可在后台线程中运行
+
+    停止后不再发起新的路径请求。全部路径的坐标拼接后一次性完成GCJ-02→WGS84转换（仅高德路径）
+    和工程坐标投影，再按各路径的点数切分。
+    """
+    rows = [r for r in route_rows if r['duration'] != float('inf')]
+    log_queue = QueuedLog(None if len(rows) <= LOG_EACH_LIMIT else LOG_FAILURE_LIMIT)
+    polylines = []
+    attrs_list = []
+    for k, polyline in backend.iter_routes(rows, log_queue, reporter.is_canceled):
+        log_queue.flush(reporter)
+        if polyline is None:
+            continue
+        polylines.append(np.asarray(polyline, dtype=float).reshape(-1, 2))
+        attrs_list.append(_route_attrs(rows[k], params.field_settings))
+    log_queue.flush_summary(reporter)
+    if reporter.is_canceled():
+        reporter.append_log('分析已停止，跳过剩余路径的请求')
+    if not polylines:
+        return []
+    try:
+        coords = np.concatenate(polylines)
+        lons_wgs, lats_wgs = coords[:, 0], coords[:, 1]
+        if backend.routes_gcj:
+            lons_wgs, lats_wgs = gcj2wgs_array(lons_wgs, lats_wgs)
+        xs, ys = transform_xy(lons_wgs, lats_wgs, QgsCoordinateReferenceSystem('EPSG:4326'),
+                              params.project_crs, params.transform_context)
+    except Exception as e:
+        reporter.append_log(f'路径坐标转换出错: {e}')
+        return []
+    bounds = np.cumsum([len(p) for p in polylines])[:-1]
+    return [(QgsGeometry(QgsLineString(x.tolist(), y.tolist())), attrs)
+            for x, y, attrs in zip(np.split(xs, bounds), np.split(ys, bounds), attrs_list)]
+
+def _route_attrs(r, field_settings):
+    attrs = [r['start_id'], r['dest_id'], r['duration'], r['distance'], r.get('score', ''), r.get('rank', 0)]
+    return attrs + [r['attrs'].get(f, '') for f in field_settings]
+
+def route_fields(field_settings):
+    """路径图层的字段表"""
+    fields = QgsFields()
+    for field in [
+        QgsField('start_id', 4),
+        QgsField('dest_id', 10),  # 改为字符串类型以支持自定义ID
+        QgsField('duration', 6, 'double'),
+        QgsField('distance', 6, 'double'),
+        QgsField('score', 6, 'double'),
+        QgsField('rank', 2),
+    ] + [QgsField(f, 10) for f in field_settings]:
+        fields.append(field)
+    return fields
+
+def route_features(routes, fields):
+    """把build_route_features的结果整体构造为QgsFeature列表"""
+    feats = []
+    for geom, attrs in routes:
+        feat = QgsFeature(fields)
+        feat.setGeometry(geom)
+        feat.setAttributes(attrs)
+        feats.append(feat)
+    return feats
+
+def write_route_layer(routes, params):
+    """把路径写入图层并返回：默认为内存图层，指定route_gpkg_path时直接写入GeoPackage
+
+    要素先整体构造，再每ROUTE_ADD_BATCH个调用一次addFeatures，避免逐要素提交
+    """
+    fields = route_fields(params.field_settings)
+    feats = route_features(routes, fields)
+    name = 'OD路径' if params.export_all_routes else '最佳OD路径'
+    crs_proj = params.project_crs
+    if params.route_gpkg_path:
+        return _write_route_gpkg(feats, fields, name, params)
+    vl = QgsVectorLayer(f'LineString?crs={crs_proj.authid()}', name, 'memory')
+    pr = vl.dataProvider()
+    pr.addAttributes(fields.toList())
+    vl.updateFields()
+    for start in range(0, len(feats), ROUTE_ADD_BATCH):
+        pr.addFeatures(feats[start:start + ROUTE_ADD_BATCH])
+    vl.updateExtents()
+    return vl
+
+def _write_route_gpkg(feats, fields, name, params):
+    path = params.route_gpkg_path
+    if hasattr(QgsVectorFileWriter, 'create'):
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = 'GPKG'
+        options.fileEncoding = 'UTF-8'
+        options.layerName = ROUTE_GPKG_LAYER
+        if os.path.exists(path):
+            # 已有的GeoPackage只覆盖路径图层，保留其中的其他图层
+            options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
+        writer = QgsVectorFileWriter.create(path, fields, QgsWkbTypes.LineString, params.project_crs,
+                                            params.transform_context, options)
+        uri = f'{path}|layername={ROUTE_GPKG_LAYER}'
+    else:
+        # QGIS 3.10之前没有QgsVectorFileWriter.create，图层名取文件名
+        writer = QgsVectorFileWriter(path, 'UTF-8', fields, QgsWkbTypes.LineString, params.project_crs, 'GPKG')
+        uri = path
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        raise Exception(f'GeoPackage创建失败: {writer.errorMessage()}')
+    for start in range(0, len(feats), ROUTE_ADD_BATCH):
+        writer.addFeatures(feats[start:start + ROUTE_ADD_BATCH])
+    # 释放writer才会把数据写入磁盘
+    del writer
+    return QgsVectorLayer(uri, name, 'ogr')
+
+class AnalysisResult:
+    """一次完整分析的结果，由后台任务产生、在GUI线程中加载为图层"""
+
+    def __init__(self, matrix, ranked_rows=None, highlight_rows=None, routes=None):
+        self.matrix = matrix
+        self.ranked_rows = ranked_rows or []
+        self.highlight_rows = highlight_rows or []
+        self.routes = routes or []
+
+def run_analysis(params, reporter):
+    """完整分析流程（路径、评分、CSV导出、最佳路径请求），不创建图层，可在后台线程中运行"""
+    matrix = collect_od_matrix(params, reporter)
+    if matrix is None:
+        return None
+    field_settings = params.field_settings
+    export_path = params.export_path
+    # 3. 归一化、评分、日志输出
+    best = score_matrix(matrix, field_settings, params.accessibility_weight, params.clip_percent, reporter)
+    if len(matrix) <= LOG_EACH_LIMIT:
+        multi_origin = len(matrix.origins) > 1
+        for k in range(len(matrix)):
+            # 日志输出（路径用时）
+            start_label = f"起点[{matrix.start_id(k)}]" if multi_origin else '起点'
+            reporter.append_log(f"{start_label}→终点[{matrix.dest_id(k)}] 路径用时: {matrix.duration[k]:.1f}s, 距离: {matrix.distance[k]:.1f}m, 评分: {matrix.score[k]:.3f}")
+    # 分析结束后不隐藏进度条
+
+    # 4. 排名（每个起点前K名），导出OD结果csv
+    ranked_rows, highlight_rows = rank_results(matrix, best, params.top_k, reporter)
+    if export_path:
+        export_od_csv(matrix, field_settings, export_path, reporter)
+    # 默认只为前K名取得路径：单起点导出前K名路径；多起点导出每个起点前K名的路径，并高亮综合排名前K的目的地
+    # 选择导出全部路径时取全部可达OD对
+    routes = []
+    if params.export_routes:
+        if params.export_all_routes:
+            route_rows = [matrix.row(k) for k in np.flatnonzero(np.isfinite(matrix.duration))]
+        else:
+            route_rows = ranked_rows
+        routes = build_route_features(route_rows, matrix.backend, params, reporter)
+    # 保留的路径几何只用于本次导出，不随矩阵保留到下次分析
+    matrix.backend.release()
+    return AnalysisResult(matrix, ranked_rows, highlight_rows, routes)
+
+def show_analysis_result(result, params, dlg):
+    """在GUI线程中保存OD矩阵并把最佳路径、最佳目的地加入工程"""
+    if result is None:
+        return
+    dlg.last_matrix = result.matrix
+    highlight_rows = result.highlight_rows
+    # 导出路径图层 - 前K名或全部可达OD对的路径
+    if params.export_routes:
         try:
-            crs_proj = QgsProject.instance().crs()
-            crs_wgs = QgsCoordinateReferenceSystem('EPSG:4326')
-            xform_to_proj = QgsCoordinateTransform(crs_wgs, crs_proj, QgsProject.instance())
-            vl = QgsVectorLayer(f'LineString?crs={crs_proj.authid()}', '最佳OD路径', 'memory')
-            pr = vl.dataProvider()
-            # 字段
-            pr.addAttributes([
-                QgsField('start_id', 4),
-                QgsField('dest_id', 10),  # 改为字符串类型以支持自定义ID
-                QgsField('duration', 6, 'double'),
-                QgsField('distance', 6, 'double'),
-                QgsField('score', 6, 'double'),
-            ] + [QgsField(f, 10) for f in field_settings])
-            vl.updateFields()
-            for r in best_results:
-                if r['duration'] == float('inf'):
-                    continue
-                try:
-                    polyline = get_route_amap(r['s_wgs'], r['d_wgs'], mode, key, city, dlg)
-                    # 添加延时避免API请求过于频繁
-                    time.sleep(0.5)  # 每次路径请求间隔0.5秒
-                    points = []
-                    for lon_gcj, lat_gcj in polyline:
-                        lon_wgs, lat_wgs = gcj2wgs(lon_gcj, lat_gcj)
-                        pt_wgs = QgsPointXY(lon_wgs, lat_wgs)
-                        pt_proj = xform_to_proj.transform(pt_wgs)
-                        points.append(pt_proj)
-                    if not points:
-                        continue
-                    feat = QgsFeature()
-                    feat.setGeometry(QgsGeometry.fromPolylineXY(points))
-                    attrs = [r['start'].id() if start_layer else 0, r['dest_id'], r['duration'], r['distance'], r.get('score', '')]
-                    attrs += [r['dest'][f] if f in r['dest'].fields().names() else '' for f in field_settings]
-                    feat.setAttributes(attrs)
-                    pr.addFeatures([feat])
-                except Exception as e:
-                    dlg.append_log(f'最佳路径导出出错: {e}')
-            vl.updateExtents()
+            crs_proj = params.project_crs
+            vl = write_route_layer(result.routes, params)
             QgsProject.instance().addMapLayer(vl)
-            dlg.append_log('最佳OD路径图层已添加')
+            target = f'，已写入 {params.route_gpkg_path}' if params.route_gpkg_path else ''
+            dlg.append_log(f'{vl.name()}图层已添加，共 {len(result.routes)} 条路径{target}')
             
-            # 高亮最佳目的地（重写：先添加终点和起点feature，输出详细日志）
-            if best_results:
+            # 高亮前K名目的地（先添加终点和起点feature，输出详细日志）
+            if highlight_rows:
                 try:
-                    best_dest = best_results[0]['dest']
-                    crs_proj = QgsProject.instance().crs()
+                    wgs84 = QgsCoordinateReferenceSystem('EPSG:4326')
+                    to_proj = QgsCoordinateTransform(wgs84, crs_proj, params.transform_context)
                     highlight_vl = QgsVectorLayer(f'Point?crs={crs_proj.authid()}', '最佳目的地', 'memory')
                     highlight_pr = highlight_vl.dataProvider()
                     highlight_pr.addAttributes([
                         QgsField('type', 10),
                         QgsField('id', 10),
                         QgsField('score', 6, 'double'),
-                        QgsField('duration', 6, 'double')
+                        QgsField('duration', 6, 'double'),
+                        QgsField('rank', 2)
                     ])
                     highlight_vl.updateFields()
-                    # 添加终点feature
-                    feat_dest = QgsFeature(highlight_vl.fields())
-                    feat_dest.setGeometry(QgsGeometry.fromPointXY(best_dest.geometry().asPoint()))
-                    feat_dest.setAttributes(['dest', str(best_results[0]['dest_id']), float(best_results[0]['score']), float(best_results[0]['duration'])])
-                    ok1 = highlight_pr.addFeatures([feat_dest])
-                    dlg.append_log(f"终点feature添加结果: {ok1}, 属性: {feat_dest.attributes()}")
+                    # 添加终点feature：第1名为dest，其余为candidate
+                    dest_feats = []
+                    for r in highlight_rows:
+                        feat_dest = QgsFeature(highlight_vl.fields())
+                        # 终点坐标取结果行中的WGS84坐标再投影到工程坐标系，与路径图层一致
+                        feat_dest.setGeometry(QgsGeometry.fromPointXY(to_proj.transform(QgsPointXY(*r['d_wgs']))))
+                        feat_dest.setAttributes(['dest' if r['rank'] == 1 else 'candidate', str(r['dest_id']),
+                                                 float(r['score']), float(r['duration']), r['rank']])
+                        dest_feats.append(feat_dest)
+                    ok1 = highlight_pr.addFeatures(dest_feats)
+                    dlg.append_log(f"终点feature添加结果: {ok1}, 数量: {len(dest_feats)}")
                     # 添加起点feature
-                    start_text = dlg.lineEdit_start.text().strip()
-                    start_xy = dlg.get_start_point()  # (lon, lat) WGS84
+                    start_text = params.start_text
+                    start_xy = params.start_point  # (lon, lat) WGS84
                     if start_xy and start_text:
-                        wgs84 = QgsCoordinateReferenceSystem('EPSG:4326')
-                        to_proj = QgsCoordinateTransform(wgs84, crs_proj, QgsProject.instance())
                         pt_wgs = QgsPointXY(*start_xy)
                         pt_proj = to_proj.transform(pt_wgs)
                         feat_start = QgsFeature(highlight_vl.fields())
                         feat_start.setGeometry(QgsGeometry.fromPointXY(pt_proj))
-                        feat_start.setAttributes(['start', str(start_text), None, None])
+                        feat_start.setAttributes(['start', str(start_text), None, None, None])
                         ok2 = highlight_pr.addFeatures([feat_start])
                         dlg.append_log(f"起点feature添加结果: {ok2}, 属性: {feat_start.attributes()}")
                     else:
                         dlg.append_log(f"未能添加起点高亮，start_xy={start_xy}, start_text={start_text}")
                     highlight_vl.updateExtents()
                     dlg.append_log(f"高亮图层要素数: {highlight_vl.featureCount()}")
-                    # 分类渲染：起点蓝色2pt，终点红色2.5pt
+                    # 分类渲染：起点蓝色2pt，最佳终点红色2.5pt，其余前K名橙色2pt
                     categories = []
                     symbol_start = QgsSymbol.defaultSymbol(highlight_vl.geometryType())
                     symbol_start.setColor(QColor(0, 0, 255))
@@ -380,18 +659,28 @@ def run_choose_my_destination(dlg):
                     symbol_dest.setColor(QColor(255, 0, 0))
                     symbol_dest.setSize(2.5)
                     categories.append(QgsRendererCategory('dest', symbol_dest, 'Destination'))
+                    symbol_candidate = QgsSymbol.defaultSymbol(highlight_vl.geometryType())
+                    symbol_candidate.setColor(QColor(255, 165, 0))
+                    symbol_candidate.setSize(2)
+                    categories.append(QgsRendererCategory('candidate', symbol_candidate, 'Top-K'))
                     renderer = QgsCategorizedSymbolRenderer('type', categories)
                     highlight_vl.setRenderer(renderer)
                     highlight_vl.triggerRepaint()
                     QgsProject.instance().addMapLayer(highlight_vl, addToLegend=True)
-                    dlg.append_log(f'已高亮最佳目的地: {best_results[0]["dest_id"]}，并包含起点')
+                    dlg.append_log(f'已高亮最佳目的地: {highlight_rows[0]["dest_id"]}（共{len(highlight_rows)}个），并包含起点')
                 except Exception as e:
                     dlg.append_log(f'最佳目的地高亮出错: {e}')
         except Exception as e:
             dlg.append_log(f'路径图层导出出错: {e}')
 
+def run_choose_my_destination(dlg):
+    """在当前线程中同步运行完整分析（对话框默认通过后台任务运行）"""
+    params = AnalysisParams.from_dialog(dlg)
+    result = run_analysis(params, dlg)
+    show_analysis_result(result, params, dlg)
+
 def stop_analysis(dlg):
-    dlg._stop_requested = True
+    dlg.stop_analysis()
 
 class ChooseMyDestination(QObject):
     def __init__(self, iface):
@@ -399,9 +688,17 @@ class ChooseMyDestination(QObject):
         self.iface = iface
         self.action = None
         self.dlg = None
+        self.provider = None
         self.plugin_dir = os.path.dirname(__file__)
 
+    def initProcessing(self):
+        """注册Processing算法提供者；metadata.txt中hasProcessingProvider=yes时qgis_process也会调用"""
+        from .processing_provider import ChooseMyDestinationProvider
+        self.provider = ChooseMyDestinationProvider()
+        QgsApplication.processingRegistry().addProvider(self.provider)
+
     def initGui(self):
+        self.initProcessing()
         icon_path = os.path.join(self.plugin_dir, 'icon.png')
         self.action = QAction(QIcon(icon_path), "目的地优选", self.iface.mainWindow())
         self.action.triggered.connect(self.run)
@@ -413,9 +710,14 @@ class ChooseMyDestination(QObject):
             self.iface.removePluginMenu("&目的地优选", self.action)
             self.iface.removeToolBarIcon(self.action)
             self.action = None
+        if self.provider:
+            QgsApplication.processingRegistry().removeProvider(self.provider)
+            self.provider = None
 
     def run(self):
         if not self.dlg:
+            # 对话框只在打开插件时导入，无界面运行（headless）不加载任何界面代码
+            from .choose_my_destination_dialog import ChooseMyDestinationDialog
             self.dlg = ChooseMyDestinationDialog()
         self.dlg.show()
         self.dlg.raise_() 
\ No newline at end of file
@@ -1,7 +1,7 @@
 import os
 from qgis.PyQt import uic, QtWidgets, QtCore
 from qgis.PyQt.QtWidgets import QFileDialog
-from qgis.core import QgsProject, QgsCoordinateTransform, QgsCoordinateReferenceSystem, QgsPointXY
+from qgis.core import QgsApplication, QgsProject, QgsCoordinateTransform, QgsCoordinateReferenceSystem, QgsPointXY
 from qgis.gui import QgsMapToolEmitPoint
 from qgis.utils import iface
 from qgis.PyQt.QtCore import QVariant
@@ -9,16 +9,27 @@ from qgis.PyQt.QtCore import QVariant
 FORM_CLASS, _ = uic.loadUiType(os.path.join(
     os.path.dirname(__file__), 'choose_my_destination_dialog_base.ui'))
 
+NO_START_LAYER = '（无，使用起点坐标）'
+NO_ROAD_LAYER = '（无，使用高德API）'
+
 class ChooseMyDestinationDialog(QtWidgets.QDialog, FORM_CLASS):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setupUi(self)
         self.btn_pick_point.clicked.connect(self.pick_point)
         self.btn_browse_export_path.clicked.connect(self.browse_export_path)
+        self.btn_browse_route_gpkg.clicked.connect(self.browse_route_gpkg)
+        self.btn_browse_journal.clicked.connect(self.browse_journal)
         self.comboBox_layer.currentIndexChanged.connect(self.on_layer_changed)
         self.listWidget_field_select.itemSelectionChanged.connect(self.populate_fields)
         self.btn_start_analysis.clicked.connect(self.run_main_logic)
         self.btn_stop_analysis.clicked.connect(self.stop_analysis)
+        self.btn_rescore.clicked.connect(self.rescore)
+        self.btn_save_matrix.clicked.connect(self.save_matrix)
+        self.btn_load_matrix.clicked.connect(self.load_matrix)
+        self.last_matrix = None
+        self._task = None
+        self._stop_requested = False
         self.populate_layers()
         self.populate_modes()
         self.on_layer_changed()
@@ -38,9 +49,17 @@ class ChooseMyDestinationDialog(QtWidgets.QDialog, FORM_CLASS):
 
     def populate_layers(self):
         self.comboBox_layer.clear()
+        self.comboBox_start_layer.clear()
+        self.comboBox_start_layer.addItem(NO_START_LAYER)
         layers = [lyr for lyr in QgsProject.instance().mapLayers().values() if lyr.type() == 0 and lyr.geometryType() in (0, 4)]
         for lyr in layers:
             self.comboBox_layer.addItem(lyr.name())
+            self.comboBox_start_layer.addItem(lyr.name())
+        self.comboBox_road_layer.clear()
+        self.comboBox_road_layer.addItem(NO_ROAD_LAYER)
+        for lyr in QgsProject.instance().mapLayers().values():
+            if lyr.type() == 0 and lyr.geometryType() == 1:
+                self.comboBox_road_layer.addItem(lyr.name())
 
     def on_layer_changed(self):
         self.populate_field_select()
@@ -48,17 +67,9 @@ class ChooseMyDestinationDialog(QtWidgets.QDialog, FORM_CLASS):
         self.populate_fields()
 
     def refresh_layers(self):
-        from qgis.core import QgsProject
-        self.comboBox_origin_layer.clear()
-        self.comboBox_dest_layer.clear()
-        layers = [lyr for lyr in QgsProject.instance().mapLayers().values() if lyr.type() == 0 and lyr.geometryType() in (0, 4)]
-        for lyr in layers:
-            self.comboBox_origin_layer.addItem(lyr.name())
-            self.comboBox_dest_layer.addItem(lyr.name())
-        self.populate_origin_fields()
-        self.populate_dest_fields()
+        self.populate_layers()
+        self.on_layer_changed()
 
-        
     def populate_field_select(self):
         self.listWidget_field_select.clear()
         layer_name = self.comboBox_layer.currentText()
@@ -92,7 +103,7 @@ class ChooseMyDestinationDialog(QtWidgets.QDialog, FORM_CLASS):
             w_edit = QtWidgets.QLineEdit("1.0")
             self.tableWidget_fields.setCellWidget(i, 1, w_edit)
             norm_combo = QtWidgets.QComboBox()
-            norm_combo.addItems(["无需归一化", "1-(value-min)/(max-min)", "(value-min)/(max-min)"])
+            norm_combo.addItems(["无需归一化", "1-(value-min)/(max-min)", "(value-min)/(max-min)", "(value-mean)/std"])
             self.tableWidget_fields.setCellWidget(i, 2, norm_combo)
         # 三列均匀分配
         header = self.tableWidget_fields.horizontalHeader()
@@ -163,26 +174,157 @@ class ChooseMyDestinationDialog(QtWidgets.QDialog, FORM_CLASS):
     def get_key(self):
         return self.lineEdit_key.text().strip()
 
+    def get_concurrency(self):
+        return self.spinBox_concurrency.value()
+
+    def get_qps(self):
+        return self.doubleSpinBox_qps.value()
+
+    def get_daily_quota(self):
+        return self.spinBox_daily_quota.value()
+
+    def get_prefilter_top_k(self):
+        return self.spinBox_prefilter_top_k.value()
+
+    def get_prefilter_radius_km(self):
+        return self.spinBox_prefilter_radius.value()
+
+    def get_prefilter_max_minutes(self):
+        return self.spinBox_prefilter_max_minutes.value()
+
+    def get_use_batch_distance(self):
+        return self.checkBox_batch_distance.isChecked()
+
+    def get_use_cache(self):
+        return self.checkBox_use_cache.isChecked()
+
+    def get_cache_ttl_days(self):
+        return self.spinBox_cache_ttl.value()
+
+    def get_top_k(self):
+        return self.spinBox_top_k.value()
+
+    def get_clip_percent(self):
+        return self.doubleSpinBox_clip_percent.value()
+
+    def get_retain_routes(self):
+        return self.checkBox_retain_routes.isChecked()
+
+    def get_export_all_routes(self):
+        return self.checkBox_export_all_routes.isChecked()
+
+    def get_route_gpkg_path(self):
+        return self.lineEdit_route_gpkg.text().strip()
+
+    def get_journal_path(self):
+        return self.lineEdit_journal.text().strip()
+
+    def get_resume(self):
+        return self.checkBox_resume.isChecked()
+
     def append_log(self, msg):
         self.textEdit_log.append(msg)
 
+    def set_progress(self, done, total, text=''):
+        self.progressBar.setMaximum(max(total, 1))
+        self.progressBar.setValue(done)
+        percent = done / total * 100 if total else 0.0
+        self.progressBar.setFormat(f"{done}/{total} ({percent:.1f}%) {text}".rstrip())
+
     def run_main_logic(self):
+        if self._task is not None:
+            self.append_log("分析正在进行中，请等待完成或先停止分析")
+            return
         try:
             self._stop_requested = False
-            from .choose_my_destination import run_choose_my_destination
-            run_choose_my_destination(self)
+            from .analysis_params import AnalysisParams
+            from .analysis_task import ChooseMyDestinationTask
+            params = AnalysisParams.from_dialog(self)
+            task = ChooseMyDestinationTask(params)
+            task.log_message.connect(self.append_log)
+            task.progress_updated.connect(self.set_progress)
+            task.taskCompleted.connect(self.on_task_completed)
+            task.taskTerminated.connect(self.on_task_terminated)
+            self._task = task
+            self.btn_start_analysis.setEnabled(False)
+            QgsApplication.taskManager().addTask(task)
+        except Exception as e:
+            self._task = None
+            self.btn_start_analysis.setEnabled(True)
+            self.append_log(f"运行出错: {e}")
+
+    def on_task_completed(self):
+        task = self._task
+        self._task = None
+        self.btn_start_analysis.setEnabled(True)
+        try:
+            from .choose_my_destination import show_analysis_result
+            show_analysis_result(task.result, task.params, self)
         except Exception as e:
             self.append_log(f"运行出错: {e}")
 
+    def on_task_terminated(self):
+        task = self._task
+        self._task = None
+        self.btn_start_analysis.setEnabled(True)
+        if task is not None and task.exception is not None:
+            self.append_log(f"运行出错: {task.exception}")
+        else:
+            self.append_log("分析已中止")
+
     def stop_analysis(self):
         self._stop_requested = True
-        self.append_log("已请求停止分析，当前任务完成后将中断。")
+        if self._task is not None:
+            self._task.cancel()
+        self.append_log("已请求停止分析，正在取消未完成的请求，将基于已完成的结果评分。")
+
+    def is_canceled(self):
+        return self._stop_requested
+
+    def rescore(self):
+        try:
+            from .choose_my_destination import rescore_choose_my_destination
+            rescore_choose_my_destination(self)
+        except Exception as e:
+            self.append_log(f"重新评分出错: {e}")
+
+    def save_matrix(self):
+        if self.last_matrix is None:
+            self.append_log("没有可保存的OD矩阵，请先运行分析")
+            return
+        filename, _ = QFileDialog.getSaveFileName(self, "保存OD矩阵", "", "JSON Files (*.json)")
+        if filename:
+            try:
+                self.last_matrix.save(filename)
+                self.append_log(f"OD矩阵已保存: {filename}")
+            except Exception as e:
+                self.append_log(f"OD矩阵保存出错: {e}")
+
+    def load_matrix(self):
+        filename, _ = QFileDialog.getOpenFileName(self, "载入OD矩阵", "", "JSON Files (*.json)")
+        if filename:
+            try:
+                from .od_matrix import ODMatrix
+                self.last_matrix = ODMatrix.load(filename)
+                self.append_log(f"OD矩阵已载入: {filename}，共{len(self.last_matrix)}条OD记录")
+            except Exception as e:
+                self.append_log(f"OD矩阵载入出错: {e}")
 
     def browse_export_path(self):
         filename, _ = QFileDialog.getSaveFileName(self, "选择导出CSV文件", "", "CSV Files (*.csv)")
         if filename:
             self.lineEdit_export_path.setText(filename)
 
+    def browse_route_gpkg(self):
+        filename, _ = QFileDialog.getSaveFileName(self, "选择路径GeoPackage文件", "", "GeoPackage (*.gpkg)")
+        if filename:
+            self.lineEdit_route_gpkg.setText(filename)
+
+    def browse_journal(self):
+        filename, _ = QFileDialog.getSaveFileName(self, "选择断点文件", "", "SQLite Files (*.sqlite)")
+        if filename:
+            self.lineEdit_journal.setText(filename)
+
     def pick_point(self):
         self.textEdit_log.append("请在地图上点击选择起点...")
         self._old_map_tool = self.canvas.mapTool()
@@ -216,6 +358,32 @@ class ChooseMyDestinationDialog(QtWidgets.QDialog, FORM_CLASS):
                 return l
         return None 
 
+    def get_start_layer(self):
+        """返回选中的起点图层；未选择时返回None（单点模式）"""
+        name = self.comboBox_start_layer.currentText()
+        if not name or name == NO_START_LAYER:
+            return None
+        for l in QgsProject.instance().mapLayers().values():
+            if l.name() == name:
+                return l
+        return None
+
+    def get_road_layer(self):
+        """返回选中的离线路网图层；未选择时返回None（使用高德API）"""
+        name = self.comboBox_road_layer.currentText()
+        if not name or name == NO_ROAD_LAYER:
+            return None
+        for l in QgsProject.instance().mapLayers().values():
+            if l.name() == name:
+                return l
+        return None
+
+    def get_road_speed_field(self):
+        return self.lineEdit_road_speed_field.text().strip()
+
+    def get_road_default_speed(self):
+        return self.doubleSpinBox_road_speed.value()
+
     def get_start_point(self):
         text = self.lineEdit_start.text().strip()
         if ',' in text:
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# 无界面运行：不经过对话框，直接由Python代码或命令行调用完整分析，输出CSV/GeoPackage，供定时任务和多进程批量计算使用
+#
+# 命令行用法（插件目录的上级目录需在PYTHONPATH中，使用QGIS自带的Python）：
+#   python -m choose_my_destination.headless --dest dests.gpkg --field 人口:0.5 --field 房价:-0.3:asc \
+#       --mode driving --key-file keys.txt --start 116.397,39.909 --csv od.csv --gpkg routes.gpkg
+import argparse
+import signal
+import sys
+
+from qgis.core import QgsApplication, QgsCoordinateTransformContext, QgsVectorLayer
+
+from .analysis_params import AnalysisParams
+from .choose_my_destination import run_analysis, write_route_layer
+from .scoring import NORMALIZE_ALIASES
+
+MODES = ('driving', 'walking', 'bicycling', 'transit')
+
+
+class ConsoleReporter:
+    """把日志和进度写到流（默认stderr），作为分析流程的reporter；canceled置为True时停止发起新请求"""
+
+    def __init__(self, stream=None, quiet=False):
+        self.stream = stream or sys.stderr
+        self.quiet = quiet
+        self.canceled = False
+        self._last_percent = -1
+
+    def append_log(self, msg):
+        if not self.quiet:
+            print(msg, file=self.stream, flush=True)
+
+    def set_progress(self, done, total, text=''):
+        # 只在整10%变化时输出，避免大矩阵刷屏
+        percent = int(done * 100 / total) // 10 * 10 if total else 0
+        if percent != self._last_percent:
+            self._last_percent = percent
+            self.append_log(f'进度: {done}/{total} ({percent}%)')
+
+    def is_canceled(self):
+        return self.canceled
+
+
+def load_layer(path, name):
+    layer = QgsVectorLayer(path, name, 'ogr')
+    if not layer.isValid():
+        raise Exception(f'无法打开图层: {path}')
+    return layer
+
+
+def run_headless(dest_path, field_settings, key, mode='driving', start_path=None, start_point=None,
+                 csv_path='', gpkg_path='', matrix_path='', crs=None, road_path=None, reporter=None, **options):
+    """不经过对话框运行一次完整分析，返回AnalysisResult（参数不全时为None）
+
+    dest_path/start_path: 目的地、起点点图层的路径（OGR可读的任意格式），不指定start_path时使用start_point（WGS84经纬度）
+    field_settings: {字段名: {'weight': 权重, 'normalize': 归一化方式}}
+    key: 高德Key，多个Key用逗号分隔
+    csv_path/gpkg_path/matrix_path: OD汇总CSV、路径GeoPackage和OD矩阵JSON的输出路径，为空时不输出；
+        只有指定gpkg_path时才请求路径
+    crs: 路径输出的坐标系，默认与目的地图层一致
+    road_path: 离线路网（道路线图层）路径，指定时在本地计算最短路径，不请求高德API
+    options: 传给AnalysisParams的其他参数（concurrency、qps、top_k、journal_path、resume等）
+    """
+    reporter = reporter or ConsoleReporter()
+    dest_layer = load_layer(dest_path, 'dest')
+    start_layer = load_layer(start_path, 'start') if start_path else None
+    road_layer = load_layer(road_path, 'road') if road_path else None
+    params = AnalysisParams(
+        dest_layer, field_settings, key=key, mode=mode, start_layer=start_layer, start_point=start_point,
+        export_path=csv_path, route_gpkg_path=gpkg_path, export_routes=bool(gpkg_path), road_layer=road_layer,
+        project_crs=crs if crs is not None else dest_layer.crs(),
+        transform_context=QgsCoordinateTransformContext(), **options)
+    result = run_analysis(params, reporter)
+    if result is None:
+        return None
+    if gpkg_path:
+        write_route_layer(result.routes, params)
+        reporter.append_log(f'已写入 {len(result.routes)} 条路径: {gpkg_path}')
+    if matrix_path:
+        result.matrix.save(matrix_path)
+        reporter.append_log(f'OD矩阵已保存: {matrix_path}')
+    return result
+
+
+def parse_field(spec):
+    """解析 字段名:权重[:归一化方式]，归一化方式可用简写（none/asc/desc/zscore），默认为asc"""
+    parts = spec.rsplit(':', 2)
+    if len(parts) == 3 and parts[2] in NORMALIZE_ALIASES:
+        name, weight, normalize = parts
+    else:
+        name, weight = spec.rsplit(':', 1)
+        normalize = 'asc'
+    return name, {'weight': float(weight), 'normalize': NORMALIZE_ALIASES[normalize]}
+
+
+def parse_point(text):
+    lon, lat = text.split(',')
+    return float(lon), float(lat)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='目的地优选：无界面批量分析')
+    parser.add_argument('--dest', required=True, help='目的地点图层路径')
+    parser.add_argument('--field', action='append', default=[], type=parse_field,
+                        help='评分字段，格式 字段名:权重[:none|asc|desc|zscore]，可重复')
+    parser.add_argument('--accessibility-weight', type=float, default=1.0, help='可达性权重')
+    parser.add_argument('--dest-id-field', default='', help='目的地ID字段，默认使用要素ID')
+    parser.add_argument('--mode', choices=MODES, default='driving', help='出行方式')
+    parser.add_argument('--city', default=None, help='公交出行所在城市')
+    start = parser.add_mutually_exclusive_group(required=True)
+    start.add_argument('--start', type=parse_point, help='单个起点的WGS84经纬度，格式 lon,lat')
+    start.add_argument('--start-layer', help='起点点图层路径（OD矩阵模式）')
+    keys = parser.add_mutually_exclusive_group()
+    keys.add_argument('--key', help='高德Key，多个Key用逗号分隔')
+    keys.add_argument('--key-file', help='高德Key文件，每行一个Key')
+    parser.add_argument('--road', default=None, help='离线路网（道路线图层）路径，指定时不请求高德API')
+    parser.add_argument('--road-speed-field', default='', help='路网速度字段（公里/小时）')
+    parser.add_argument('--road-oneway-field', default='', help='路网单行标记字段（1/true/yes为沿绘制方向单行）')
+    parser.add_argument('--road-speed', type=float, default=None, help='路网默认速度（公里/小时）')
+    parser.add_argument('--csv', default='', help='OD汇总CSV输出路径')
+    parser.add_argument('--gpkg', default='', help='路径GeoPackage输出路径')
+    parser.add_argument('--matrix', default='', help='OD矩阵JSON输出路径，可在插件中载入后重新评分')
+    parser.add_argument('--all-routes', action='store_true', help='导出全部可达OD对的路径（默认只导出前K名）')
+    parser.add_argument('--top-k', type=int, default=1, help='每个起点输出的前K名')
+    parser.add_argument('--clip-percent', type=float, default=0, help='归一化前按百分位截断各字段')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发请求数')
+    parser.add_argument('--qps', type=float, default=None, help='每个Key的QPS上限')
+    parser.add_argument('--daily-quota', type=int, default=0, help='每个Key的日配额，0表示不限')
+    parser.add_argument('--no-cache', action='store_true', help='不使用本地可达性缓存')
+    parser.add_argument('--no-batch-distance', action='store_true', help='多起点时不使用批量距离接口')
+    parser.add_argument('--journal', default='', help='断点文件路径')
+    parser.add_argument('--resume', action='store_true', help='从断点文件续跑')
+    parser.add_argument('--quiet', action='store_true', help='不输出日志')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.key_file:
+        with open(args.key_file, 'r', encoding='utf-8') as f:
+            key = f.read()
+    else:
+        key = args.key or ''
+    if not key and not args.road:
+        build_parser().error('请用--key或--key-file指定高德Key，或用--road指定离线路网')
+    options = dict(
+        accessibility_weight=args.accessibility_weight, dest_id_field=args.dest_id_field, city=args.city,
+        concurrency=args.concurrency, daily_quota=args.daily_quota, use_cache=not args.no_cache,
+        use_batch_distance=not args.no_batch_distance, top_k=args.top_k, clip_percent=args.clip_percent,
+        export_all_routes=args.all_routes, journal_path=args.journal, resume=args.resume,
+    )
+    if args.qps is not None:
+        options['qps'] = args.qps
+    if args.road:
+        options.update(road_speed_field=args.road_speed_field, road_oneway_field=args.road_oneway_field)
+        if args.road_speed is not None:
+            options['road_default_speed'] = args.road_speed
+    reporter = ConsoleReporter(quiet=args.quiet)
+
+    def on_interrupt(signum, frame):
+        # Ctrl+C：停止发起新请求，基于已完成的OD对评分并输出（断点文件保留进度）；
+        # 恢复默认处理，卡住时再按一次Ctrl+C可直接结束进程
+        reporter.canceled = True
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        reporter.append_log('正在停止，再按一次Ctrl+C立即退出')
+
+    signal.signal(signal.SIGINT, on_interrupt)
+    app = None
+    if QgsApplication.instance() is None:
+        app = QgsApplication([], False)
+        app.initQgis()
+    try:
+        result = run_headless(args.dest, dict(args.field), key, args.mode, args.start_layer, args.start,
+                              args.csv, args.gpkg, args.matrix, road_path=args.road, reporter=reporter, **options)
+    finally:
+        if app is not None:
+            app.exitQgis()
+    if result is None or not result.ranked_rows:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# 高德API共享HTTP客户端：连接池复用keep-alive连接，带超时和指数退避重试
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import rate_limiter
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 15.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 8.0
+
+# 高德返回的可重试infocode/errcode：访问过于频繁、QPS超限、网关超时、服务繁忙
+RETRY_INFOCODES = {'10004', '10014', '10015', '10016', '10019', '10020', '10021'}
+# Key不可用的infocode/errcode：Key不正确或过期、日访问量超限；使用Key池时切换到下一个Key，
+# 单个Key或Key池全部用尽时抛出QuotaExceededError，由调用方停止发起请求
+QUOTA_INFOCODES = {'10001', '10003', '10044', '10045'}
+
+_lock = threading.Lock()
+_session = None
+_pool_size = None
+_settings = {
+    'connect_timeout': DEFAULT_CONNECT_TIMEOUT,
+    'read_timeout': DEFAULT_READ_TIMEOUT,
+    'max_retries': DEFAULT_MAX_RETRIES,
+    'backoff': DEFAULT_BACKOFF,
+}
+
+
+class RetryableResponseError(Exception):
+    """HTTP 429、服务端5xx或高德QPS类错误，可退避后重试；retry_after为服务端要求的等待秒数"""
+
+    def __init__(self, msg, retry_after=None):
+        super().__init__(msg)
+        self.retry_after = retry_after
+
+
+def configure(pool_size=None, connect_timeout=None, read_timeout=None, max_retries=None, backoff=None):
+    """修改连接池大小、超时和重试参数；池大小变化时重建会话"""
+    global _session, _pool_size
+    with _lock:
+        if connect_timeout is not None:
+            _settings['connect_timeout'] = float(connect_timeout)
+        if read_timeout is not None:
+            _settings['read_timeout'] = float(read_timeout)
+        if max_retries is not None:
+            _settings['max_retries'] = int(max_retries)
+        if backoff is not None:
+            _settings['backoff'] = float(backoff)
+        if pool_size is not None and pool_size != _pool_size and _session is not None:
+            _session.close()
+            _session = None
+        if pool_size is not None:
+            _pool_size = int(pool_size)
+
+
+def get_session():
+    global _session, _pool_size
+    with _lock:
+        if _session is None:
+            size = max(1, _pool_size or DEFAULT_POOL_SIZE)
+            _pool_size = size
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def _infocode(data):
+    code = data.get('infocode', data.get('errcode', ''))
+    return str(code) if code is not None else ''
+
+
+def _retry_after(resp):
+    # 只支持秒数形式的Retry-After，HTTP日期形式按未给出处理
+    try:
+        return max(0.0, float(resp.headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """第attempt次（从0开始）重试前的等待秒数：指数退避，服务端给出Retry-After时取较大值，不超过MAX_BACKOFF"""
+    delay = _settings['backoff'] * (2 ** attempt)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return min(MAX_BACKOFF, delay)
+
+
+def get_json(url, key=None):
+    """GET并解析JSON；每次尝试前通过key的限流器取令牌，网络错误、429、5xx和QPS超限时指数退避重试，其他4xx不重试
+
+    url中不含key参数，由本函数附加本次实际使用的Key。key为KeyPool时，
+    高德返回配额类错误的Key当天不再使用，立即换下一个Key重试（不计入重试次数）；
+    单个Key返回配额类错误、本地日配额用尽或Key池全部用尽时抛出rate_limiter.QuotaExceededError
+    """
+    max_retries = _settings['max_retries']
+    timeout = (_settings['connect_timeout'], _settings['read_timeout'])
+    attempt = 0
+    while True:
+        used_key = rate_limiter.acquire(key) if key is not None else None
+        params = {'key': used_key} if used_key else None
+        data = None
+        try:
+            resp = get_session().get(url, params=params, timeout=timeout)
+            if resp.status_code == 429 or resp.status_code >= 500:
+                raise RetryableResponseError(f'HTTP {resp.status_code}', _retry_after(resp))
+            data = resp.json()
+            if isinstance(data, dict) and _infocode(data) in QUOTA_INFOCODES:
+                if isinstance(key, rate_limiter.KeyPool):
+                    key.mark_exhausted(used_key)
+                    continue
+                info = data.get('info', data.get('errmsg', ''))
+                raise rate_limiter.QuotaExceededError(f'Key不可用: {info}（{_infocode(data)}）')
+            if isinstance(data, dict) and _infocode(data) in RETRY_INFOCODES:
+                raise RetryableResponseError(data.get('info', data.get('errmsg', _infocode(data))))
+            return data
+        except (requests.ConnectionError, requests.Timeout, RetryableResponseError) as e:
+            if attempt >= max_retries:
+                # QPS类错误重试用尽时仍返回高德的原始响应，交给调用方按失败处理
+                if data is not None:
+                    return data
+                raise
+            time.sleep(backoff_delay(attempt, getattr(e, 'retry_after', None)))
+            attempt += 1
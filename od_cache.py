@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# 高德可达性结果的本地持久缓存（SQLite），键为取整后的GCJ-02起终点、出行方式和城市
+import os
+import sqlite3
+import threading
+import time
+
+# 坐标保留5位小数（约1米），同一位置的重复请求可以命中缓存
+COORD_DIGITS = 5
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_ENTRIES = 1000000
+# 每写入若干条执行一次淘汰检查
+PRUNE_INTERVAL = 1000
+
+
+def make_key(o_gcj, d_gcj, mode, city=None):
+    o = f'{round(o_gcj[0], COORD_DIGITS):.{COORD_DIGITS}f},{round(o_gcj[1], COORD_DIGITS):.{COORD_DIGITS}f}'
+    d = f'{round(d_gcj[0], COORD_DIGITS):.{COORD_DIGITS}f},{round(d_gcj[1], COORD_DIGITS):.{COORD_DIGITS}f}'
+    return o, d, mode, city or ''
+
+
+class TravelTimeCache:
+    """线程安全的OD可达性缓存，支持TTL过期与按条数淘汰（先删最旧的）
+
+    多个进程共用同一缓存文件时可能遇到“database is locked”等SQLite错误：
+    get按未命中处理、put放弃写入，只计入errors，不影响可达性请求本身
+    """
+
+    def __init__(self, path, ttl_days=DEFAULT_TTL_DAYS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = float(ttl_days) * 86400 if ttl_days else 0
+        self.max_entries = int(max_entries or 0)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS od_cache ('
+            'origin TEXT NOT NULL, dest TEXT NOT NULL, mode TEXT NOT NULL, city TEXT NOT NULL, '
+            'duration REAL NOT NULL, distance REAL NOT NULL, created REAL NOT NULL, '
+            'PRIMARY KEY (origin, dest, mode, city))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_od_cache_created ON od_cache(created)')
+        self._conn.commit()
+        self.prune()
+
+    def get(self, o_gcj, d_gcj, mode, city=None):
+        key = make_key(o_gcj, d_gcj, mode, city)
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    'SELECT duration, distance, created FROM od_cache WHERE origin=? AND dest=? AND mode=? AND city=?',
+                    key
+                ).fetchone()
+            except sqlite3.Error:
+                self.errors += 1
+                row = None
+            if row is None or (self.ttl and time.time() - row[2] > self.ttl):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0], row[1]
+
+    def put(self, o_gcj, d_gcj, mode, city, duration, distance):
+        key = make_key(o_gcj, d_gcj, mode, city)
+        with self._lock:
+            try:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO od_cache (origin, dest, mode, city, duration, distance, created) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    key + (float(duration), float(distance), time.time())
+                )
+                self._conn.commit()
+            except sqlite3.Error:
+                self.errors += 1
+                self._rollback()
+                return
+            self._puts += 1
+            need_prune = self._puts % PRUNE_INTERVAL == 0
+        if need_prune:
+            try:
+                self.prune()
+            except sqlite3.Error:
+                with self._lock:
+                    self.errors += 1
+                    self._rollback()
+
+    def _rollback(self):
+        # 写入失败时结束未提交的事务，避免后续写入一直失败
+        try:
+            self._conn.rollback()
+        except sqlite3.Error:
+            pass
+
+    def prune(self):
+        """删除过期条目，超出容量时删除最旧的条目"""
+        with self._lock:
+            if self.ttl:
+                self._conn.execute('DELETE FROM od_cache WHERE created < ?', (time.time() - self.ttl,))
+            if self.max_entries:
+                count = self._conn.execute('SELECT COUNT(*) FROM od_cache').fetchone()[0]
+                if count > self.max_entries:
+                    self._conn.execute(
+                        'DELETE FROM od_cache WHERE rowid IN '
+                        '(SELECT rowid FROM od_cache ORDER BY created ASC LIMIT ?)',
+                        (count - self.max_entries,)
+                    )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM od_cache')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# 并发OD查询引擎：以线程池并行发起高德可达性请求，结果按完成顺序回传给主线程
+import collections
+import queue
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# 每个工作线程最多排队的任务数
+PENDING_PER_WORKER = 4
+# 等待结果时检查停止请求的间隔（秒）
+STOP_POLL_INTERVAL = 0.2
+
+
+def log_category(msg):
+    """日志的类别：“前缀: 详情”中详情较短时（高德info、异常类型）取“前缀: 详情”，否则只取前缀"""
+    head, sep, rest = str(msg).partition(': ')
+    detail = rest.split(': ', 1)[0]
+    if sep and len(detail) <= 40 and '=' not in detail:
+        return f'{head}: {detail}'
+    return head
+
+
+class QueuedLog:
+    """线程安全的日志缓冲：工作线程只入队，由主线程统一写入对话框
+
+    limit: 最多逐条写出的日志数，None表示不限。超出后只按类别（见log_category）计数，
+    由flush_summary汇总输出，避免大矩阵在断网或配额用尽时逐条刷屏
+    """
+
+    def __init__(self, limit=None):
+        self._queue = queue.Queue()
+        self.limit = limit
+        self.written = 0
+        self.suppressed = collections.Counter()
+
+    def append_log(self, msg):
+        self._queue.put(msg)
+
+    def flush(self, dlg):
+        while True:
+            try:
+                msg = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if self.limit is not None and self.written >= self.limit:
+                self.suppressed[log_category(msg)] += 1
+                continue
+            self.written += 1
+            if dlg:
+                dlg.append_log(msg)
+
+    def flush_summary(self, dlg):
+        """写出剩余日志，并按类别汇总超出limit未逐条写出的日志"""
+        self.flush(dlg)
+        if dlg and self.suppressed:
+            dlg.append_log(f'另有 {sum(self.suppressed.values())} 条日志未逐条输出，按类别统计:')
+            for key, count in self.suppressed.most_common():
+                dlg.append_log(f'  {key} × {count}')
+        self.suppressed.clear()
+
+
+def iter_concurrent(tasks, func, max_workers=4, should_stop=None, ordered=False, stop_submitting=None):
+    """以有界线程池执行任务
+
+    tasks: 可迭代的 (task_id, args)，可以是生成器
+    按完成顺序逐个产出 (task_id, result, error)，error为None表示成功；ordered为True时按提交顺序产出。
+    同时在途的任务数有上限，N×M的大矩阵也不会一次性把所有任务压进线程池。
+    should_stop: 可选的无参回调，返回True时不再提交新任务、取消排队中的任务并立即返回，
+    仍在执行的请求留在后台自行结束，其结果被丢弃；调用方提前中断迭代（break或关闭生成器）时同样处理。
+    stop_submitting: 可选的无参回调，返回True时不再提交新任务，已提交的任务照常完成并产出结果
+    （如Key配额用尽：已发出的请求已经消耗了配额，结果不应丢弃）。
+    """
+    max_workers = max(1, int(max_workers or 1))
+    max_pending = max_workers * PENDING_PER_WORKER
+    tasks = iter(tasks)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {}
+    # 按提交顺序排列的在途任务，ordered时只产出队首已完成的部分
+    submitted = collections.deque()
+    try:
+        exhausted = False
+        while True:
+            if should_stop is not None and should_stop():
+                return
+            if stop_submitting is not None and stop_submitting():
+                exhausted = True
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    task_id, args = next(tasks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                fut = executor.submit(func, *args)
+                pending[fut] = task_id
+                if ordered:
+                    submitted.append(fut)
+            if not pending:
+                break
+            if ordered:
+                # 队首未完成时，后面已完成的结果先留在窗口中
+                wait([submitted[0]], timeout=STOP_POLL_INTERVAL)
+                done = []
+                while submitted and submitted[0].done():
+                    done.append(submitted.popleft())
+            else:
+                done, _ = wait(pending, timeout=STOP_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for fut in done:
+                task_id = pending.pop(fut)
+                try:
+                    yield task_id, fut.result(), None
+                except Exception as e:
+                    yield task_id, None, e
+    finally:
+        # 停止或调用方提前中断循环时仍有未完成的任务：取消尚未开始的，不等待正在执行的请求；
+        # 正常结束时pending为空，等待线程退出。（shutdown的cancel_futures参数需要Python 3.9，这里逐个取消）
+        for fut in pending:
+            fut.cancel()
+        executor.shutdown(wait=not pending)
+
+
+def iter_travel_times(jobs, query_func, max_workers=4, should_stop=None, stop_submitting=None):
+    """并发执行逐对可达性查询
+
+    jobs: 可迭代的 (idx, origin, dest)，坐标格式由query_func决定
+    query_func: query_func(origin, dest) -> (duration, distance)
+    按完成顺序逐个产出 (idx, duration, distance)，调用方据 idx 回填结果行
+    """
+    tasks = ((idx, (o, d)) for idx, o, d in jobs)
+    for idx, result, error in iter_concurrent(tasks, query_func, max_workers, should_stop,
+                                              stop_submitting=stop_submitting):
+        if error is not None:
+            result = (float('inf'), float('inf'))
+        yield (idx,) + tuple(result)
+
+
+def iter_batch_travel_times(batches, batch_func, max_workers=4, should_stop=None, stop_submitting=None):
+    """并发执行批量可达性查询（多个起点对同一终点）
+
+    batches: 可迭代的 (idx_list, origins, dest)
+    batch_func: batch_func(origins, dest) -> [(duration, distance), ...]，与origins一一对应
+    展开后按完成顺序逐个产出 (idx, duration, distance)
+    """
+    tasks = ((tuple(idxs), (origins, d)) for idxs, origins, d in batches)
+    for idxs, results, error in iter_concurrent(tasks, batch_func, max_workers, should_stop,
+                                                stop_submitting=stop_submitting):
+        if error is not None:
+            results = [(float('inf'), float('inf'))] * len(idxs)
+        for idx, (duration, distance) in zip(idxs, results):
+            yield idx, duration, distance
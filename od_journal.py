@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# 路径阶段的断点记录（SQLite）：已完成的OD结果逐批追加写入磁盘，中断（崩溃、配额用尽、手动停止）后可续跑
+import hashlib
+import os
+import sqlite3
+
+import numpy as np
+
+# 每记录若干条提交一次，崩溃时最多丢失这么多条结果
+COMMIT_INTERVAL = 200
+
+
+def journal_signature(mode, city, origins, dests):
+    """一次分析的指纹：出行方式、城市以及起终点的ID和坐标，任何一项变化都不能续跑
+
+    origins/dests: 带ids、lons、lats属性的点集（PointSet）
+    """
+    h = hashlib.sha1()
+    h.update(f'{mode}|{city or ""}'.encode('utf-8'))
+    for points in (origins, dests):
+        h.update(f'|{len(points.ids)}|'.encode('utf-8'))
+        h.update('\x1f'.join(str(i) for i in points.ids).encode('utf-8'))
+        h.update(np.ascontiguousarray(points.lons, dtype=float).tobytes())
+        h.update(np.ascontiguousarray(points.lats, dtype=float).tobytes())
+    return h.hexdigest()
+
+
+class ODJournal:
+    """按 (起点下标, 终点下标) 记录已完成的OD对
+
+    signature与文件中记录的不一致或resume为False时清空旧记录，重新开始。
+    只在收集结果的线程中调用record，不需要加锁。
+    """
+
+    def __init__(self, path, signature, resume=True):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS od_done ('
+            'origin_index INTEGER NOT NULL, dest_index INTEGER NOT NULL, '
+            'duration REAL NOT NULL, distance REAL NOT NULL, '
+            'PRIMARY KEY (origin_index, dest_index))'
+        )
+        row = self._conn.execute("SELECT value FROM meta WHERE key='signature'").fetchone()
+        self.resumed = resume and row is not None and row[0] == signature
+        if not self.resumed:
+            self._conn.execute('DELETE FROM od_done')
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('signature', ?)", (signature,))
+        self._conn.commit()
+        self._pending = []
+
+    def load(self):
+        """已记录的结果，返回 (origin_index, dest_index, duration, distance) 四个数组"""
+        rows = self._conn.execute('SELECT origin_index, dest_index, duration, distance FROM od_done').fetchall()
+        if not rows:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0))
+        data = np.array(rows, dtype=float)
+        return data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), data[:, 2], data[:, 3]
+
+    def record(self, origin_index, dest_index, duration, distance):
+        self._pending.append((int(origin_index), int(dest_index), float(duration), float(distance)))
+        if len(self._pending) >= COMMIT_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO od_done (origin_index, dest_index, duration, distance) VALUES (?, ?, ?, ?)',
+            self._pending
+        )
+        self._conn.commit()
+        self._pending = []
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM od_done').fetchone()[0] + len(self._pending)
+
+    def close(self):
+        self.flush()
+        self._conn.close()
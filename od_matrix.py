@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# 路径阶段结果（OD时长/距离矩阵）的列式内存存储与JSON存取，供“仅重新评分”复用
+import json
+
+import numpy as np
+
+from .point_set import PointSet
+from .scoring import ACCESSIBILITY_FIELD
+
+DISTANCE_FIELD = '距离'
+
+
+class ODMatrix:
+    """一次分析的路径阶段结果，按列存储
+
+    origins/dests: PointSet，起点表和终点表（终点表带数值属性列）
+    每个OD对一行：origin_index/dest_index指向起终点表，duration/distance为时长（秒）和距离（米），
+    尚未查询的行为nan，查询失败为inf。评分后score与normalized（{字段名: 数组}）与行一一对应，
+    rank为该行在所属起点内的名次（只记录前K名，其余为0），unreachable_score为评分时不可达OD对的评分，
+    跨起点汇总时矩阵中没有的OD对（被预筛选排除）也按该评分计入。
+    backend为计算该矩阵的路径后端（RoutingBackend），导出路径时沿用，不随矩阵保存。
+    """
+
+    def __init__(self, origins, dests, origin_index, dest_index, duration=None, distance=None, mode=None, city=None):
+        self.origins = origins
+        self.dests = dests
+        self.origin_index = np.asarray(origin_index, dtype=np.int32)
+        self.dest_index = np.asarray(dest_index, dtype=np.int32)
+        n = len(self.origin_index)
+        self.duration = np.full(n, np.nan) if duration is None else np.asarray(duration, dtype=float)
+        self.distance = np.full(n, np.nan) if distance is None else np.asarray(distance, dtype=float)
+        self.score = np.full(n, np.nan)
+        self.normalized = {}
+        self.rank = np.zeros(n, dtype=np.int32)
+        self.unreachable_score = np.nan
+        self.mode = mode
+        self.city = city
+        self.backend = None
+
+    def __len__(self):
+        return len(self.origin_index)
+
+    def has_field(self, field):
+        """终点表中是否有该字段的非空值；可达性、距离总是存在"""
+        if field in (ACCESSIBILITY_FIELD, DISTANCE_FIELD):
+            return True
+        col = self.dests.attrs.get(field)
+        return col is not None and bool(np.any(~np.isnan(col)))
+
+    def column(self, field):
+        """按行展开的字段值数组：可达性为时长，距离为路程，其余取终点属性，缺失为nan"""
+        if field == ACCESSIBILITY_FIELD:
+            return self.duration
+        if field == DISTANCE_FIELD:
+            return self.distance
+        col = self.dests.attrs.get(field)
+        if col is None:
+            return np.full(len(self), np.nan)
+        return col[self.dest_index]
+
+    def start_id(self, k):
+        return self.origins.ids[self.origin_index[k]]
+
+    def dest_id(self, k):
+        return self.dests.ids[self.dest_index[k]]
+
+    def row(self, k):
+        """第k行的字典视图，只在需要逐行处理的少量结果（最佳目的地、路径导出）上使用"""
+        i = int(self.origin_index[k])
+        j = int(self.dest_index[k])
+        attrs = self.dests.attr_values(j)
+        attrs[ACCESSIBILITY_FIELD] = float(self.duration[k])
+        attrs[DISTANCE_FIELD] = float(self.distance[k])
+        return {
+            'index': int(k),
+            'start_id': self.origins.ids[i], 'dest_id': self.dests.ids[j],
+            's_wgs': self.origins.wgs(i), 'd_wgs': self.dests.wgs(j),
+            's_gcj': self.origins.gcj(i), 'd_gcj': self.dests.gcj(j),
+            'duration': float(self.duration[k]), 'distance': float(self.distance[k]),
+            'attrs': attrs,
+            'score': float(self.score[k]),
+            'rank': int(self.rank[k]),
+            'normalized_attrs': {field: float(col[k]) for field, col in self.normalized.items()},
+        }
+
+    def subset(self, mask):
+        """只保留mask为True的行，起终点表共用"""
+        matrix = ODMatrix(self.origins, self.dests, self.origin_index[mask], self.dest_index[mask],
+                          self.duration[mask], self.distance[mask], self.mode, self.city)
+        matrix.backend = self.backend
+        return matrix
+
+    def save(self, path):
+        data = {
+            'mode': self.mode,
+            'city': self.city,
+            'origins': _point_set_to_json(self.origins),
+            'dests': _point_set_to_json(self.dests),
+            'origin_index': self.origin_index.tolist(),
+            'dest_index': self.dest_index.tolist(),
+            'duration': self.duration.tolist(),
+            'distance': self.distance.tolist(),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(_point_set_from_json(data['origins']), _point_set_from_json(data['dests']),
+                   data['origin_index'], data['dest_index'], data['duration'], data['distance'],
+                   data.get('mode'), data.get('city'))
+
+
+def _point_set_to_json(points):
+    return {
+        'ids': points.ids,
+        'lons': points.lons.tolist(),
+        'lats': points.lats.tolist(),
+        'attrs': {field: col.tolist() for field, col in points.attrs.items()},
+    }
+
+
+def _point_set_from_json(data):
+    return PointSet(data['ids'], data['lons'], data['lats'], data.get('attrs'))
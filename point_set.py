@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# 起终点坐标的批量预处理：流式读取点图层，整层一次性投影到WGS84并转换为GCJ-02，结果以紧凑数组保存，供请求、预筛选和导出复用
+from array import array
+
+import numpy as np
+from qgis.core import QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsFeatureRequest, QgsLineString
+
+from .transform import wgs2gcj_array
+
+WGS84 = 'EPSG:4326'
+
+
+def transform_xy(x, y, src_crs, dst_crs, transform_context):
+    """一次性转换整组坐标，返回 (x数组, y数组)
+
+    坐标先装入一条临时折线，由QgsLineString.transform在C++中整体投影，
+    避免逐点调用QgsCoordinateTransform.transform和创建QgsPointXY。
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if x.size == 0 or src_crs == dst_crs:
+        return x.copy(), y.copy()
+    line = QgsLineString(x.tolist(), y.tolist())
+    line.transform(QgsCoordinateTransform(src_crs, dst_crs, transform_context))
+    if hasattr(line, 'xVector'):
+        return np.asarray(line.xVector(), dtype=float), np.asarray(line.yVector(), dtype=float)
+    # 较早的QGIS版本没有xVector/yVector
+    points = line.points()
+    return (np.fromiter((p.x() for p in points), dtype=float, count=len(points)),
+            np.fromiter((p.y() for p in points), dtype=float, count=len(points)))
+
+
+class PointSet:
+    """一组点的ID、WGS84与GCJ-02经纬度以及数值属性列，均按下标访问
+
+    attrs: {字段名: float数组}，缺失或非数值的属性为nan
+    """
+
+    def __init__(self, ids, lons, lats, attrs=None):
+        self.ids = list(ids)
+        self.lons = np.asarray(lons, dtype=float)
+        self.lats = np.asarray(lats, dtype=float)
+        self.gcj_lons, self.gcj_lats = wgs2gcj_array(self.lons, self.lats)
+        self.attrs = {field: np.asarray(values, dtype=float) for field, values in (attrs or {}).items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def wgs(self, i):
+        return (float(self.lons[i]), float(self.lats[i]))
+
+    def gcj(self, i):
+        return (float(self.gcj_lons[i]), float(self.gcj_lats[i]))
+
+    def attr_values(self, i):
+        """第i个点的非空属性 {字段名: 值}"""
+        return {field: float(col[i]) for field, col in self.attrs.items() if not np.isnan(col[i])}
+
+    @classmethod
+    def from_source(cls, source, crs, transform_context, fields=None, id_field='', attr_fields=()):
+        """流式读取点要素源，只请求ID字段和attr_fields中的数值字段，不保留QgsFeature
+
+        fields: 要素源的字段表（QgsFields），指定id_field或attr_fields时需要；
+        id_field不存在时使用要素ID。坐标整组一次性转换到WGS84。
+        """
+        names = fields.names() if fields is not None else []
+        use_id_field = bool(id_field) and id_field in names
+        attr_fields = [f for f in attr_fields if f in names]
+        request = QgsFeatureRequest()
+        wanted = ([id_field] if use_id_field else []) + [f for f in attr_fields if f != id_field]
+        if wanted:
+            request.setSubsetOfAttributes(wanted, fields)
+        else:
+            request.setSubsetOfAttributes([])
+        ids = []
+        xs = array('d')
+        ys = array('d')
+        columns = {field: array('d') for field in attr_fields}
+        nan = float('nan')
+        for feat in source.getFeatures(request):
+            pt = feat.geometry().asPoint()
+            ids.append(feat[id_field] if use_id_field else feat.id())
+            xs.append(pt.x())
+            ys.append(pt.y())
+            for field, col in columns.items():
+                v = feat[field]
+                col.append(float(v) if isinstance(v, (int, float)) else nan)
+        lons, lats = transform_xy(xs, ys, crs, QgsCoordinateReferenceSystem(WGS84), transform_context)
+        return cls(ids, lons, lats, columns)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# 直线距离预筛选：在调用收费的路径接口前，按起点到各终点的球面距离批量剔除过远的候选
+import numpy as np
+
+EARTH_RADIUS = 6371008.8
+
+# 各出行方式的估算速度（米/秒）与绕行系数，只用于按“最大估算时间”筛选
+MODE_SPEEDS = {
+    'driving': 30 / 3.6,
+    'walking': 4.5 / 3.6,
+    'bicycling': 13 / 3.6,
+    'transit': 18 / 3.6,
+}
+DETOUR_FACTOR = 1.3
+
+
+def haversine(lon, lat, lons, lats):
+    """单个点到一组点的球面距离（米），lons/lats为WGS84经纬度数组"""
+    lon1, lat1 = np.radians(lon), np.radians(lat)
+    lon2, lat2 = np.radians(np.asarray(lons, dtype=float)), np.radians(np.asarray(lats, dtype=float))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def estimate_time(distances, mode):
+    """按直线距离、绕行系数和出行方式速度估算出行时间（秒）"""
+    speed = MODE_SPEEDS.get(mode, MODE_SPEEDS['driving'])
+    return np.asarray(distances) * DETOUR_FACTOR / speed
+
+
+def select_candidates(origin, lons, lats, mode='driving', top_k=0, max_radius=0, max_time=0):
+    """返回需要实际请求路径的终点下标（按直线距离由近到远）
+
+    origin: WGS84起点 (lon, lat)；top_k: 只保留最近的K个；max_radius: 最大直线距离（米）；
+    max_time: 最大估算时间（秒）。取值<=0的条件不生效，三者同时生效时取交集。
+    """
+    distances = haversine(origin[0], origin[1], lons, lats)
+    keep = np.ones(len(distances), dtype=bool)
+    if max_radius and max_radius > 0:
+        keep &= distances <= max_radius
+    if max_time and max_time > 0:
+        keep &= estimate_time(distances, mode) <= max_time
+    idx = np.flatnonzero(keep)
+    if top_k and 0 < top_k < len(idx):
+        # argpartition只做部分排序，再对前K个排序
+        part = np.argpartition(distances[idx], top_k - 1)[:top_k]
+        idx = idx[part]
+    return idx[np.argsort(distances[idx], kind='stable')]
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# Processing算法：以Processing参数运行完整分析，进度和取消由QgsProcessingFeedback提供，可批处理或串入模型
+from qgis.core import (
+    QgsCoordinateReferenceSystem, QgsFeatureSink, QgsProcessing, QgsProcessingAlgorithm, QgsProcessingException,
+    QgsProcessingOutputString, QgsProcessingParameterBoolean, QgsProcessingParameterEnum,
+    QgsProcessingParameterFeatureSink, QgsProcessingParameterFeatureSource, QgsProcessingParameterField,
+    QgsProcessingParameterFileDestination, QgsProcessingParameterMatrix, QgsProcessingParameterNumber,
+    QgsProcessingParameterPoint, QgsProcessingParameterString, QgsWkbTypes
+)
+
+from .analysis_params import AnalysisParams
+from .choose_my_destination import run_analysis, route_fields, route_features
+from .rate_limiter import DEFAULT_QPS
+from .road_graph import DEFAULT_SPEED_KMH
+from .scoring import NORMALIZE_ALIASES
+
+MODES = ['driving', 'walking', 'bicycling', 'transit']
+MODE_LABELS = ['驾车', '步行', '骑行', '公交']
+
+
+class FeedbackReporter:
+    """把分析流程的日志和进度转给QgsProcessingFeedback，并由其判断是否已取消"""
+
+    def __init__(self, feedback):
+        self.feedback = feedback
+
+    def append_log(self, msg):
+        self.feedback.pushInfo(msg)
+
+    def set_progress(self, done, total, text=''):
+        if total:
+            self.feedback.setProgress(done * 100.0 / total)
+
+    def is_canceled(self):
+        return self.feedback.isCanceled()
+
+
+def parse_field_matrix(values):
+    """把矩阵参数（按行展开的 字段, 权重, 归一化方式）转换为field_settings，归一化方式可用简写，默认为asc
+
+    权重无法解析或归一化方式未知时抛出QgsProcessingException
+    """
+    normalizations = set(NORMALIZE_ALIASES.values())
+    settings = {}
+    for k in range(0, len(values) - 2, 3):
+        name = str(values[k] or '').strip()
+        if not name:
+            continue
+        try:
+            weight = float(values[k + 1])
+        except (TypeError, ValueError):
+            raise QgsProcessingException(f'字段 {name} 的权重无法解析: {values[k + 1]!r}')
+        normalize = str(values[k + 2] or '').strip() or 'asc'
+        normalize = NORMALIZE_ALIASES.get(normalize, normalize)
+        if normalize not in normalizations:
+            raise QgsProcessingException(f'字段 {name} 的归一化方式未知: {values[k + 2]}，'
+                                         f'可选 {", ".join(NORMALIZE_ALIASES)}')
+        settings[name] = {'weight': weight, 'normalize': normalize}
+    return settings
+
+
+class ChooseDestinationAlgorithm(QgsProcessingAlgorithm):
+    DESTINATIONS = 'DESTINATIONS'
+    DEST_ID_FIELD = 'DEST_ID_FIELD'
+    FIELDS = 'FIELDS'
+    ACCESSIBILITY_WEIGHT = 'ACCESSIBILITY_WEIGHT'
+    MODE = 'MODE'
+    CITY = 'CITY'
+    ORIGINS = 'ORIGINS'
+    START_POINT = 'START_POINT'
+    KEY = 'KEY'
+    ROADS = 'ROADS'
+    ROAD_SPEED_FIELD = 'ROAD_SPEED_FIELD'
+    ROAD_SPEED = 'ROAD_SPEED'
+    TOP_K = 'TOP_K'
+    CONCURRENCY = 'CONCURRENCY'
+    QPS = 'QPS'
+    USE_CACHE = 'USE_CACHE'
+    ALL_ROUTES = 'ALL_ROUTES'
+    OUTPUT_CSV = 'OUTPUT_CSV'
+    OUTPUT_ROUTES = 'OUTPUT_ROUTES'
+    BEST_DEST_ID = 'BEST_DEST_ID'
+
+    def createInstance(self):
+        return ChooseDestinationAlgorithm()
+
+    def name(self):
+        return 'choosedestination'
+
+    def displayName(self):
+        return '目的地优选'
+
+    def shortHelpString(self):
+        return ('按可达性（高德路径时长）和自定义字段权重为每个起点选出最佳目的地。'
+                '指定起点图层时计算OD矩阵，否则使用单个起点坐标。'
+                '评分字段每行填写 字段名、权重、归一化方式（none/asc/desc/zscore）。'
+                '指定离线路网图层时在本地计算最短路径，不需要高德Key：驾车按道路速度并遵守单行，'
+                '步行、骑行按固定速度，不支持公交。')
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.DESTINATIONS, '目的地图层', [QgsProcessing.TypeVectorPoint]))
+        self.addParameter(QgsProcessingParameterField(
+            self.DEST_ID_FIELD, '目的地ID字段', parentLayerParameterName=self.DESTINATIONS, optional=True))
+        self.addParameter(QgsProcessingParameterMatrix(
+            self.FIELDS, '评分字段', headers=['字段', '权重', '归一化方式'], optional=True))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.ACCESSIBILITY_WEIGHT, '可达性权重', QgsProcessingParameterNumber.Double, 1.0))
+        self.addParameter(QgsProcessingParameterEnum(self.MODE, '出行方式', MODE_LABELS, defaultValue=0))
+        self.addParameter(QgsProcessingParameterString(self.CITY, '城市（公交）', optional=True))
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.ORIGINS, '起点图层（OD矩阵模式）', [QgsProcessing.TypeVectorPoint], optional=True))
+        self.addParameter(QgsProcessingParameterPoint(self.START_POINT, '起点坐标', optional=True))
+        self.addParameter(QgsProcessingParameterString(self.KEY, '高德Key（多个Key用逗号分隔）', optional=True))
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.ROADS, '离线路网图层（指定时不请求高德API）', [QgsProcessing.TypeVectorLine], optional=True))
+        self.addParameter(QgsProcessingParameterField(
+            self.ROAD_SPEED_FIELD, '路网速度字段（公里/小时）', parentLayerParameterName=self.ROADS,
+            type=QgsProcessingParameterField.Numeric, optional=True))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.ROAD_SPEED, '路网默认速度（公里/小时）', QgsProcessingParameterNumber.Double, DEFAULT_SPEED_KMH,
+            minValue=1))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.TOP_K, '每个起点输出前K名', QgsProcessingParameterNumber.Integer, 1, minValue=1))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.CONCURRENCY, '并发请求数', QgsProcessingParameterNumber.Integer, 4, minValue=1))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.QPS, '每个Key的QPS上限', QgsProcessingParameterNumber.Double, DEFAULT_QPS, minValue=0.1))
+        self.addParameter(QgsProcessingParameterBoolean(self.USE_CACHE, '使用本地可达性缓存', True))
+        self.addParameter(QgsProcessingParameterBoolean(self.ALL_ROUTES, '导出全部可达OD对的路径', False))
+        self.addParameter(QgsProcessingParameterFileDestination(
+            self.OUTPUT_CSV, 'OD汇总CSV', 'CSV files (*.csv)', optional=True, createByDefault=False))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.OUTPUT_ROUTES, 'OD路径', QgsProcessing.TypeVectorLine, optional=True))
+        self.addOutput(QgsProcessingOutputString(self.BEST_DEST_ID, '最佳目的地ID'))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        # 以parameterAsSource读取输入：得到的要素源可在算法线程中遍历，并支持“仅选中要素”
+        dest_source = self.parameterAsSource(parameters, self.DESTINATIONS, context)
+        if dest_source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.DESTINATIONS))
+        start_source = self.parameterAsSource(parameters, self.ORIGINS, context)
+        start_point = None
+        if start_source is None:
+            if not parameters.get(self.START_POINT):
+                raise QgsProcessingException('请指定起点图层或起点坐标')
+            pt = self.parameterAsPoint(parameters, self.START_POINT, context, QgsCoordinateReferenceSystem('EPSG:4326'))
+            start_point = (pt.x(), pt.y())
+        road_source = self.parameterAsSource(parameters, self.ROADS, context)
+        key = self.parameterAsString(parameters, self.KEY, context)
+        if road_source is None and not key:
+            raise QgsProcessingException('请指定高德Key或离线路网图层')
+        field_settings = parse_field_matrix(self.parameterAsMatrix(parameters, self.FIELDS, context))
+        csv_path = self.parameterAsFileOutput(parameters, self.OUTPUT_CSV, context)
+        fields = route_fields(field_settings)
+        sink, sink_id = self.parameterAsSink(parameters, self.OUTPUT_ROUTES, context, fields,
+                                             QgsWkbTypes.LineString, dest_source.sourceCrs())
+        params = AnalysisParams(
+            dest_source, field_settings,
+            accessibility_weight=self.parameterAsDouble(parameters, self.ACCESSIBILITY_WEIGHT, context),
+            dest_id_field=self.parameterAsString(parameters, self.DEST_ID_FIELD, context),
+            mode=MODES[self.parameterAsEnum(parameters, self.MODE, context)],
+            key=key,
+            start_layer=start_source, start_point=start_point,
+            city=self.parameterAsString(parameters, self.CITY, context) or None,
+            export_path=csv_path,
+            concurrency=self.parameterAsInt(parameters, self.CONCURRENCY, context),
+            qps=self.parameterAsDouble(parameters, self.QPS, context),
+            use_cache=self.parameterAsBool(parameters, self.USE_CACHE, context),
+            top_k=self.parameterAsInt(parameters, self.TOP_K, context),
+            export_all_routes=self.parameterAsBool(parameters, self.ALL_ROUTES, context),
+            export_routes=sink is not None,
+            road_layer=road_source,
+            road_speed_field=self.parameterAsString(parameters, self.ROAD_SPEED_FIELD, context),
+            road_default_speed=self.parameterAsDouble(parameters, self.ROAD_SPEED, context),
+            project_crs=dest_source.sourceCrs(), transform_context=context.transformContext(),
+        )
+        result = run_analysis(params, FeedbackReporter(feedback))
+        if result is None:
+            raise QgsProcessingException('分析未完成，请检查起点和目的地图层')
+        if sink is not None:
+            sink.addFeatures(route_features(result.routes, fields), QgsFeatureSink.FastInsert)
+        best = result.highlight_rows[0]['dest_id'] if result.highlight_rows else ''
+        return {self.OUTPUT_CSV: csv_path, self.OUTPUT_ROUTES: sink_id, self.BEST_DEST_ID: str(best)}
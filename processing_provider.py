@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Processing算法提供者：在Processing工具箱、批处理和模型中提供“目的地优选”算法
+import os
+
+from qgis.core import QgsProcessingProvider
+from qgis.PyQt.QtGui import QIcon
+
+from .processing_algorithm import ChooseDestinationAlgorithm
+
+
+class ChooseMyDestinationProvider(QgsProcessingProvider):
+
+    def loadAlgorithms(self):
+        self.addAlgorithm(ChooseDestinationAlgorithm())
+
+    def id(self):
+        return 'choose_my_destination'
+
+    def name(self):
+        return '目的地优选'
+
+    def icon(self):
+        return QIcon(os.path.join(os.path.dirname(__file__), 'icon.png'))
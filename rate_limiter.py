@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# 高德API限流：按Key共享的令牌桶（QPS）与日配额计数，所有请求线程共用；多个Key组成Key池时轮流使用并自动切换
+import re
+import threading
+import time
+import datetime
+
+
+class QuotaExceededError(Exception):
+    """Key的日配额已用尽"""
+
+
+class TokenBucket:
+    """令牌桶：rate为每秒补充的令牌数，capacity为桶容量（允许的突发请求数）"""
+
+    def __init__(self, rate, capacity=1.0):
+        self._lock = threading.Lock()
+        self.rate = max(float(rate), 1e-6)
+        self.capacity = max(float(capacity), 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+
+    def set_rate(self, rate, capacity=None):
+        with self._lock:
+            self._refill()
+            self.rate = max(float(rate), 1e-6)
+            if capacity is not None:
+                self.capacity = max(float(capacity), 1.0)
+                self._tokens = min(self._tokens, self.capacity)
+
+    def try_acquire(self):
+        """不等待地取一个令牌，取到返回True"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self):
+        """阻塞直到取得一个令牌"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class DailyQuota:
+    """日配额计数，跨日自动清零；limit<=0表示不限"""
+
+    def __init__(self, limit=0):
+        self._lock = threading.Lock()
+        self.limit = int(limit or 0)
+        self._day = datetime.date.today()
+        self.used = 0
+
+    def consume(self):
+        with self._lock:
+            today = datetime.date.today()
+            if today != self._day:
+                self._day = today
+                self.used = 0
+            if self.limit > 0 and self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+
+class KeyLimiter:
+    def __init__(self, qps, daily_quota=0, burst=1):
+        self.bucket = TokenBucket(qps, burst)
+        self.quota = DailyQuota(daily_quota)
+
+    def acquire(self):
+        if not self.quota.consume():
+            raise QuotaExceededError(f'Key日配额已用尽（{self.quota.limit}次）')
+        self.bucket.acquire()
+
+
+class KeyPool:
+    """多个Key组成的池，请求轮流分配到各Key，每个Key使用各自的限流器（QPS与日配额）
+
+    Key的本地日配额用尽或高德返回配额类错误（mark_exhausted）后当天不再使用，次日自动恢复。
+    """
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self._lock = threading.Lock()
+        self._next = 0
+        self._exhausted = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def mark_exhausted(self, key):
+        with self._lock:
+            self._exhausted[key] = datetime.date.today()
+
+    def is_exhausted(self, key):
+        with self._lock:
+            return self._exhausted.get(key) == datetime.date.today()
+
+    def _candidates(self):
+        """当天可用的Key，从轮到的Key开始排列"""
+        today = datetime.date.today()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.keys)
+            ordered = self.keys[start:] + self.keys[:start]
+            return [key for key in ordered if self._exhausted.get(key) != today]
+
+    def acquire(self):
+        """选出一个Key并取得其令牌，返回该Key；全部Key当天都已用尽时抛出QuotaExceededError"""
+        while True:
+            candidates = self._candidates()
+            if not candidates:
+                raise QuotaExceededError(f'Key池中全部{len(self.keys)}个Key的日配额已用尽')
+            # 优先使用当前有空闲令牌的Key，都没有时在轮到的Key上等待
+            for key in candidates:
+                limiter = get_limiter(key)
+                if limiter.bucket.try_acquire():
+                    if limiter.quota.consume():
+                        return key
+                    self.mark_exhausted(key)
+            try:
+                get_limiter(candidates[0]).acquire()
+                return candidates[0]
+            except QuotaExceededError:
+                self.mark_exhausted(candidates[0])
+
+    def stats(self):
+        """各Key的 (Key, 今日已用次数, 是否已用尽)"""
+        return [(key, get_limiter(key).quota.used, self.is_exhausted(key)) for key in self.keys]
+
+
+DEFAULT_QPS = 3.0
+
+_limiters = {}
+_pools = {}
+_limiters_lock = threading.Lock()
+
+
+def split_keys(text):
+    """把输入框中以逗号、分号或空白分隔的多个Key拆分为列表（去重并保持顺序）"""
+    return list(dict.fromkeys(k for k in re.split(r'[\s,;，；]+', text or '') if k))
+
+
+def configure_key(key, qps, daily_quota=0, burst=1):
+    """设置某个Key的QPS和日配额；已存在的限流器保留已用计数，多个分析共享同一限流器"""
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = KeyLimiter(qps, daily_quota, burst)
+            _limiters[key] = limiter
+        else:
+            limiter.bucket.set_rate(qps, burst)
+            limiter.quota.limit = int(daily_quota or 0)
+        return limiter
+
+
+def configure_keys(keys, qps, daily_quota=0, burst=1):
+    """为每个Key设置QPS和日配额，返回请求时使用的key（见key_pool）"""
+    for key in keys:
+        configure_key(key, qps, daily_quota, burst)
+    return key_pool(keys)
+
+
+def key_pool(keys):
+    """单个Key时返回该Key，多个Key时返回按Key列表共享的KeyPool，没有Key时返回空字符串"""
+    keys = list(dict.fromkeys(keys))
+    if len(keys) <= 1:
+        return keys[0] if keys else ''
+    with _limiters_lock:
+        pool = _pools.get(tuple(keys))
+        if pool is None:
+            pool = KeyPool(keys)
+            _pools[tuple(keys)] = pool
+        return pool
+
+
+def get_limiter(key):
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = KeyLimiter(DEFAULT_QPS)
+            _limiters[key] = limiter
+        return limiter
+
+
+def acquire(key):
+    """每次调用高德API前调用：超出QPS时阻塞等待，日配额用尽时抛出QuotaExceededError
+
+    key为KeyPool时从池中选出一个Key；返回本次请求实际使用的Key
+    """
+    if isinstance(key, KeyPool):
+        return key.acquire()
+    get_limiter(key).acquire()
+    return key
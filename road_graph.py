@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+# 离线路径计算：由道路折线构建路网图，一次Dijkstra得到一个起点到全部终点的最短时间，不发起任何网络请求
+# 坐标均为WGS84经纬度，长度为米，时间为秒
+import hashlib
+import heapq
+import threading
+
+import numpy as np
+
+EARTH_RADIUS = 6371008.8
+METERS_PER_DEGREE = np.pi * EARTH_RADIUS / 180
+# 节点合并精度：坐标取整到1e-7度（约1厘米），坐标重合的折线顶点视为同一个路口
+NODE_SCALE = 1e7
+DEFAULT_SPEED_KMH = 30.0
+# 查找最近节点的网格边长（度）
+SNAP_CELL = 0.01
+# 步行、骑行在路网上按固定速度（公里/小时）双向通行，不使用道路速度字段和单行限制
+MODE_SPEEDS_KMH = {'walking': 5.0, 'bicycling': 15.0}
+
+
+def travel_profile(mode, default_speed_kmh=DEFAULT_SPEED_KMH):
+    """出行方式在离线路网上的计算方式，返回 (是否使用道路速度和单行限制, 速度（公里/小时）)
+
+    驾车使用道路速度（缺失时为default_speed_kmh）并遵守单行；公交无法由道路网计算，抛出ValueError
+    """
+    if mode == 'driving':
+        return True, float(default_speed_kmh)
+    if mode in MODE_SPEEDS_KMH:
+        return False, MODE_SPEEDS_KMH[mode]
+    raise ValueError(f'离线路网不支持该出行方式: {mode}')
+
+
+def _haversine(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=float)) for v in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class RoadGraph:
+    """路网有向图，邻接表按CSR存储：indptr[u]:indptr[u+1] 为节点u的出边
+
+    node_lons/node_lats: 节点经纬度；edge_to/edge_length/edge_time: 按起点排序后的出边终点、长度（米）、通行时间（秒）
+    """
+
+    def __init__(self, node_lons, node_lats, edge_from, edge_to, edge_length, edge_time):
+        self.node_lons = np.asarray(node_lons, dtype=float)
+        self.node_lats = np.asarray(node_lats, dtype=float)
+        edge_from = np.asarray(edge_from, dtype=np.int64)
+        order = np.argsort(edge_from, kind='stable')
+        counts = np.bincount(edge_from, minlength=len(self.node_lons))
+        self.indptr = np.concatenate([[0], np.cumsum(counts)])
+        self.edge_to = np.asarray(edge_to, dtype=np.int64)[order]
+        self.edge_length = np.asarray(edge_length, dtype=float)[order]
+        self.edge_time = np.asarray(edge_time, dtype=float)[order]
+        # Dijkstra在纯Python循环中访问邻接表，预先转为list避免逐元素取numpy标量
+        self._adj = (self.indptr.tolist(), self.edge_to.tolist(), self.edge_time.tolist(), self.edge_length.tolist())
+        self._build_grid()
+
+    def __len__(self):
+        return len(self.node_lons)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_to)
+
+    def digest(self):
+        """路网内容的指纹：节点坐标、连接关系和各边通行时间，路网或速度变化时随之变化"""
+        h = hashlib.sha1()
+        for values in (self.node_lons, self.node_lats, self.indptr, self.edge_to, self.edge_time):
+            h.update(np.ascontiguousarray(values).tobytes())
+        return h.hexdigest()
+
+    @classmethod
+    def from_lines(cls, lines, speeds_kmh=None, oneway=None, default_speed_kmh=DEFAULT_SPEED_KMH):
+        """由折线列表构建路网
+
+        lines: [[(lon, lat), ...], ...]，折线的每个顶点都是节点，相邻顶点之间为一条边
+        speeds_kmh: 每条折线的速度（公里/小时），缺失或非正值时使用default_speed_kmh
+        oneway: 每条折线是否只能沿绘制方向通行，默认双向
+        """
+        coords = [np.asarray(line, dtype=float).reshape(-1, 2) for line in lines]
+        keep = [k for k, c in enumerate(coords) if len(c) >= 2]
+        n_lines = len(coords)
+        speeds = np.full(n_lines, np.nan) if speeds_kmh is None else np.asarray(speeds_kmh, dtype=float)
+        speeds = np.where(np.isfinite(speeds) & (speeds > 0), speeds, default_speed_kmh)[keep]
+        oneway = np.zeros(n_lines, dtype=bool) if oneway is None else np.asarray(oneway, dtype=bool)
+        oneway = oneway[keep]
+        coords = [coords[k] for k in keep]
+        if not coords:
+            return cls([], [], [], [], [], [])
+        lengths = np.array([len(c) for c in coords])
+        points = np.concatenate(coords)
+        keys = np.round(points * NODE_SCALE).astype(np.int64)
+        nodes, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        # 第i个顶点与第i+1个顶点之间的线段，跨越两条折线的除外
+        seg = np.ones(len(points) - 1, dtype=bool)
+        seg[np.cumsum(lengths)[:-1] - 1] = False
+        seg_start = np.flatnonzero(seg)
+        line_of_seg = np.repeat(np.arange(len(coords)), lengths - 1)
+        u = inverse[seg_start]
+        v = inverse[seg_start + 1]
+        length = _haversine(points[seg_start, 0], points[seg_start, 1], points[seg_start + 1, 0], points[seg_start + 1, 1])
+        time = length / (speeds[line_of_seg] / 3.6)
+        two_way = ~oneway[line_of_seg]
+        valid = u != v
+        edge_from = np.concatenate([u[valid], v[valid & two_way]])
+        edge_to = np.concatenate([v[valid], u[valid & two_way]])
+        edge_length = np.concatenate([length[valid], length[valid & two_way]])
+        edge_time = np.concatenate([time[valid], time[valid & two_way]])
+        return cls(nodes[:, 0] / NODE_SCALE, nodes[:, 1] / NODE_SCALE, edge_from, edge_to, edge_length, edge_time)
+
+    def _build_grid(self):
+        cx = np.floor(self.node_lons / SNAP_CELL).astype(np.int64)
+        cy = np.floor(self.node_lats / SNAP_CELL).astype(np.int64)
+        keys = cx * (1 << 32) + cy
+        self._grid_order = np.argsort(keys, kind='stable')
+        self._grid_keys = keys[self._grid_order]
+
+    def nearest_nodes(self, lons, lats):
+        """每个点最近的节点下标及直线距离（米）
+
+        先在点所在网格及周围8格中查找；候选为空或最近距离超出这9格的覆盖范围时，对全部节点逐一计算
+        """
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        nearest = np.full(len(lons), -1, dtype=np.int64)
+        dist = np.full(len(lons), np.inf)
+        if not len(self):
+            return nearest, dist
+        cx = np.floor(lons / SNAP_CELL).astype(np.int64)
+        cy = np.floor(lats / SNAP_CELL).astype(np.int64)
+        ranges = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keys = (cx + dx) * (1 << 32) + (cy + dy)
+                ranges.append((np.searchsorted(self._grid_keys, keys, 'left'),
+                               np.searchsorted(self._grid_keys, keys, 'right')))
+        # 点到9格外边界的最短距离，最近节点比它更近时才能确定不在9格之外
+        margin_lon = np.minimum(lons - (cx - 1) * SNAP_CELL, (cx + 2) * SNAP_CELL - lons)
+        margin_lat = np.minimum(lats - (cy - 1) * SNAP_CELL, (cy + 2) * SNAP_CELL - lats)
+        margin = np.minimum(margin_lon * np.cos(np.radians(np.abs(lats) + SNAP_CELL * 2)), margin_lat) * METERS_PER_DEGREE
+        for q in range(len(lons)):
+            cand = np.concatenate([self._grid_order[lo[q]:hi[q]] for lo, hi in ranges])
+            if len(cand):
+                d = _haversine(lons[q], lats[q], self.node_lons[cand], self.node_lats[cand])
+                k = int(np.argmin(d))
+                if d[k] <= margin[q]:
+                    nearest[q] = cand[k]
+                    dist[q] = d[k]
+                    continue
+            d = _haversine(lons[q], lats[q], self.node_lons, self.node_lats)
+            k = int(np.argmin(d))
+            nearest[q] = k
+            dist[q] = d[k]
+        return nearest, dist
+
+    def shortest_paths(self, source, targets=None):
+        """从source出发的Dijkstra，返回 (时间数组, 距离数组, 前驱节点数组)，不可达为inf/-1
+
+        指定targets时，全部目标节点确定最短时间后即停止搜索
+        """
+        indptr, edge_to, edge_time, edge_length = self._adj
+        n = len(self)
+        time = [float('inf')] * n
+        dist = [float('inf')] * n
+        pred = [-1] * n
+        time[source] = 0.0
+        dist[source] = 0.0
+        remaining = set(int(t) for t in targets) if targets is not None else None
+        done = [False] * n
+        heap = [(0.0, source)]
+        while heap:
+            t, u = heapq.heappop(heap)
+            if done[u]:
+                continue
+            done[u] = True
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining:
+                    break
+            for k in range(indptr[u], indptr[u + 1]):
+                v = edge_to[k]
+                nt = t + edge_time[k]
+                if nt < time[v]:
+                    time[v] = nt
+                    dist[v] = dist[u] + edge_length[k]
+                    pred[v] = u
+                    heapq.heappush(heap, (nt, v))
+        return np.array(time), np.array(dist), np.array(pred, dtype=np.int64)
+
+    def path(self, pred, target):
+        """由前驱数组回溯到target的节点序列；target不可达时序列只有target本身，不以起点开头"""
+        nodes = []
+        u = int(target)
+        while u != -1:
+            nodes.append(u)
+            u = int(pred[u])
+        nodes.reverse()
+        return nodes
+
+
+class RoutingBackend:
+    """路径后端：分析流程只通过这些方法取得可达性和路径，不区分数据来自高德API还是离线路网
+
+    signature: 写入断点文件签名的后端标识，后端或其参数变化时不能续跑
+    routes_gcj: iter_routes给出的折线是否为GCJ-02坐标（否则为WGS84）
+    """
+
+    signature = ''
+    routes_gcj = False
+
+    def iter_travel_times(self, matrix, rows, log, should_stop):
+        """计算matrix中rows各行的OD对，逐个产出 (行号, 时长, 距离)，不可达为inf，停止后放弃的为nan
+
+        log: 线程安全的日志（QueuedLog），should_stop: 无参回调，返回True时不再发起新的计算
+        """
+        raise NotImplementedError
+
+    def iter_routes(self, rows, log, should_stop):
+        """rows为matrix.row()字典的列表，按顺序逐个产出 (下标, 折线 [(lon, lat), ...])，取不到路径时折线为None"""
+        raise NotImplementedError
+
+    def log_stats(self, reporter):
+        """可达性计算结束后输出统计信息"""
+
+    def release(self):
+        """路径导出结束后释放为导出保留的数据；矩阵仍引用后端，不释放会一直占用内存到下次分析"""
+
+
+class LocalRoutingBackend(RoutingBackend):
+    """基于RoadGraph的离线路径后端
+
+    起终点吸附到最近的路网节点，吸附段的距离计入结果，并按access_speed_kmh计时；吸附结果按坐标缓存，
+    多个起点共用同一组终点时只吸附一次。
+    每个起点只做一次Dijkstra；最近一次的搜索结果保留下来，同一起点的多条路径回溯时复用。
+    """
+
+    def __init__(self, graph, access_speed_kmh=DEFAULT_SPEED_KMH):
+        self.graph = graph
+        self.access_speed = access_speed_kmh / 3.6
+        # 路网内容（含各边时间）和吸附段速度都决定结果，一并写入断点签名
+        self.signature = f'local|{graph.digest()}|{float(access_speed_kmh):g}'
+        self._lock = threading.Lock()
+        self._last = None
+        self._snapped = {}
+
+    def release(self):
+        with self._lock:
+            self._last = None
+            self._snapped = {}
+
+    def _snap(self, lons, lats):
+        points = list(zip(np.asarray(lons, dtype=float).tolist(), np.asarray(lats, dtype=float).tolist()))
+        with self._lock:
+            missing = [p for p in dict.fromkeys(points) if p not in self._snapped]
+        if missing:
+            nodes, dist = self.graph.nearest_nodes([p[0] for p in missing], [p[1] for p in missing])
+            with self._lock:
+                self._snapped.update(zip(missing, zip(nodes.tolist(), dist.tolist())))
+        with self._lock:
+            snapped = [self._snapped[p] for p in points]
+        return (np.array([s[0] for s in snapped], dtype=np.int64), np.array([s[1] for s in snapped], dtype=float))
+
+    def _search(self, origin_node, targets=None):
+        with self._lock:
+            if self._last is not None and self._last[0] == origin_node and targets is None:
+                return self._last[1]
+        result = self.graph.shortest_paths(origin_node, targets)
+        if targets is None:
+            with self._lock:
+                self._last = (origin_node, result)
+        return result
+
+    def travel_times(self, origin, dest_lons, dest_lats):
+        """一个起点到多个终点的 (时长数组, 距离数组)，坐标为WGS84，不可达为inf"""
+        n = len(dest_lons)
+        if not len(self.graph):
+            return np.full(n, np.inf), np.full(n, np.inf)
+        o_nodes, o_snap = self._snap([origin[0]], [origin[1]])
+        d_nodes, d_snap = self._snap(dest_lons, dest_lats)
+        time, dist, _ = self._search(int(o_nodes[0]), d_nodes)
+        access = o_snap[0] + d_snap
+        return time[d_nodes] + access / self.access_speed, dist[d_nodes] + access
+
+    def route(self, origin, dest):
+        """单个OD对的WGS84路径折线 [(lon, lat), ...]，不可达时返回空列表"""
+        if not len(self.graph):
+            return []
+        nodes, _ = self._snap([origin[0], dest[0]], [origin[1], dest[1]])
+        _, _, pred = self._search(int(nodes[0]))
+        path = self.graph.path(pred, nodes[1])
+        if not path or path[0] != nodes[0]:
+            return []
+        g = self.graph
+        points = [tuple(origin)] + [(float(g.node_lons[u]), float(g.node_lats[u])) for u in path] + [tuple(dest)]
+        # 起终点恰好落在节点上时去掉重复的顶点
+        return [p for k, p in enumerate(points) if k == 0 or p != points[k - 1]]
+
+    def iter_travel_times(self, matrix, rows, log, should_stop):
+        # 按起点分组，每个起点用一次一对多查询求出其全部OD对
+        order = rows[np.argsort(matrix.origin_index[rows], kind='stable')]
+        bounds = np.flatnonzero(np.diff(matrix.origin_index[order])) + 1
+        for group in np.split(order, bounds):
+            if not len(group):
+                continue
+            if should_stop():
+                break
+            j = matrix.dest_index[group]
+            durations, distances = self.travel_times(matrix.origins.wgs(matrix.origin_index[group[0]]),
+                                                     matrix.dests.lons[j], matrix.dests.lats[j])
+            yield from zip(group.tolist(), durations.tolist(), distances.tolist())
+
+    def iter_routes(self, rows, log, should_stop):
+        # 逐条回溯：同一起点的路径复用最近一次搜索，比并发更快
+        for k, r in enumerate(rows):
+            if should_stop():
+                break
+            polyline = self.route(r['s_wgs'], r['d_wgs'])
+            yield k, polyline if len(polyline) >= 2 else None
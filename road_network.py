@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# 离线路网的读取：流式读取道路线图层，整层坐标一次性投影到WGS84，构建RoadGraph
+from array import array
+
+import numpy as np
+from qgis.core import QgsCoordinateReferenceSystem, QgsFeatureRequest
+
+from .point_set import WGS84, transform_xy
+from .road_graph import RoadGraph, DEFAULT_SPEED_KMH
+
+
+def load_road_graph(source, crs, transform_context, fields=None, speed_field='', oneway_field='',
+                    default_speed_kmh=DEFAULT_SPEED_KMH):
+    """读取道路线要素源并构建路网
+
+    speed_field: 速度字段（公里/小时），为空、不存在或值无效时使用default_speed_kmh
+    oneway_field: 单行标记字段，值为1/true/yes时只允许沿绘制方向通行
+    多部件线的每个部件作为一条折线
+    """
+    names = fields.names() if fields is not None else []
+    speed_field = speed_field if speed_field in names else ''
+    oneway_field = oneway_field if oneway_field in names else ''
+    request = QgsFeatureRequest()
+    wanted = [f for f in (speed_field, oneway_field) if f]
+    if wanted:
+        request.setSubsetOfAttributes(wanted, fields)
+    else:
+        request.setSubsetOfAttributes([])
+    xs = array('d')
+    ys = array('d')
+    lengths = []
+    speeds = []
+    oneway = []
+    nan = float('nan')
+    for feat in source.getFeatures(request):
+        geom = feat.geometry()
+        if geom.isEmpty():
+            continue
+        parts = geom.asMultiPolyline() if geom.isMultipart() else [geom.asPolyline()]
+        speed = feat[speed_field] if speed_field else None
+        speed = float(speed) if isinstance(speed, (int, float)) else nan
+        flag = str(feat[oneway_field]).strip().lower() in ('1', 'true', 'yes') if oneway_field else False
+        for part in parts:
+            if len(part) < 2:
+                continue
+            for pt in part:
+                xs.append(pt.x())
+                ys.append(pt.y())
+            lengths.append(len(part))
+            speeds.append(speed)
+            oneway.append(flag)
+    lons, lats = transform_xy(xs, ys, crs, QgsCoordinateReferenceSystem(WGS84), transform_context)
+    coords = np.column_stack([lons, lats])
+    lines = np.split(coords, np.cumsum(lengths)[:-1]) if lengths else []
+    return RoadGraph.from_lines(lines, speeds, oneway, default_speed_kmh)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# 路径几何的压缩保存：可达性查询时顺带保留高德返回的折线，导出路径时不再重复请求
+import threading
+import zlib
+
+import numpy as np
+
+# 坐标量化精度：1e-6度（约0.1米），与高德返回的小数位数一致
+COORD_SCALE = 1e6
+
+
+def encode_polyline(coords):
+    """把 [(lon, lat), ...] 压缩为bytes：量化为整数后逐点差分，再用zlib压缩"""
+    arr = np.round(np.asarray(coords, dtype=float).reshape(-1, 2) * COORD_SCALE).astype(np.int64)
+    if len(arr):
+        arr[1:] -= arr[:-1].copy()
+    return zlib.compress(arr.astype(np.int32).tobytes())
+
+
+def decode_polyline(blob):
+    """encode_polyline的逆过程，返回 N×2 的float数组"""
+    arr = np.frombuffer(zlib.decompress(blob), dtype=np.int32).reshape(-1, 2).astype(np.int64)
+    return np.cumsum(arr, axis=0) / COORD_SCALE
+
+
+class RouteStore:
+    """线程安全的路径几何存储，按 (起点GCJ-02, 终点GCJ-02) 保存压缩后的折线"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._routes)
+
+    def __contains__(self, od):
+        return od in self._routes
+
+    def put(self, o_gcj, d_gcj, coords):
+        if not len(coords):
+            return
+        blob = encode_polyline(coords)
+        with self._lock:
+            old = self._routes.get((o_gcj, d_gcj))
+            if old is not None:
+                self.nbytes -= len(old)
+            self._routes[(o_gcj, d_gcj)] = blob
+            self.nbytes += len(blob)
+
+    def get(self, o_gcj, d_gcj):
+        """返回GCJ-02折线（N×2数组），没有保存时返回None"""
+        blob = self._routes.get((o_gcj, d_gcj))
+        return decode_polyline(blob) if blob is not None else None
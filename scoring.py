@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# 评分阶段：对路径阶段得到的OD结果做归一化和加权求和，不发起任何网络请求
+# 输入输出均为按行对齐的数组（列式存储），不再逐行构造字典
+import numpy as np
+
+ACCESSIBILITY_FIELD = '可达性'
+# 归一化方式
+NORMALIZE_NONE = '无需归一化'
+NORMALIZE_ASC = '(value-min)/(max-min)'
+NORMALIZE_DESC = '1-(value-min)/(max-min)'
+NORMALIZE_ZSCORE = '(value-mean)/std'
+# 命令行和Processing参数中归一化方式的简写
+NORMALIZE_ALIASES = {
+    'none': NORMALIZE_NONE,
+    'asc': NORMALIZE_ASC,
+    'desc': NORMALIZE_DESC,
+    'zscore': NORMALIZE_ZSCORE,
+}
+# 流式统计每次处理的元素数
+STATS_CHUNK_SIZE = 65536
+
+
+class FieldStats:
+    """单遍流式统计：有效值个数、最小值、最大值、均值和标准差，内存占用O(1)
+
+    可逐个值或逐块更新，块之间按Chan等人的并行方差公式合并。
+    nan视为缺失，±inf视为非有限值，两者都不计入统计，只分别计数。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.missing = 0
+        self.nonfinite = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        missing = int(np.count_nonzero(np.isnan(values)))
+        finite = values[np.isfinite(values)]
+        self.missing += missing
+        self.nonfinite += values.size - finite.size - missing
+        n = finite.size
+        if n == 0:
+            return self
+        chunk_mean = finite.mean()
+        chunk_m2 = float(np.dot(finite - chunk_mean, finite - chunk_mean))
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += chunk_m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, float(finite.min()))
+        self.max = max(self.max, float(finite.max()))
+        return self
+
+    @property
+    def span(self):
+        return self.max - self.min if self.count else 0.0
+
+    @property
+    def std(self):
+        return float(np.sqrt(self._m2 / self.count)) if self.count else 0.0
+
+
+def field_stats(values, chunk_size=STATS_CHUNK_SIZE):
+    """对一列数值分块做一遍流式统计，返回FieldStats"""
+    stats = FieldStats()
+    for start in range(0, len(values), chunk_size):
+        stats.update(values[start:start + chunk_size])
+    return stats
+
+
+def score_results(columns, field_settings, accessibility_weight, clip_percent=0, unreachable_score=None):
+    """按列归一化并评分
+
+    columns: {字段名: 按行的数值数组}，须包含可达性
+    可达性不是有限值（查询失败为inf）的行视为不可达：不参与任何字段的统计，评分记为unreachable_score；
+    unreachable_score为None时取“可达行的最低分减去全部权重绝对值之和”，保证排在所有可达行之后且仍为有限值。
+    统计量（最小、最大、均值、标准差）只取有限值，缺失（nan）和非有限值（inf）不参与统计，
+    归一化值记为0，即不为该行加分也不扣分。
+    clip_percent>0时先把每个字段截断到 [P(clip_percent), P(100-clip_percent)] 百分位区间，
+    避免个别极端值把其余行都压到0或1附近。
+    各字段打包为 字段数×行数 的二维数组，归一化、取反和加权求和都整体向量化计算。
+    返回 (score数组, {字段名: 归一化值数组})
+    """
+    norm_fields = list(field_settings.keys()) + [ACCESSIBILITY_FIELD]
+    n = len(columns[ACCESSIBILITY_FIELD])
+    values = np.full((len(norm_fields), n), np.nan)
+    for r, field in enumerate(norm_fields):
+        col = columns.get(field)
+        if col is not None:
+            values[r] = col
+    unreachable = ~np.isfinite(np.asarray(columns[ACCESSIBILITY_FIELD], dtype=float))
+    values[:, unreachable] = np.nan
+    if clip_percent and clip_percent > 0:
+        for r in range(len(norm_fields)):
+            row = values[r]
+            finite = row[np.isfinite(row)]
+            if finite.size:
+                lo, hi = np.percentile(finite, [clip_percent, 100 - clip_percent])
+                np.clip(row, lo, hi, out=row)
+    stats = [field_stats(values[r]) for r in range(len(norm_fields))]
+    invalid_cells = ~np.isfinite(values)
+    mins = np.array([st.min if st.count else 0.0 for st in stats])
+    spans = np.array([st.span for st in stats])
+    means = np.array([st.mean for st in stats])
+    stds = np.array([st.std for st in stats])
+    # 可达性总是越短越好；其余字段按设置，未设置归一化的保留原值
+    norm_types = np.array([NORMALIZE_DESC if field == ACCESSIBILITY_FIELD else field_settings[field]['normalize']
+                           for field in norm_fields])
+    desc = norm_types == NORMALIZE_DESC
+    asc = norm_types == NORMALIZE_ASC
+    zscore = norm_types == NORMALIZE_ZSCORE
+    valid = np.where(zscore, stds > 0, spans > 0)
+    scaled = (asc | desc) & valid
+    values[scaled] = (values[scaled] - mins[scaled, None]) / spans[scaled, None]
+    values[desc & valid] = 1.0 - values[desc & valid]
+    standardized = zscore & valid
+    values[standardized] = (values[standardized] - means[standardized, None]) / stds[standardized, None]
+    values[~valid] = 0.0
+    values[invalid_cells] = 0.0
+    weights = np.array([accessibility_weight if field == ACCESSIBILITY_FIELD else field_settings[field]['weight']
+                        for field in norm_fields], dtype=float)
+    scores = weights @ values if n else np.zeros(0)
+    if unreachable.any():
+        if unreachable_score is None:
+            unreachable_score = unreachable_penalty(scores[~unreachable], weights)
+        scores[unreachable] = unreachable_score
+    return scores, {field: values[r] for r, field in enumerate(norm_fields)}
+
+
+def unreachable_penalty(reachable_scores, weights):
+    """不可达行的默认评分：可达行的最低分减去全部权重绝对值之和，排在所有可达行之后且仍为有限值"""
+    lowest = reachable_scores.min() if len(reachable_scores) else 0.0
+    return float(lowest - np.abs(np.asarray(weights, dtype=float)).sum())
+
+
+def best_index(scores):
+    """评分最高的行下标（并列取第一个，nan不参与），无行时返回None"""
+    if len(scores) == 0:
+        return None
+    return int(np.argmax(np.where(np.isnan(scores), -np.inf, scores)))
+
+
+def _dest_means(dest_index, scores, n_origins=None, missing_score=None):
+    """各终点跨起点的平均评分（没有OD对的终点为nan）及各终点第一行的下标
+
+    指定n_origins时按全部起点求平均，该终点缺少的OD对（如被预筛选排除）按missing_score计入
+    """
+    totals = np.bincount(dest_index, weights=scores)
+    counts = np.bincount(dest_index)
+    means = np.full(len(counts), np.nan)
+    present = counts > 0
+    if n_origins is None:
+        means[present] = totals[present] / counts[present]
+    else:
+        missing = n_origins - counts[present]
+        means[present] = (totals[present] + missing * missing_score) / n_origins
+    first_row = np.zeros(len(counts), dtype=int)
+    dests, first = np.unique(dest_index, return_index=True)
+    first_row[dests] = first
+    return means, first_row
+
+
+def top_k(scores, k):
+    """评分最高的k个下标，按评分降序（并列按下标），nan不参与
+
+    只用argpartition做部分选择（O(n)），再对选出的k个排序，不对全部结果排序。
+    """
+    valid = np.flatnonzero(~np.isnan(scores))
+    if k <= 0 or valid.size == 0:
+        return np.zeros(0, dtype=int)
+    values = scores[valid]
+    if k < valid.size:
+        part = np.argpartition(-values, k - 1)[:k]
+        valid = valid[part]
+        values = values[part]
+    return valid[np.lexsort((valid, -values))]
+
+
+def top_k_per_origin(origin_index, scores, k):
+    """按起点分组的前k名，返回 {起点下标: [行下标, ...]}（按起点下标排序，组内按评分降序）"""
+    order = np.argsort(origin_index, kind='stable')
+    bounds = np.flatnonzero(np.diff(origin_index[order])) + 1
+    result = {}
+    for rows in np.split(order, bounds):
+        if rows.size:
+            result[int(origin_index[rows[0]])] = rows[top_k(scores[rows], k)].tolist()
+    return result
+
+
+def aggregate_top_k(dest_index, scores, k, n_origins=None, missing_score=None):
+    """跨全部起点按终点平均评分的前k名，返回 [(该终点的第一行下标, 平均评分), ...]
+
+    n_origins: 起点总数。指定时每个终点都按全部起点求平均，没有OD对的起点按missing_score
+    （通常为不可达评分）计入，只对部分起点评估过的终点不会因此占优；不指定时只对已有的OD对求平均
+    """
+    if len(scores) == 0:
+        return []
+    if n_origins is not None and missing_score is None:
+        raise ValueError('指定n_origins时须给出missing_score')
+    means, first_row = _dest_means(dest_index, scores, n_origins, missing_score)
+    return [(int(first_row[j]), float(means[j])) for j in top_k(means, k)]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""评分阶段的微基准：按列向量化评分、选最佳、按起点分组选最佳和跨起点汇总的耗时
+
+用法（在插件根目录）：python scripts/bench_scoring.py [OD对数] [起点数]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring import score_results, best_index, top_k_per_origin, aggregate_top_k  # noqa: E402
+
+
+def bench(name, func):
+    t0 = time.perf_counter()
+    result = func()
+    print(f'{name:<20s}{(time.perf_counter() - t0) * 1000:10.1f} ms')
+    return result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    n_origins = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    rng = np.random.RandomState(0)
+    origin_index = np.sort(rng.randint(0, n_origins, n)).astype(np.int32)
+    dest_index = rng.randint(0, max(1, n // n_origins), n).astype(np.int32)
+    columns = {
+        'rating': rng.uniform(1, 5, n),
+        'price': rng.uniform(10, 500, n),
+        'area': rng.uniform(50, 5000, n),
+        '可达性': rng.uniform(60, 7200, n),
+    }
+    field_settings = {
+        'rating': {'weight': 2.0, 'normalize': '(value-min)/(max-min)'},
+        'price': {'weight': 1.0, 'normalize': '1-(value-min)/(max-min)'},
+        'area': {'weight': 0.5, 'normalize': '(value-min)/(max-min)'},
+    }
+    print(f'{n} 个OD对，{n_origins} 个起点')
+    scores, _ = bench('score_results', lambda: score_results(columns, field_settings, 1.0))
+    bench('best_index', lambda: best_index(scores))
+    bench('top_k_per_origin k=1', lambda: top_k_per_origin(origin_index, scores, 1))
+    bench('aggregate_top_k k=1', lambda: aggregate_top_k(dest_index, scores, 1))
+
+
+if __name__ == '__main__':
+    main()
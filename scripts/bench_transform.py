@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""GCJ-02 -> WGS84 逆变换的微基准：比较原实现、gcj2wgs（一步牛顿）、有界不动点迭代、牛顿迭代与数组版本的单点耗时和误差
+
+用法（在插件根目录）：python scripts/bench_transform.py [点数]
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transform import wgs2gcj, wgs2gcj_array, gcj2wgs, gcj2wgs_iter, gcj2wgs_newton, gcj2wgs_array  # noqa: E402
+
+
+def gcj2wgs_legacy(gcjLon, gcjLat):
+    """原gcj2wgs实现：无迭代上限，每步分配元组"""
+    g0 = (gcjLon, gcjLat)
+    w0 = g0
+    g1 = wgs2gcj(w0[0], w0[1])
+    w1 = tuple([x[0]-(x[1]-x[2]) for x in zip(w0,g1,g0)])
+    delta = tuple([x[0] - x[1] for x in zip(w1, w0)])
+    while (abs(delta[0]) >= 1e-6 or abs(delta[1]) >= 1e-6):
+        w0 = w1
+        g1 = wgs2gcj(w0[0], w0[1])
+        w1 = tuple([x[0]-(x[1]-x[2]) for x in zip(w0,g1,g0)])
+        delta = tuple([x[0] - x[1] for x in zip(w1, w0)])
+    return w1
+
+
+def bench(name, func, n, truth):
+    t0 = time.perf_counter()
+    lons, lats = func()
+    elapsed = time.perf_counter() - t0
+    err = max(np.abs(np.asarray(lons) - truth[0]).max(), np.abs(np.asarray(lats) - truth[1]).max())
+    print(f'{name:<28s}{elapsed / n * 1e6:10.2f} us/点    最大误差 {err:.2e} 度')
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = np.random.RandomState(0)
+    lons = rng.uniform(73.0, 135.0, n)
+    lats = rng.uniform(18.0, 53.0, n)
+    g_lons, g_lats = wgs2gcj_array(lons, lats)
+    pairs = list(zip(g_lons.tolist(), g_lats.tolist()))
+
+    def scalar(f):
+        def run():
+            out = [f(x, y) for x, y in pairs]
+            return [o[0] for o in out], [o[1] for o in out]
+        return run
+
+    bench('原实现', scalar(gcj2wgs_legacy), n, (lons, lats))
+    bench('gcj2wgs', scalar(gcj2wgs), n, (lons, lats))
+    for tol in (1e-9, 1e-11):
+        bench(f'gcj2wgs_iter tol={tol:g}', scalar(lambda x, y: gcj2wgs_iter(x, y, tol=tol)), n, (lons, lats))
+        bench(f'gcj2wgs_newton tol={tol:g}', scalar(lambda x, y: gcj2wgs_newton(x, y, tol=tol)), n, (lons, lats))
+    bench('gcj2wgs_array', lambda: gcj2wgs_array(g_lons, g_lats), n, (lons, lats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# coding=utf-8
+"""AMap batch distance request test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Connor_RK800@163.com'
+__date__ = '2025-07-09'
+__copyright__ = 'Copyright 2025, MaritimeDay'
+
+import importlib
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+# amap_api以相对导入引用http_client，需要作为插件包的子模块导入
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+amap_api = importlib.import_module(os.path.basename(PLUGIN_DIR) + '.amap_api')
+
+INF = (float('inf'), float('inf'))
+
+
+class FakeCache:
+
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+
+    def get(self, o_gcj, d_gcj, mode, city=None):
+        return self.entries.get((o_gcj, d_gcj))
+
+    def put(self, o_gcj, d_gcj, mode, city, duration, distance):
+        self.entries[(o_gcj, d_gcj)] = (duration, distance)
+
+
+def walking_route(duration, distance):
+    step = {'polyline': '116.0,39.0;116.1,39.1'}
+    return {'status': '1', 'route': {'paths': [{'duration': duration, 'distance': distance, 'steps': [step]}]}}
+
+
+class AmapApiTest(unittest.TestCase):
+    """Test the /v3/distance batch path with a mocked http_client.get_json."""
+
+    def setUp(self):
+        self.urls = []
+        self.responses = {}
+
+    def get_json(self, url, key=None):
+        self.urls.append(url)
+        return self.responses[urlparse(url).path]
+
+    def batch(self, o_gcjs, d_gcj, cache=None):
+        with mock.patch.object(amap_api.http_client, 'get_json', side_effect=self.get_json):
+            return amap_api.get_travel_times_gcj_batch(o_gcjs, d_gcj, 'walking', 'k', cache=cache)
+
+    def test_origin_id_maps_to_uncached_origins(self):
+        """origin_id counts only the origins sent, cached ones are filled from the cache."""
+        o_gcjs = [(116.0, 39.0), (116.1, 39.0), (116.2, 39.0), (116.3, 39.0)]
+        d_gcj = (116.5, 39.5)
+        cache = FakeCache({(o_gcjs[1], d_gcj): (11.0, 110.0)})
+        self.responses['/v3/distance'] = {'status': '1', 'results': [
+            {'origin_id': '3', 'duration': '30', 'distance': '300'},
+            {'origin_id': '1', 'duration': '10', 'distance': '100'},
+            {'origin_id': '2', 'duration': '20', 'distance': '200'},
+        ]}
+        results = self.batch(o_gcjs, d_gcj, cache)
+        self.assertEqual(results, [(10.0, 100.0), (11.0, 110.0), (20.0, 200.0), (30.0, 300.0)])
+        query = parse_qs(urlparse(self.urls[0]).query)
+        self.assertEqual(query['origins'], ['116.0,39.0|116.2,39.0|116.3,39.0'])
+        self.assertEqual(query['type'], ['3'])
+        self.assertEqual(len(self.urls), 1)
+        self.assertEqual(cache.entries[(o_gcjs[3], d_gcj)], (30.0, 300.0))
+
+    def test_failed_entries_fall_back_to_single_requests(self):
+        """Entries with a non-zero code or missing from the response are queried one by one."""
+        o_gcjs = [(116.0, 39.0), (116.1, 39.0), (116.2, 39.0)]
+        self.responses['/v3/distance'] = {'status': '1', 'results': [
+            {'origin_id': '1', 'duration': '10', 'distance': '100'},
+            {'origin_id': '2', 'code': '3', 'info': '步行距离过长', 'duration': '0', 'distance': '0'},
+        ]}
+        self.responses['/v3/direction/walking'] = walking_route('50', '500')
+        results = self.batch(o_gcjs, (116.5, 39.5))
+        self.assertEqual(results, [(10.0, 100.0), (50.0, 500.0), (50.0, 500.0)])
+        singles = [parse_qs(urlparse(url).query)['origin'][0] for url in self.urls[1:]]
+        self.assertEqual(singles, ['116.1,39.0', '116.2,39.0'])
+
+    def test_rejected_batch_is_unreachable(self):
+        """A batch rejected as a whole marks its uncached pairs unreachable without single requests."""
+        o_gcjs = [(116.0, 39.0), (116.1, 39.0)]
+        d_gcj = (116.5, 39.5)
+        cache = FakeCache({(o_gcjs[0], d_gcj): (10.0, 100.0)})
+        self.responses['/v3/distance'] = {'status': '0', 'info': 'INVALID_PARAMS', 'infocode': '20000'}
+        self.assertEqual(self.batch(o_gcjs, d_gcj, cache), [(10.0, 100.0), INF])
+        self.assertEqual(len(self.urls), 1)
+
+    def test_quota_is_not_unreachable(self):
+        """Quota errors propagate from single requests and leave unqueried batch fallbacks as nan."""
+        quota = amap_api.QuotaExceededError('Key不可用')
+
+        def get_json(url, key=None):
+            self.urls.append(url)
+            if urlparse(url).path == '/v3/distance':
+                return {'status': '1', 'results': [{'origin_id': '1', 'duration': '10', 'distance': '100'}]}
+            raise quota
+
+        with mock.patch.object(amap_api.http_client, 'get_json', side_effect=get_json):
+            self.assertRaises(amap_api.QuotaExceededError, amap_api.get_travel_time_gcj,
+                              (116.0, 39.0), (116.5, 39.5), 'driving', 'k')
+            results = amap_api.get_travel_times_gcj_batch(
+                [(116.0, 39.0), (116.1, 39.0), (116.2, 39.0)], (116.5, 39.5), 'walking', 'k')
+        self.assertEqual(results[0], (10.0, 100.0))
+        self.assertTrue(np.isnan(results[1]).all() and np.isnan(results[2]).all())
+        # 第一个逐对补查遇到配额用尽后不再请求
+        self.assertEqual(len(self.urls), 3)
+
+    def test_distance_batches(self):
+        """Pending rows are grouped per destination in chunks of at most max_origins origins."""
+        n_origins, n_dests = 250, 3
+        matrix = SimpleNamespace(
+            origin_index=np.repeat(np.arange(n_origins), n_dests),
+            dest_index=np.tile(np.arange(n_dests), n_origins),
+            origins=SimpleNamespace(gcj=lambda i: (float(i), 0.0)),
+            dests=SimpleNamespace(gcj=lambda j: (0.0, float(j))))
+        # 终点2的OD对已完成，不再请求
+        rows = np.flatnonzero(matrix.dest_index != 2)
+        batches = list(amap_api.distance_batches(matrix, rows, 100))
+        self.assertEqual([(len(idxs), d_gcj) for idxs, _, d_gcj in batches],
+                         [(100, (0.0, 0.0)), (100, (0.0, 0.0)), (50, (0.0, 0.0)),
+                          (100, (0.0, 1.0)), (100, (0.0, 1.0)), (50, (0.0, 1.0))])
+        for idxs, o_gcjs, d_gcj in batches:
+            self.assertTrue(all(matrix.dest_index[idx] == d_gcj[1] for idx in idxs))
+            self.assertEqual(o_gcjs, [(float(matrix.origin_index[idx]), 0.0) for idx in idxs])
+        self.assertEqual(sorted(idx for idxs, _, _ in batches for idx in idxs), rows.tolist())
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(AmapApiTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,138 @@
+# coding=utf-8
+"""HTTP client retry test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Connor_RK800@163.com'
+__date__ = '2025-07-09'
+__copyright__ = 'Copyright 2025, MaritimeDay'
+
+import importlib
+import os
+import sys
+import unittest
+from unittest import mock
+
+import requests
+
+# http_client以相对导入引用rate_limiter，需要作为插件包的子模块导入
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+http_client = importlib.import_module(os.path.basename(PLUGIN_DIR) + '.http_client')
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers or {}
+
+    def json(self):
+        if self.data is None:
+            raise ValueError('not json')
+        return self.data
+
+
+class FakeSession:
+    """按顺序返回预设的响应或抛出预设的异常，并记录请求次数"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        outcome = self.outcomes[self.calls]
+        self.calls += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+OK = {'status': '1', 'infocode': '10000'}
+
+
+class HttpClientTest(unittest.TestCase):
+    """Test retries and backoff of get_json with a mocked session."""
+
+    def setUp(self):
+        http_client.configure(max_retries=3, backoff=0.5)
+        self.sleeps = []
+        patcher = mock.patch.object(http_client.time, 'sleep', side_effect=self.sleeps.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(http_client.configure, max_retries=http_client.DEFAULT_MAX_RETRIES,
+                        backoff=http_client.DEFAULT_BACKOFF)
+
+    def get_json(self, outcomes):
+        return self.get_json_with_key(outcomes, None)
+
+    def get_json_with_key(self, outcomes, key):
+        session = FakeSession(outcomes)
+        with mock.patch.object(http_client, 'get_session', return_value=session):
+            try:
+                return http_client.get_json('https://example.invalid/', key), session.calls
+            except Exception as e:
+                return e, session.calls
+
+    def test_retry_on_429_and_5xx(self):
+        """429 and 5xx responses are retried; Retry-After lengthens the wait."""
+        data, calls = self.get_json([FakeResponse(503), FakeResponse(429, headers={'Retry-After': '3'}),
+                                     FakeResponse(200, OK)])
+        self.assertEqual(data, OK)
+        self.assertEqual(calls, 3)
+        self.assertEqual(self.sleeps, [0.5, 3.0])
+
+    def test_retry_on_connection_error(self):
+        """Connection errors and timeouts are retried with exponential backoff."""
+        data, calls = self.get_json([requests.ConnectionError(), requests.Timeout(), FakeResponse(200, OK)])
+        self.assertEqual(data, OK)
+        self.assertEqual(calls, 3)
+        self.assertEqual(self.sleeps, [0.5, 1.0])
+
+    def test_no_retry_on_4xx(self):
+        """Other 4xx responses are returned or raised at once."""
+        rejected = {'status': '0', 'info': 'INVALID_PARAMS', 'infocode': '20000'}
+        data, calls = self.get_json([FakeResponse(400, rejected), FakeResponse(200, OK)])
+        self.assertEqual((data, calls), (rejected, 1))
+        error, calls = self.get_json([FakeResponse(403), FakeResponse(200, OK)])
+        self.assertIsInstance(error, ValueError)
+        self.assertEqual(calls, 1)
+        self.assertEqual(self.sleeps, [])
+
+    def test_backoff_is_capped(self):
+        """Backoff doubles up to MAX_BACKOFF and gives up after max_retries."""
+        http_client.configure(backoff=3.0)
+        error, calls = self.get_json([FakeResponse(502)] * 4)
+        self.assertIsInstance(error, http_client.RetryableResponseError)
+        self.assertEqual(calls, 4)
+        self.assertEqual(self.sleeps, [3.0, 6.0, http_client.MAX_BACKOFF])
+        self.assertEqual(http_client.backoff_delay(0, retry_after=600), http_client.MAX_BACKOFF)
+        # 高德QPS类错误重试用尽时返回原始响应
+        busy = {'status': '0', 'info': 'CUQPS_HAS_EXCEEDED_THE_LIMIT', 'infocode': '10020'}
+        data, calls = self.get_json([FakeResponse(200, busy)] * 4)
+        self.assertEqual((data, calls), (busy, 4))
+
+    def test_quota_codes(self):
+        """Quota codes fail over within a key pool and raise once no key is left."""
+        over = {'status': '0', 'info': 'DAILY_QUERY_OVER_LIMIT', 'infocode': '10044'}
+        error, calls = self.get_json_with_key([FakeResponse(200, over), FakeResponse(200, OK)], 'quota_single')
+        self.assertIsInstance(error, http_client.rate_limiter.QuotaExceededError)
+        self.assertEqual(calls, 1)
+        pool = http_client.rate_limiter.configure_keys(['quota_a', 'quota_b'], 1000)
+        data, calls = self.get_json_with_key([FakeResponse(200, over), FakeResponse(200, OK)], pool)
+        self.assertEqual((data, calls), (OK, 2))
+        error, calls = self.get_json_with_key([FakeResponse(200, over)], pool)
+        self.assertIsInstance(error, http_client.rate_limiter.QuotaExceededError)
+        self.assertEqual(calls, 1)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(HttpClientTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,67 @@
+# coding=utf-8
+"""Travel time cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Connor_RK800@163.com'
+__date__ = '2025-07-09'
+__copyright__ = 'Copyright 2025, MaritimeDay'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from od_cache import TravelTimeCache
+
+
+class TravelTimeCacheTest(unittest.TestCase):
+    """Test the SQLite OD cache."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'od_cache.sqlite')
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_round_trip(self):
+        """A stored pair is found again with slightly different coordinates."""
+        cache = TravelTimeCache(self.path)
+        cache.put((116.397128, 39.916527), (116.410886, 39.881949), 'driving', None, 600.0, 5000.0)
+        self.assertEqual(
+            cache.get((116.3971281, 39.9165271), (116.410886, 39.881949), 'driving'), (600.0, 5000.0))
+        self.assertIsNone(cache.get((116.397128, 39.916527), (116.410886, 39.881949), 'walking'))
+        cache.close()
+
+    def test_size_eviction(self):
+        """The oldest entries are evicted above max_entries."""
+        cache = TravelTimeCache(self.path, max_entries=5)
+        for i in range(8):
+            cache.put((116.0 + i * 0.01, 39.9), (116.5, 39.9), 'driving', None, i, i)
+        cache.prune()
+        self.assertIsNone(cache.get((116.0, 39.9), (116.5, 39.9), 'driving'))
+        self.assertEqual(cache.get((116.07, 39.9), (116.5, 39.9), 'driving'), (7.0, 7.0))
+        cache.close()
+
+    def test_sqlite_error(self):
+        """SQLite errors count as a miss or a dropped write and are not raised."""
+        cache = TravelTimeCache(self.path)
+        cache.put((116.0, 39.9), (116.5, 39.9), 'driving', None, 60.0, 500.0)
+        cache.close()
+        self.assertIsNone(cache.get((116.0, 39.9), (116.5, 39.9), 'driving'))
+        cache.put((116.1, 39.9), (116.5, 39.9), 'driving', None, 60.0, 500.0)
+        self.assertEqual((cache.hits, cache.misses, cache.errors), (0, 1, 2))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TravelTimeCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,150 @@
+# coding=utf-8
+"""Concurrent OD engine test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Connor_RK800@163.com'
+__date__ = '2025-07-09'
+__copyright__ = 'Copyright 2025, MaritimeDay'
+
+import threading
+import time
+import unittest
+
+from od_engine import PENDING_PER_WORKER, QueuedLog, iter_concurrent, iter_travel_times
+
+
+def slow_square(x, delay):
+    time.sleep(delay)
+    return x * x
+
+
+class ODEngineTest(unittest.TestCase):
+    """Test the bounded thread pool behind the OD queries."""
+
+    def test_results_match_inputs(self):
+        """Every result comes back with its own task id; ordered mode keeps input order."""
+        # 先提交的任务耗时更长，完成顺序与提交顺序相反
+        tasks = [(k, (k, 0.05 - k * 0.01)) for k in range(5)]
+        results = list(iter_concurrent(tasks, slow_square, max_workers=5))
+        self.assertEqual(sorted(results), [(k, k * k, None) for k in range(5)])
+        ordered = list(iter_concurrent(tasks, slow_square, max_workers=5, ordered=True))
+        self.assertEqual(ordered, [(k, k * k, None) for k in range(5)])
+
+    def test_bounded_window(self):
+        """Tasks are pulled lazily and at most max_workers run at once."""
+        max_workers = 3
+        lock = threading.Lock()
+        state = {'pulled': 0, 'running': 0, 'max_running': 0, 'max_ahead': 0}
+
+        def tasks():
+            for k in range(100):
+                with lock:
+                    state['pulled'] += 1
+                yield k, (k,)
+
+        def func(k):
+            with lock:
+                state['running'] += 1
+                state['max_running'] = max(state['max_running'], state['running'])
+            time.sleep(0.002)
+            with lock:
+                state['running'] -= 1
+            return k
+
+        yielded = 0
+        for _ in iter_concurrent(tasks(), func, max_workers):
+            yielded += 1
+            state['max_ahead'] = max(state['max_ahead'], state['pulled'] - yielded)
+        self.assertEqual(yielded, 100)
+        self.assertLessEqual(state['max_running'], max_workers)
+        self.assertLessEqual(state['max_ahead'], max_workers * PENDING_PER_WORKER)
+
+    def test_worker_exception(self):
+        """A failing task is reported with its error and the others still complete."""
+        def func(k):
+            if k == 2:
+                raise ValueError('boom')
+            return k
+
+        results = {task_id: (result, error) for task_id, result, error in iter_concurrent(
+            ((k, (k,)) for k in range(4)), func, 2)}
+        self.assertIsInstance(results[2][1], ValueError)
+        self.assertEqual([results[k][0] for k in (0, 1, 3)], [0, 1, 3])
+        # 逐对查询中失败的OD对记为不可达
+        rows = dict((idx, (d, s)) for idx, d, s in iter_travel_times(
+            [(k, k, k) for k in range(4)], lambda o, d: (func(o), 1.0), 2))
+        self.assertEqual(rows[2], (float('inf'), float('inf')))
+        self.assertEqual(rows[3], (3, 1.0))
+
+    def test_cancel_stops_submissions(self):
+        """After should_stop turns true no new tasks are started."""
+        calls = []
+        stop = threading.Event()
+
+        def func(k):
+            calls.append(k)
+            time.sleep(0.005)
+            return k
+
+        received = []
+        for task_id, _, _ in iter_concurrent(((k, (k,)) for k in range(1000)), func, 2, stop.is_set):
+            received.append(task_id)
+            if len(received) == 5:
+                stop.set()
+        started = len(calls)
+        time.sleep(0.05)
+        self.assertEqual(len(calls), started)
+        self.assertLess(started, 5 + 2 * PENDING_PER_WORKER + 1)
+        # 调用方提前break时，排队中的任务同样被取消
+        calls[:] = []
+        for _ in iter_concurrent(((k, (k,)) for k in range(1000)), func, 2):
+            break
+        time.sleep(0.05)
+        self.assertLessEqual(len(calls), 2 * PENDING_PER_WORKER)
+
+    def test_stop_submitting_drains(self):
+        """stop_submitting stops new tasks but still yields every task already submitted."""
+        stop = threading.Event()
+        calls = []
+
+        def func(k):
+            calls.append(k)
+            if k == 10:
+                stop.set()
+            time.sleep(0.002)
+            return k
+
+        results = list(iter_concurrent(((k, (k,)) for k in range(1000)), func, 2, stop_submitting=stop.is_set))
+        self.assertEqual(sorted(task_id for task_id, _, _ in results), sorted(calls))
+        self.assertLess(len(calls), 10 + 2 * PENDING_PER_WORKER + 2)
+
+    def test_queued_log_limit(self):
+        """Above the limit worker logs are only counted by category and summarized once."""
+        written = []
+
+        class Reporter:
+            def append_log(self, msg):
+                written.append(msg)
+
+        log = QueuedLog(limit=2)
+        for k in range(1000):
+            log.append_log('终点可达性获取失败: DAILY_QUERY_OVER_LIMIT')
+            log.append_log(f'终点可达性获取异常: ConnectionError: HTTPSConnectionPool(port={k}): Max retries')
+        log.append_log('路径API失败: url=https://restapi.amap.com/v3/direction/driving?origin=1,2')
+        log.flush_summary(Reporter())
+        self.assertEqual(len(written), 2 + 1 + 3)
+        self.assertIn('  终点可达性获取失败: DAILY_QUERY_OVER_LIMIT × 999', written)
+        self.assertIn('  终点可达性获取异常: ConnectionError × 999', written)
+        self.assertIn('  路径API失败 × 1', written)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ODEngineTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,73 @@
+# coding=utf-8
+"""Resumable analysis journal test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Connor_RK800@163.com'
+__date__ = '2025-07-09'
+__copyright__ = 'Copyright 2025, MaritimeDay'
+
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from od_journal import ODJournal, journal_signature
+
+
+class ODJournalTest(unittest.TestCase):
+    """Test journaling and resuming OD results."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'journal.sqlite')
+        self.origins = SimpleNamespace(ids=[1, 2], lons=[116.3, 116.4], lats=[39.9, 39.8])
+        self.dests = SimpleNamespace(ids=['a'], lons=[116.5], lats=[40.0])
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_resume(self):
+        """Recorded pairs survive a reopen with the same signature."""
+        signature = journal_signature('driving', None, self.origins, self.dests)
+        journal = ODJournal(self.path, signature)
+        self.assertFalse(journal.resumed)
+        journal.record(0, 0, 600.0, 5000.0)
+        journal.record(1, 0, 700.0, 6000.0)
+        journal.close()
+        journal = ODJournal(self.path, signature)
+        self.assertTrue(journal.resumed)
+        o, d, duration, distance = journal.load()
+        self.assertEqual(sorted(zip(o.tolist(), d.tolist(), duration.tolist())),
+                         [(0, 0, 600.0), (1, 0, 700.0)])
+        journal.close()
+
+    def test_signature_change(self):
+        """A different mode or resume=False starts from an empty journal."""
+        signature = journal_signature('driving', None, self.origins, self.dests)
+        journal = ODJournal(self.path, signature)
+        journal.record(0, 0, 600.0, 5000.0)
+        journal.close()
+        self.assertNotEqual(signature, journal_signature('walking', None, self.origins, self.dests))
+        journal = ODJournal(self.path, journal_signature('walking', None, self.origins, self.dests))
+        self.assertFalse(journal.resumed)
+        self.assertEqual(len(journal), 0)
+        journal.record(0, 0, 900.0, 5000.0)
+        journal.close()
+        journal = ODJournal(self.path, journal_signature('walking', None, self.origins, self.dests), resume=False)
+        self.assertEqual(len(journal), 0)
+        journal.close()
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ODJournalTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,40 @@
+# coding=utf-8
+"""Straight-line pre-filter test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Connor_RK800@163.com'
+__date__ = '2025-07-09'
+__copyright__ = 'Copyright 2025, MaritimeDay'
+
+import unittest
+
+from prefilter import haversine, select_candidates
+
+
+class PrefilterTest(unittest.TestCase):
+    """Test haversine distances and candidate selection."""
+
+    def test_haversine(self):
+        """One degree of latitude is about 111 km."""
+        d = haversine(116.0, 39.0, [116.0], [40.0])
+        self.assertAlmostEqual(d[0] / 1000, 111.2, delta=0.2)
+
+    def test_top_k_and_radius(self):
+        """Top-K keeps the nearest ones in order; radius drops far ones."""
+        lons = [116.30, 116.01, 116.10, 116.02]
+        lats = [39.0, 39.0, 39.0, 39.0]
+        self.assertEqual(select_candidates((116.0, 39.0), lons, lats, top_k=2).tolist(), [1, 3])
+        self.assertEqual(select_candidates((116.0, 39.0), lons, lats, max_radius=10000).tolist(), [1, 3, 2])
+        self.assertEqual(len(select_candidates((116.0, 39.0), lons, lats)), 4)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(PrefilterTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,65 @@
+# coding=utf-8
+"""Rate limiter test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Connor_RK800@163.com'
+__date__ = '2025-07-09'
+__copyright__ = 'Copyright 2025, MaritimeDay'
+
+import time
+import unittest
+
+from rate_limiter import TokenBucket, DailyQuota, KeyLimiter, KeyPool, QuotaExceededError, configure_keys, split_keys
+
+
+class RateLimiterTest(unittest.TestCase):
+    """Test token bucket and daily quota."""
+
+    def test_token_bucket_rate(self):
+        """Requests beyond the burst are spaced at 1/rate."""
+        bucket = TokenBucket(20, 1)
+        start = time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+        elapsed = time.monotonic() - start
+        self.assertGreaterEqual(elapsed, 0.45)
+
+    def test_daily_quota(self):
+        """Quota refuses once the limit is reached; 0 means unlimited."""
+        quota = DailyQuota(2)
+        self.assertTrue(quota.consume())
+        self.assertTrue(quota.consume())
+        self.assertFalse(quota.consume())
+        unlimited = DailyQuota(0)
+        for _ in range(100):
+            self.assertTrue(unlimited.consume())
+
+    def test_key_limiter_raises(self):
+        """KeyLimiter raises once the daily quota is used up."""
+        limiter = KeyLimiter(1000, 1)
+        limiter.acquire()
+        self.assertRaises(QuotaExceededError, limiter.acquire)
+
+    def test_key_pool_failover(self):
+        """Requests rotate across keys and skip keys that are used up."""
+        self.assertEqual(split_keys('k1, k2;k3\nk1'), ['k1', 'k2', 'k3'])
+        pool = configure_keys(['pool_a', 'pool_b', 'pool_c'], 1000, 2)
+        self.assertIsInstance(pool, KeyPool)
+        self.assertEqual(sorted(pool.acquire() for _ in range(3)), ['pool_a', 'pool_b', 'pool_c'])
+        pool.mark_exhausted('pool_b')
+        used = [pool.acquire() for _ in range(2)]
+        self.assertEqual(sorted(used), ['pool_a', 'pool_c'])
+        self.assertRaises(QuotaExceededError, pool.acquire)
+        self.assertEqual(configure_keys(['single'], 1000), 'single')
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(RateLimiterTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,107 @@
+# coding=utf-8
+"""Offline road graph routing test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Connor_RK800@163.com'
+__date__ = '2025-07-09'
+__copyright__ = 'Copyright 2025, MaritimeDay'
+
+import types
+import unittest
+
+import numpy as np
+
+from road_graph import RoadGraph, LocalRoutingBackend, MODE_SPEEDS_KMH, travel_profile
+
+
+class RoadGraphTest(unittest.TestCase):
+    """Test graph construction, snapping and one-to-many Dijkstra."""
+
+    def setUp(self):
+        """A slow direct road A-C and a fast detour A-B-C, plus a one-way spur C->D."""
+        self.a, self.b, self.c, self.d = (116.0, 39.0), (116.0, 39.01), (116.01, 39.0), (116.02, 39.0)
+        lines = [[self.a, self.c], [self.a, self.b, self.c], [self.c, self.d]]
+        self.graph = RoadGraph.from_lines(lines, speeds_kmh=[10, 60, 30], oneway=[False, False, True])
+
+    def test_construction(self):
+        """Shared vertices are merged into one node; two-way lines get both directions."""
+        self.assertEqual(len(self.graph), 4)
+        self.assertEqual(self.graph.edge_count, 7)
+
+    def test_nearest_nodes(self):
+        """Points snap to the closest node, also far outside the local grid cells."""
+        nodes, dist = self.graph.nearest_nodes([116.0001, 117.0], [39.0, 39.0])
+        self.assertAlmostEqual(self.graph.node_lons[nodes[0]], 116.0)
+        self.assertLess(dist[0], 10)
+        self.assertAlmostEqual(self.graph.node_lons[nodes[1]], 116.02)
+
+    def test_one_to_many(self):
+        """The fast detour wins over the slow direct road; one-way edges are respected."""
+        backend = LocalRoutingBackend(self.graph)
+        times, dists = backend.travel_times(self.a, [self.c[0], self.d[0]], [self.c[1], self.d[1]])
+        direct_km = dists[0] / 1000
+        self.assertGreater(direct_km, 2.0)
+        self.assertLess(times[0], 1.12 / 10 * 3600)
+        self.assertTrue(np.all(np.isfinite(times)))
+        back_times, _ = backend.travel_times(self.d, [self.a[0]], [self.a[1]])
+        self.assertTrue(np.isinf(back_times[0]))
+        route = backend.route(self.a, self.c)
+        self.assertIn(self.b, route)
+
+    def test_route(self):
+        """Routes follow the fastest path, keep off-network endpoints and respect one-way edges."""
+        backend = LocalRoutingBackend(self.graph)
+        self.assertEqual(backend.route(self.a, self.c), [self.a, self.b, self.c])
+        start = (115.9999, 39.0)
+        route = backend.route(start, self.d)
+        self.assertEqual(route, [start, self.a, self.b, self.c, self.d])
+        self.assertEqual(backend.route(self.d, self.a), [])
+        # 导出结束后释放缓存的搜索结果，释放后仍可继续使用
+        backend.release()
+        self.assertIsNone(backend._last)
+        self.assertEqual(backend.route(self.a, self.c), [self.a, self.b, self.c])
+
+    def test_disconnected(self):
+        """Destinations on another component are unreachable and get no route."""
+        island = [(117.0, 40.0), (117.01, 40.0)]
+        graph = RoadGraph.from_lines([[self.a, self.c], island])
+        backend = LocalRoutingBackend(graph)
+        # 两个起点（A和岛上一点）各到两个终点（C和岛上另一点）
+        matrix = types.SimpleNamespace(
+            origins=types.SimpleNamespace(wgs=[self.a, island[0]].__getitem__),
+            dests=types.SimpleNamespace(lons=np.array([self.c[0], island[1][0]]),
+                                        lats=np.array([self.c[1], island[1][1]])),
+            origin_index=np.array([0, 0, 1, 1]), dest_index=np.array([0, 1, 0, 1]))
+        results = {idx: (t, d) for idx, t, d in backend.iter_travel_times(
+            matrix, np.arange(4), None, lambda: False)}
+        self.assertTrue(np.isfinite(results[0][0]) and np.isfinite(results[3][0]))
+        self.assertTrue(np.isinf(results[1][0]) and np.isinf(results[1][1]))
+        self.assertTrue(np.isinf(results[2][0]))
+        rows = [{'s_wgs': self.a, 'd_wgs': island[1]}, {'s_wgs': island[0], 'd_wgs': island[1]}]
+        routes = dict(backend.iter_routes(rows, None, lambda: False))
+        self.assertIsNone(routes[0])
+        self.assertEqual(routes[1], island)
+
+    def test_profile_and_signature(self):
+        """Modes map to speed profiles and the signature tracks network, speeds and access speed."""
+        self.assertEqual(travel_profile('driving', 40), (True, 40.0))
+        self.assertEqual(travel_profile('walking'), (False, MODE_SPEEDS_KMH['walking']))
+        self.assertRaises(ValueError, travel_profile, 'transit')
+        lines = [[self.a, self.b, self.c]]
+        slow = LocalRoutingBackend(RoadGraph.from_lines(lines, default_speed_kmh=10))
+        fast = LocalRoutingBackend(RoadGraph.from_lines(lines, default_speed_kmh=60))
+        self.assertNotEqual(slow.signature, fast.signature)
+        self.assertNotEqual(slow.signature, LocalRoutingBackend(slow.graph, 5).signature)
+        self.assertEqual(slow.signature, LocalRoutingBackend(RoadGraph.from_lines(lines, default_speed_kmh=10)).signature)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(RoadGraphTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
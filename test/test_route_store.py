@@ -0,0 +1,50 @@
+# coding=utf-8
+"""Compressed route geometry store test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Connor_RK800@163.com'
+__date__ = '2025-07-09'
+__copyright__ = 'Copyright 2025, MaritimeDay'
+
+import unittest
+
+import numpy as np
+
+from route_store import RouteStore, decode_polyline, encode_polyline
+
+
+class RouteStoreTest(unittest.TestCase):
+    """Test polyline round trips and the OD keyed store."""
+
+    def test_round_trip(self):
+        """Decoded coordinates match the input to 1e-6 degrees."""
+        coords = [(116.397428, 39.90923), (116.397501, 39.909301), (116.401234, 39.912345)]
+        decoded = decode_polyline(encode_polyline(coords))
+        self.assertEqual(decoded.shape, (3, 2))
+        np.testing.assert_allclose(decoded, coords, atol=1e-6)
+
+    def test_store(self):
+        """Routes are keyed by origin and destination; empty ones are not kept."""
+        store = RouteStore()
+        o, d = (116.3, 39.9), (116.4, 40.0)
+        store.put(o, d, [(116.3, 39.9), (116.35, 39.95), (116.4, 40.0)])
+        store.put(d, o, [])
+        self.assertEqual(len(store), 1)
+        self.assertIn((o, d), store)
+        self.assertIsNone(store.get(d, o))
+        np.testing.assert_allclose(store.get(o, d)[-1], (116.4, 40.0), atol=1e-6)
+        size = store.nbytes
+        store.put(o, d, [(116.3, 39.9), (116.4, 40.0)])
+        self.assertLessEqual(store.nbytes, size)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(RouteStoreTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
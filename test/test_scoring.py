@@ -0,0 +1,145 @@
+# coding=utf-8
+"""Scoring test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Connor_RK800@163.com'
+__date__ = '2025-07-09'
+__copyright__ = 'Copyright 2025, MaritimeDay'
+
+import unittest
+
+import numpy as np
+
+from scoring import score_results, field_stats, best_index, top_k, top_k_per_origin, aggregate_top_k, unreachable_penalty
+
+
+def make_columns():
+    return {'rating': np.array([3.0, 4.0, 5.0]), '可达性': np.array([600.0, 300.0, 900.0])}
+
+
+class ScoringTest(unittest.TestCase):
+    """Test normalization and weighting of OD columns."""
+
+    def test_accessibility_only(self):
+        """With only accessibility weighted the fastest destination wins."""
+        settings = {'rating': {'weight': 0.0, 'normalize': '(value-min)/(max-min)'}}
+        scores, normalized = score_results(make_columns(), settings, 1.0)
+        self.assertEqual(best_index(scores), 1)
+        self.assertAlmostEqual(normalized['可达性'][2], 0.0)
+
+    def test_rescore_with_new_weights(self):
+        """Rescoring the same columns with other weights changes the winner."""
+        settings = {'rating': {'weight': 5.0, 'normalize': '(value-min)/(max-min)'}}
+        scores, _ = score_results(make_columns(), settings, 1.0)
+        self.assertEqual(best_index(scores), 2)
+        self.assertAlmostEqual(scores[2], 5.0)
+
+    def test_missing_values(self):
+        """Missing and non-finite values are left out of min/max and normalize to zero."""
+        columns = make_columns()
+        columns['rating'] = np.array([np.nan, 4.0, 2.0, np.inf])
+        columns['可达性'] = np.array([600.0, 300.0, 900.0, 100.0])
+        settings = {'rating': {'weight': 1.0, 'normalize': '(value-min)/(max-min)'}}
+        _, normalized = score_results(columns, settings, 0.0)
+        np.testing.assert_allclose(normalized['rating'], [0.0, 1.0, 0.0, 0.0])
+
+    def test_field_stats_streaming(self):
+        """Chunked streaming statistics equal the whole-array ones."""
+        rng = np.random.RandomState(1)
+        values = rng.normal(10.0, 3.0, 1000)
+        values[::97] = np.nan
+        values[5] = np.inf
+        stats = field_stats(values, chunk_size=64)
+        finite = values[np.isfinite(values)]
+        self.assertEqual(stats.count, finite.size)
+        self.assertEqual(stats.nonfinite, 1)
+        self.assertEqual(stats.missing, int(np.isnan(values).sum()))
+        self.assertAlmostEqual(stats.min, finite.min())
+        self.assertAlmostEqual(stats.max, finite.max())
+        self.assertAlmostEqual(stats.mean, finite.mean())
+        self.assertAlmostEqual(stats.std, finite.std())
+
+    def test_unreachable_rows(self):
+        """Unreachable rows stay out of the statistics and get a penalty below every reachable row."""
+        columns = {'rating': np.array([3.0, 4.0, 100.0]), '可达性': np.array([600.0, 300.0, np.inf])}
+        settings = {'rating': {'weight': 1.0, 'normalize': '(value-min)/(max-min)'}}
+        scores, normalized = score_results(columns, settings, 1.0)
+        np.testing.assert_allclose(normalized['可达性'], [0.0, 1.0, 0.0])
+        np.testing.assert_allclose(normalized['rating'], [0.0, 1.0, 0.0])
+        self.assertTrue(np.isfinite(scores).all())
+        self.assertLess(scores[2], scores[:2].min())
+        scores, _ = score_results(columns, settings, 1.0, unreachable_score=-10.0)
+        self.assertEqual(scores[2], -10.0)
+
+    def test_percentile_clipping(self):
+        """Clipping stops a single outlier from flattening the other rows."""
+        columns = {'rating': np.append(np.arange(1.0, 100.0), 1e6), '可达性': np.ones(100)}
+        settings = {'rating': {'weight': 1.0, 'normalize': '(value-min)/(max-min)'}}
+        _, plain = score_results(columns, settings, 0.0)
+        _, clipped = score_results(columns, settings, 0.0, clip_percent=2)
+        self.assertLess(plain['rating'][97], 0.001)
+        self.assertGreater(clipped['rating'][97], 0.99)
+        self.assertAlmostEqual(clipped['rating'][99], 1.0)
+
+    def test_zscore(self):
+        """z-score normalization centres and scales by the standard deviation."""
+        columns = make_columns()
+        settings = {'rating': {'weight': 1.0, 'normalize': '(value-mean)/std'}}
+        _, normalized = score_results(columns, settings, 0.0)
+        np.testing.assert_allclose(normalized['rating'], [-1.224744871, 0.0, 1.224744871])
+
+    def test_multi_origin_bests(self):
+        """Each origin gets its own best and the aggregate averages origins."""
+        origin_index = np.array([0, 0, 1, 1, 2, 2])
+        dest_index = np.array([0, 1, 0, 1, 0, 1])
+        durations = np.array([100.0, 500.0, 400.0, 200.0, 450.0, 150.0])
+        scores, _ = score_results({'可达性': durations}, {}, 1.0)
+        bests = top_k_per_origin(origin_index, scores, 1)
+        self.assertEqual([dest_index[bests[i][0]] for i in (0, 1, 2)], [0, 1, 1])
+        [(row, _)] = aggregate_top_k(dest_index, scores, 1)
+        self.assertEqual(dest_index[row], 1)
+
+    def test_group_best_ties_and_nan(self):
+        """Ties keep the first row and nan scores never win."""
+        origin_index = np.array([0, 0, 0, 1, 1])
+        scores = np.array([np.nan, 2.0, 2.0, 1.0, np.nan])
+        self.assertEqual(top_k_per_origin(origin_index, scores, 1), {0: [1], 1: [3]})
+        self.assertEqual(best_index(scores), 1)
+
+    def test_top_k(self):
+        """Top-K returns the K best rows in rank order, per origin and aggregated."""
+        scores = np.array([0.5, 0.9, np.nan, 0.1, 0.7, 0.9])
+        self.assertEqual(top_k(scores, 3).tolist(), [1, 5, 4])
+        self.assertEqual(top_k(scores, 10).tolist(), [1, 5, 4, 0, 3])
+        origin_index = np.array([0, 0, 0, 1, 1, 1])
+        self.assertEqual(top_k_per_origin(origin_index, scores, 2), {0: [1, 0], 1: [5, 4]})
+        dest_index = np.array([0, 1, 2, 0, 1, 2])
+        ranked = aggregate_top_k(dest_index, scores, 2)
+        self.assertEqual([row for row, _ in ranked], [1, 0])
+        self.assertAlmostEqual(ranked[0][1], 0.8)
+
+    def test_aggregate_with_pruned_pairs(self):
+        """Pairs missing for some origins count with the unreachable score in the aggregate."""
+        # 终点0只对起点0保留（评分1.0），终点1对全部三个起点保留
+        dest_index = np.array([0, 1, 1, 1])
+        scores = np.array([1.0, 0.67, 0.33, 0.0])
+        [(row, _)] = aggregate_top_k(dest_index, scores, 1)
+        self.assertEqual(dest_index[row], 0)
+        penalty = unreachable_penalty(scores, [1.0])
+        self.assertAlmostEqual(penalty, -1.0)
+        ranked = aggregate_top_k(dest_index, scores, 2, 3, penalty)
+        self.assertEqual([dest_index[row] for row, _ in ranked], [1, 0])
+        self.assertAlmostEqual(ranked[0][1], 1.0 / 3)
+        self.assertAlmostEqual(ranked[1][1], -1.0 / 3)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ScoringTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,100 @@
+# coding=utf-8
+"""Coordinate transform test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Connor_RK800@163.com'
+__date__ = '2025-07-09'
+__copyright__ = 'Copyright 2025, MaritimeDay'
+
+import unittest
+
+import numpy as np
+
+from transform import (wgs2gcj, gcj2wgs, wgs2gcj_array, gcj2wgs_array, gcj2wgs_newton,
+                       gcj2wgs_iter, gcj_offset_and_jacobian)
+
+
+class TransformTest(unittest.TestCase):
+    """Test that the array conversions match the scalar ones."""
+
+    def setUp(self):
+        """Runs before each test."""
+        rng = np.random.RandomState(0)
+        self.lons = np.append(rng.uniform(73.0, 135.0, 200), 10.0)
+        self.lats = np.append(rng.uniform(18.0, 53.0, 200), 10.0)
+
+    def test_wgs2gcj_array(self):
+        """Array forward conversion equals the scalar one, including outside China."""
+        lons, lats = wgs2gcj_array(self.lons, self.lats)
+        expected = np.array([wgs2gcj(x, y) for x, y in zip(self.lons, self.lats)])
+        np.testing.assert_allclose(lons, expected[:, 0], atol=1e-12)
+        np.testing.assert_allclose(lats, expected[:, 1], atol=1e-12)
+
+    def test_gcj2wgs_array(self):
+        """Array inverse matches the scalar inverse and round-trips."""
+        g_lons, g_lats = wgs2gcj_array(self.lons, self.lats)
+        lons, lats = gcj2wgs_array(g_lons, g_lats)
+        expected = np.array([gcj2wgs(x, y) for x, y in zip(g_lons, g_lats)])
+        np.testing.assert_allclose(lons, expected[:, 0], atol=1e-9)
+        np.testing.assert_allclose(lats, expected[:, 1], atol=1e-9)
+        np.testing.assert_allclose(lons, self.lons, atol=1e-6)
+        np.testing.assert_allclose(lats, self.lats, atol=1e-6)
+
+    def test_gcj2wgs(self):
+        """The one-step Newton inverse round-trips, also next to the kink at 105 degrees east."""
+        lons = np.append(self.lons, 105.0 + np.array([-1e-2, -1e-3, -1e-5, -1e-9, 0.0, 1e-9, 1e-5, 1e-3, 1e-2]))
+        lats = np.append(self.lats, np.full(9, 30.0))
+        g_lons, g_lats = wgs2gcj_array(lons, lats)
+        result = np.array([gcj2wgs(x, y) for x, y in zip(g_lons, g_lats)])
+        np.testing.assert_allclose(result[:, 0], lons, atol=1e-9)
+        np.testing.assert_allclose(result[:, 1], lats, atol=1e-9)
+
+    def test_gcj2wgs_newton_residual(self):
+        """Newton inverse reports a residual below tol and agrees with fixed point."""
+        g_lons, g_lats = wgs2gcj_array(self.lons, self.lats)
+        for x, y, gx, gy in zip(self.lons, self.lats, g_lons, g_lats):
+            lon, lat, residual = gcj2wgs_newton(gx, gy, tol=1e-9)
+            self.assertLess(residual, 1e-9)
+            self.assertAlmostEqual(lon, x, delta=1e-8)
+            self.assertAlmostEqual(lat, y, delta=1e-8)
+            old = gcj2wgs_iter(gx, gy)
+            self.assertAlmostEqual(lon, old[0], delta=1e-8)
+            self.assertAlmostEqual(lat, old[1], delta=1e-8)
+
+    def test_max_iter(self):
+        """The iteration count is bounded and the residual reflects it."""
+        lon, lat, residual = gcj2wgs_iter(116.4, 39.9, tol=0.0, max_iter=1)
+        self.assertGreater(residual, 1e-9)
+        self.assertLess(residual, 1e-5)
+        lon, lat, residual = gcj2wgs_newton(116.4, 39.9, tol=0.0, max_iter=1)
+        self.assertLess(residual, 1e-9)
+
+    def test_jacobian(self):
+        """Analytical Jacobian matches central finite differences."""
+        h = 1e-6
+        for x, y in zip(self.lons[:20], self.lats[:20]):
+            _, _, d11, d12, d21, d22 = gcj_offset_and_jacobian(x, y)
+            f = lambda u, v: np.subtract(wgs2gcj(u, v), (u, v))
+            dx = (f(x + h, y) - f(x - h, y)) / (2 * h)
+            dy = (f(x, y + h) - f(x, y - h)) / (2 * h)
+            np.testing.assert_allclose([d11, d21], dx, atol=1e-6)
+            np.testing.assert_allclose([d12, d22], dy, atol=1e-6)
+
+    def test_gcj2wgs_array_residual(self):
+        """Array inverse returns per-point residuals when asked."""
+        g_lons, g_lats = wgs2gcj_array(self.lons, self.lats)
+        lons, lats, residual = gcj2wgs_array(g_lons, g_lats, return_residual=True)
+        self.assertEqual(residual.shape, lons.shape)
+        self.assertTrue((residual < 1e-9).all())
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TransformTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
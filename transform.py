@@ -9,10 +9,14 @@ import math
 from math import sin, cos, sqrt, fabs, atan2
 from math import pi as PI
 
+import numpy as np
+
 a = 6378245.0
 f = 1 / 298.3
 b = a * (1 - f)
 ee = 1 - (b * b) / (a * a)
+# gcj2wgs在东经105度两侧该范围（度）内不用牛顿步
+NEWTON_KINK_BAND = 1e-3
 
 def outOfChina(lng, lat):
     return not (72.004 <= lng <= 137.8347 and 0.8293 <= lat <= 55.8271)
@@ -46,18 +50,185 @@ def wgs2gcj(wgsLon, wgsLat):
     gcjLon = wgsLon + dLon
     return (gcjLon, gcjLat)
 
+def gcj_offset_and_jacobian(wgsLon, wgsLat):
+    """wgs2gcj的偏移量及其解析偏导数，三角函数只计算一次
+
+    返回 (dLon, dLat, dLon/dlon, dLon/dlat, dLat/dlon, dLat/dlat)，偏移量单位为度，偏导数为度/度。
+    不判断是否在中国境内，调用方自行处理境外坐标。
+    """
+    x = wgsLon - 105.0
+    y = wgsLat - 35.0
+    sq = sqrt(fabs(x))
+    # d(sqrt|x|)/dx，x=0处不可导，取0
+    dsq = (0.5 / sq if x > 0 else -0.5 / sq) if sq > 0 else 0.0
+    px = x * PI
+    py = y * PI
+    s6, c6 = sin(6.0 * px), cos(6.0 * px)
+    s2, c2 = sin(2.0 * px), cos(2.0 * px)
+    common = (20.0 * s6 + 20.0 * s2) * 2.0 / 3.0
+    common_x = (120.0 * PI * c6 + 40.0 * PI * c2) * 2.0 / 3.0
+    tLat = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * sq + common
+    tLat = tLat + (20.0 * sin(py) + 40.0 * sin(py / 3.0)) * 2.0 / 3.0
+    tLat = tLat + (160.0 * sin(py / 12.0) + 320.0 * sin(py / 30.0)) * 2.0 / 3.0
+    tLon = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * sq + common
+    tLon = tLon + (20.0 * sin(px) + 40.0 * sin(px / 3.0)) * 2.0 / 3.0
+    tLon = tLon + (150.0 * sin(px / 12.0) + 300.0 * sin(px / 30.0)) * 2.0 / 3.0
+    tLat_x = 2.0 + 0.1 * y + 0.2 * dsq + common_x
+    tLat_y = 3.0 + 0.4 * y + 0.1 * x
+    tLat_y = tLat_y + (20.0 * PI * cos(py) + 40.0 * PI / 3.0 * cos(py / 3.0)) * 2.0 / 3.0
+    tLat_y = tLat_y + (160.0 * PI / 12.0 * cos(py / 12.0) + 320.0 * PI / 30.0 * cos(py / 30.0)) * 2.0 / 3.0
+    tLon_x = 1.0 + 0.2 * x + 0.1 * y + 0.1 * dsq + common_x
+    tLon_x = tLon_x + (20.0 * PI * cos(px) + 40.0 * PI / 3.0 * cos(px / 3.0)) * 2.0 / 3.0
+    tLon_x = tLon_x + (150.0 * PI / 12.0 * cos(px / 12.0) + 300.0 * PI / 30.0 * cos(px / 30.0)) * 2.0 / 3.0
+    tLon_y = 2.0 + 0.1 * x
+    radLat = wgsLat / 180.0 * PI
+    sinLat = sin(radLat)
+    cosLat = cos(radLat)
+    magic = 1 - ee * sinLat * sinLat
+    sqrtMagic = sqrt(magic)
+    dMagic = -2.0 * ee * sinLat * cosLat * PI / 180.0
+    # dLat = tLat * kLat, dLon = tLon * kLon，kLat/kLon只随纬度变化
+    kLat = 180.0 * magic * sqrtMagic / (a * (1 - ee) * PI)
+    kLon = 180.0 * sqrtMagic / (a * cosLat * PI)
+    kLat_lat = 180.0 / (a * (1 - ee) * PI) * 1.5 * sqrtMagic * dMagic
+    kLon_lat = 180.0 / (a * PI) * (0.5 / sqrtMagic * dMagic / cosLat + sqrtMagic * sinLat / (cosLat * cosLat) * PI / 180.0)
+    return (tLon * kLon, tLat * kLat,
+            tLon_x * kLon, tLon_y * kLon + tLon * kLon_lat,
+            tLat_x * kLat, tLat_y * kLat + tLat * kLat_lat)
+
+def gcj2wgs_newton(gcjLon, gcjLat, tol=1e-9, max_iter=4):
+    """GCJ-02转WGS84：以解析雅可比矩阵做牛顿迭代，最多max_iter步
+
+    初值取一步不动点迭代的结果（误差约1e-5度），之后每步牛顿迭代二次收敛，通常1步即可使残差低于1e-10度。
+    与gcj2wgs相比多一次偏移量计算用于检查残差。
+    返回 (wgsLon, wgsLat, residual)，residual为wgs2gcj(结果)与输入的最大偏差（度）
+    """
+    if outOfChina(gcjLon, gcjLat):
+        return gcjLon, gcjLat, 0.0
+    wLon, wLat = _fixed_point_start(gcjLon, gcjLat)
+    for i in range(max_iter + 1):
+        nLon, nLat, residual = _newton_step(wLon, wLat, gcjLon, gcjLat)
+        if residual < tol or i == max_iter:
+            break
+        wLon, wLat = nLon, nLat
+    return wLon, wLat, residual
+
+def _fixed_point_start(gcjLon, gcjLat):
+    # 一步不动点迭代：w = g - (wgs2gcj(g) - g)，误差约1e-5度
+    gLon, gLat = wgs2gcj(gcjLon, gcjLat)
+    return gcjLon - (gLon - gcjLon), gcjLat - (gLat - gcjLat)
+
+def _newton_step(wLon, wLat, gcjLon, gcjLat):
+    """在(wLon, wLat)处做一步牛顿迭代，返回 (新wLon, 新wLat, 迭代前的残差)"""
+    dLon, dLat, d11, d12, d21, d22 = gcj_offset_and_jacobian(wLon, wLat)
+    rLon = wLon + dLon - gcjLon
+    rLat = wLat + dLat - gcjLat
+    j11 = 1.0 + d11
+    j22 = 1.0 + d22
+    det = j11 * j22 - d12 * d21
+    return (wLon - (j22 * rLon - d12 * rLat) / det, wLat - (j11 * rLat - d21 * rLon) / det,
+            max(fabs(rLon), fabs(rLat)))
+
+def gcj2wgs_iter(gcjLon, gcjLat, tol=1e-9, max_iter=8):
+    """GCJ-02转WGS84：不动点迭代，最多max_iter步
+
+    偏移量的偏导数只有1e-4量级，每步误差缩小约三个数量级，通常3次wgs2gcj即可低于1e-9度。
+    返回 (wgsLon, wgsLat, residual)，residual为wgs2gcj(结果)与输入的最大偏差（度）
+    """
+    if outOfChina(gcjLon, gcjLat):
+        return gcjLon, gcjLat, 0.0
+    wLon, wLat = gcjLon, gcjLat
+    for i in range(max_iter + 1):
+        gLon, gLat = wgs2gcj(wLon, wLat)
+        rLon = gLon - gcjLon
+        rLat = gLat - gcjLat
+        residual = max(fabs(rLon), fabs(rLat))
+        if residual < tol or i == max_iter:
+            break
+        wLon -= rLon
+        wLat -= rLat
+    return wLon, wLat, residual
+
 def gcj2wgs(gcjLon, gcjLat):
-    g0 = (gcjLon, gcjLat)
-    w0 = g0
-    g1 = wgs2gcj(w0[0], w0[1])
-    w1 = tuple([x[0]-(x[1]-x[2]) for x in zip(w0,g1,g0)])
-    delta = tuple([x[0] - x[1] for x in zip(w1, w0)])
-    while (abs(delta[0]) >= 1e-6 or abs(delta[1]) >= 1e-6):
-        w0 = w1
-        g1 = wgs2gcj(w0[0], w0[1])
-        w1 = tuple([x[0]-(x[1]-x[2]) for x in zip(w0,g1,g0)])
-        delta = tuple([x[0] - x[1] for x in zip(w1, w0)])
-    return w1
+    """GCJ-02转WGS84：一步不动点迭代作初值，再做一步牛顿迭代
+
+    只计算两次偏移量（一次wgs2gcj、一次gcj_offset_and_jacobian），误差通常约1e-11度，不超过1e-9度；
+    gcj2wgs_iter要3次以上wgs2gcj才到1e-9度，单点更慢（见scripts/bench_transform.py）。需要残差时用gcj2wgs_newton
+    """
+    if outOfChina(gcjLon, gcjLat):
+        return gcjLon, gcjLat
+    wLon, wLat = _fixed_point_start(gcjLon, gcjLat)
+    if fabs(wLon - 105.0) < NEWTON_KINK_BAND:
+        # 东经105度附近偏移量含sqrt|x|项，导数趋于无穷，牛顿步不可靠，改用不动点迭代
+        wLon, wLat, _ = gcj2wgs_iter(gcjLon, gcjLat)
+        return (wLon, wLat)
+    wLon, wLat, _ = _newton_step(wLon, wLat, gcjLon, gcjLat)
+    return (wLon, wLat)
+
+# 以下为数组版本，一次转换整组坐标（如整条路径的全部折点），结果与逐点函数一致
+
+def outOfChina_array(lng, lat):
+    return ~((72.004 <= lng) & (lng <= 137.8347) & (0.8293 <= lat) & (lat <= 55.8271))
+
+def geohey_transformLat_array(x, y):
+    ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * np.sqrt(np.abs(x))
+    ret = ret + (20.0 * np.sin(6.0 * x * PI) + 20.0 * np.sin(2.0 * x * PI)) * 2.0 / 3.0
+    ret = ret + (20.0 * np.sin(y * PI) + 40.0 * np.sin(y / 3.0 * PI)) * 2.0 / 3.0
+    ret = ret + (160.0 * np.sin(y / 12.0 * PI) + 320.0 * np.sin(y * PI / 30.0)) * 2.0 / 3.0
+    return ret
+
+def geohey_transformLon_array(x, y):
+    ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * np.sqrt(np.abs(x))
+    ret = ret + (20.0 * np.sin(6.0 * x * PI) + 20.0 * np.sin(2.0 * x * PI)) * 2.0 / 3.0
+    ret = ret + (20.0 * np.sin(x * PI) + 40.0 * np.sin(x / 3.0 * PI)) * 2.0 / 3.0
+    ret = ret + (150.0 * np.sin(x / 12.0 * PI) + 300.0 * np.sin(x * PI / 30.0)) * 2.0 / 3.0
+    return ret
+
+def wgs2gcj_array(wgsLon, wgsLat):
+    """WGS84转GCJ-02，输入输出均为等长数组"""
+    wgsLon = np.asarray(wgsLon, dtype=float)
+    wgsLat = np.asarray(wgsLat, dtype=float)
+    dLat = geohey_transformLat_array(wgsLon - 105.0, wgsLat - 35.0)
+    dLon = geohey_transformLon_array(wgsLon - 105.0, wgsLat - 35.0)
+    radLat = wgsLat / 180.0 * PI
+    magic = np.sin(radLat)
+    magic = 1 - ee * magic * magic
+    sqrtMagic = np.sqrt(magic)
+    dLat = (dLat * 180.0) / ((a * (1 - ee)) / (magic * sqrtMagic) * PI)
+    dLon = (dLon * 180.0) / (a / sqrtMagic * np.cos(radLat) * PI)
+    out = outOfChina_array(wgsLon, wgsLat)
+    gcjLon = np.where(out, wgsLon, wgsLon + dLon)
+    gcjLat = np.where(out, wgsLat, wgsLat + dLat)
+    return gcjLon, gcjLat
+
+def gcj2wgs_array(gcjLon, gcjLat, tol=1e-9, max_iter=8, return_residual=False):
+    """GCJ-02转WGS84的数组版本：与gcj2wgs_iter相同的有界迭代，已收敛的点不再参与计算
+
+    return_residual为True时额外返回每个点的残差数组（度）
+    """
+    g0Lon = np.asarray(gcjLon, dtype=float)
+    g0Lat = np.asarray(gcjLat, dtype=float)
+    wLon = g0Lon.copy()
+    wLat = g0Lat.copy()
+    residual = np.zeros(g0Lon.shape)
+    # 境外坐标原样返回，残差为0
+    idx = np.flatnonzero(~outOfChina_array(g0Lon, g0Lat))
+    for i in range(max_iter + 1):
+        if idx.size == 0:
+            break
+        gLon, gLat = wgs2gcj_array(wLon[idx], wLat[idx])
+        rLon = gLon - g0Lon[idx]
+        rLat = gLat - g0Lat[idx]
+        residual[idx] = np.maximum(np.abs(rLon), np.abs(rLat))
+        if i == max_iter:
+            break
+        todo = residual[idx] >= tol
+        idx = idx[todo]
+        wLon[idx] -= rLon[todo]
+        wLat[idx] -= rLat[todo]
+    if return_residual:
+        return wLon, wLat, residual
+    return wLon, wLat
 
 def gcj2bd(gcjLon, gcjLat):
     z = sqrt(gcjLon * gcjLon + gcjLat * gcjLat) + 0.00002 * sin(gcjLat * PI * 3000.0 / 180.0)